@@ -1,3 +1,4 @@
+import re
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -27,6 +28,21 @@ config.set_main_option('sqlalchemy.url', settings.DB.DB_URL)
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+# Генерируемая колонка поиска и её GIN-индекс созданы миграцией 7744a969f90c
+# и не описаны в моделях — autogenerate не должен предлагать их удалить
+UNMAPPED_OBJECTS = {('column', 'search_vector'), ('index', 'ix_books_search_vector')}
+
+
+# Разделы logs (logs_pYYYYMMDD, logs_default) создаёт app.utils.log_maintenance
+PARTITION_PATTERN = re.compile(r'^logs_(p\d{8}|default)$')
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and reflected and PARTITION_PATTERN.match(name):
+        return False
+    return (type_, name) not in UNMAPPED_OBJECTS
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -51,6 +67,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -73,7 +90,7 @@ def run_migrations_online() -> None:
     with connectable.connect() as connection:
         context.configure(
             connection=connection, target_metadata=target_metadata,
-            compare_server_default=True
+            compare_server_default=True, include_object=include_object
         )
 
         with context.begin_transaction():
@@ -0,0 +1,48 @@
+"""Indexes for the hot query paths
+
+Revision ID: 307cfa254fe2
+Revises: 9ce02c66dfb3
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '307cfa254fe2'
+down_revision: Union[str, None] = '9ce02c66dfb3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # keyset-пагинация GET /books: ORDER BY name, id
+    op.create_index('ix_books_name_id', 'books', ['name', 'id'])
+    # логин и get_current_user ищут пользователя по username
+    op.create_index('ix_readers_username', 'readers', ['username'])
+    op.create_index('ix_admins_username', 'admins', ['username'])
+    # первичные ключи связующих таблиц начинаются с book_id, для фильтров
+    # по автору/жанру и для каскадного удаления нужен индекс по второй колонке
+    op.create_index('ix_book_authors_author_id', 'book_authors', ['author_id'])
+    op.create_index('ix_book_genres_genre_id', 'book_genres', ['genre_id'])
+    op.create_index('ix_reader_books_book_id', 'reader_books', ['book_id'])
+    # просроченные выдачи: только открытые, поэтому индекс частичный и небольшой
+    op.create_index(
+        'ix_reader_books_open_due', 'reader_books', ['due_date'],
+        postgresql_where=sa.text('input_date IS NULL')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reader_books_open_due', table_name='reader_books')
+    op.drop_index('ix_reader_books_book_id', table_name='reader_books')
+    op.drop_index('ix_book_genres_genre_id', table_name='book_genres')
+    op.drop_index('ix_book_authors_author_id', table_name='book_authors')
+    op.drop_index('ix_admins_username', table_name='admins')
+    op.drop_index('ix_readers_username', table_name='readers')
+    op.drop_index('ix_books_name_id', table_name='books')
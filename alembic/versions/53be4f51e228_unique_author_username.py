@@ -0,0 +1,35 @@
+"""Unique author username
+
+Revision ID: 53be4f51e228
+Revises: 7744a969f90c
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '53be4f51e228'
+down_revision: Union[str, None] = '7744a969f90c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ON CONFLICT (username) в upsert_by_names требует уникальности
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT username FROM authors GROUP BY username HAVING count(*) > 1 LIMIT 10"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(f"Merge duplicate authors before upgrading: {', '.join(duplicates)}")
+
+    op.create_unique_constraint('authors_username_key', 'authors', ['username'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('authors_username_key', 'authors', type_='unique')
@@ -0,0 +1,115 @@
+"""Partition logs by time and add per-minute rollups
+
+Revision ID: 5e8a0c3b7d21
+Revises: c41d7e2a9b60
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8a0c3b7d21'
+down_revision: Union[str, None] = 'c41d7e2a9b60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Миграция не читает настройки приложения: схема не должна зависеть от окружения,
+# в котором её накатили. Значения по умолчанию совпадают с settings.logs; другие
+# передаются явно: alembic -x log_partition_interval=week upgrade head
+DEFAULTS = {'log_partition_interval': 'day', 'log_partitions_ahead': '2', 'log_retention_days': '14'}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    options = {**DEFAULTS, **context.get_x_argument(as_dictionary=True)}
+    interval = options['log_partition_interval']
+    if interval not in ('day', 'week'):
+        raise ValueError(f"Unknown partition interval: {interval}")
+    step = timedelta(days=7 if interval == 'week' else 1)
+    cutoff = datetime.utcnow() - timedelta(days=int(options['log_retention_days']))
+
+    # Секционированную таблицу нельзя получить из обычной на месте: создаём новую рядом,
+    # переносим строки моложе срока хранения (старшие удалила бы первая же уборка),
+    # старую удаляем. Последовательность id переходит к новой таблице.
+    op.execute("ALTER TABLE logs RENAME TO logs_unpartitioned")
+    op.execute("ALTER TABLE logs_unpartitioned RENAME CONSTRAINT logs_pkey TO logs_unpartitioned_pkey")
+    op.execute("ALTER SEQUENCE logs_id_seq OWNED BY NONE")
+    op.execute("ALTER SEQUENCE logs_id_seq AS bigint")
+    op.execute(
+        "CREATE TABLE logs ("
+        "id bigint NOT NULL DEFAULT nextval('logs_id_seq'), "
+        "at_time timestamp without time zone NOT NULL DEFAULT now(), "
+        "level varchar, message varchar, context json, "
+        "PRIMARY KEY (id, at_time)"
+        ") PARTITION BY RANGE (at_time)"
+    )
+    op.execute("ALTER SEQUENCE logs_id_seq OWNED BY logs.id")
+    op.create_index('ix_logs_at_time', 'logs', ['at_time'])
+    # сюда попадают строки, для которых раздел не успели создать; обычно он пуст
+    op.execute("CREATE TABLE logs_default PARTITION OF logs DEFAULT")
+
+    conn = op.get_bind()
+    starts = set(conn.execute(
+        sa.text(f"SELECT DISTINCT date_trunc('{interval}', at_time) FROM logs_unpartitioned WHERE at_time >= :cutoff"),
+        {'cutoff': cutoff}
+    ).scalars())
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    current = today - timedelta(days=today.weekday()) if interval == 'week' else today
+    starts.update(current + step * i for i in range(int(options['log_partitions_ahead']) + 1))
+    # имена как у app.utils.log_maintenance.partition_name
+    for start in sorted(starts):
+        op.execute(
+            f"CREATE TABLE logs_p{start:%Y%m%d} PARTITION OF logs "
+            f"FOR VALUES FROM ('{start}') TO ('{start + step}')"
+        )
+
+    conn.execute(sa.text(
+        "INSERT INTO logs (id, at_time, level, message, context) "
+        "SELECT id, at_time, level, message, context FROM logs_unpartitioned WHERE at_time >= :cutoff"
+    ), {'cutoff': cutoff})
+    op.drop_table('logs_unpartitioned')
+
+    op.create_table(
+        'log_rollups',
+        sa.Column('minute', sa.DateTime(), nullable=False),
+        sa.Column('method', sa.String(), nullable=False),
+        sa.Column('route', sa.String(), nullable=False),
+        sa.Column('requests', sa.Integer(), nullable=False),
+        sa.Column('errors', sa.Integer(), nullable=False),
+        sa.Column('p50_ms', sa.Integer(), nullable=True),
+        sa.Column('p95_ms', sa.Integer(), nullable=True),
+        sa.Column('p99_ms', sa.Integer(), nullable=True),
+        sa.Column('max_ms', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('minute', 'method', 'route')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('log_rollups')
+
+    op.execute("ALTER TABLE logs RENAME TO logs_partitioned")
+    op.execute("ALTER TABLE logs_partitioned RENAME CONSTRAINT logs_pkey TO logs_partitioned_pkey")
+    op.execute("ALTER SEQUENCE logs_id_seq OWNED BY NONE")
+    op.create_table(
+        'logs',
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('logs_id_seq')"), nullable=False),
+        sa.Column('at_time', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('level', sa.String(), nullable=True),
+        sa.Column('message', sa.String(), nullable=True),
+        sa.Column('context', sa.JSON(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(
+        "INSERT INTO logs (id, at_time, level, message, context) "
+        "SELECT id, at_time, level, message, context FROM logs_partitioned"
+    )
+    # вместе с родителем удаляются и все разделы
+    op.drop_table('logs_partitioned')
+    op.execute("ALTER SEQUENCE logs_id_seq AS integer")
+    op.execute("ALTER SEQUENCE logs_id_seq OWNED BY logs.id")
@@ -0,0 +1,60 @@
+"""Loans: surrogate key, due date and renewals on reader_books
+
+Revision ID: 9ce02c66dfb3
+Revises: 53be4f51e228
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9ce02c66dfb3'
+down_revision: Union[str, None] = '53be4f51e228'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # составной ключ (reader_id, book_id) не давал взять книгу повторно после возврата
+    op.add_column('reader_books', sa.Column(
+        'id', postgresql.UUID(as_uuid=True), server_default=sa.text('gen_random_uuid()'), nullable=False
+    ))
+    op.drop_constraint('reader_books_pkey', 'reader_books', type_='primary')
+    op.create_primary_key('reader_books_pkey', 'reader_books', ['id'])
+    op.alter_column('reader_books', 'id', server_default=None)
+
+    op.add_column('reader_books', sa.Column('due_date', sa.DateTime(), nullable=True))
+    op.add_column('reader_books', sa.Column('renewals', sa.Integer(), server_default='0', nullable=False))
+    # срок старых выдач — как у новых (settings.loans.period_days, по умолчанию 14); настройки
+    # приложения миграция не читает, другой срок передаётся явно: alembic -x loan_period_days=21 upgrade head
+    period_days = int(context.get_x_argument(as_dictionary=True).get('loan_period_days', 14))
+    op.execute(
+        sa.text("UPDATE reader_books SET due_date = output_date + make_interval(days => :days)")
+        .bindparams(days=period_days)
+    )
+
+    op.create_index(
+        'ux_reader_books_open', 'reader_books', ['reader_id', 'book_id'],
+        unique=True, postgresql_where=sa.text('input_date IS NULL')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_reader_books_open', table_name='reader_books')
+    op.drop_column('reader_books', 'renewals')
+    op.drop_column('reader_books', 'due_date')
+    op.drop_constraint('reader_books_pkey', 'reader_books', type_='primary')
+    # повторные выдачи одной книги не уложить в старый ключ — оставляем последнюю
+    op.execute(
+        "DELETE FROM reader_books a USING reader_books b "
+        "WHERE a.reader_id = b.reader_id AND a.book_id = b.book_id AND a.output_date < b.output_date"
+    )
+    op.drop_column('reader_books', 'id')
+    op.create_primary_key('reader_books_pkey', 'reader_books', ['reader_id', 'book_id'])
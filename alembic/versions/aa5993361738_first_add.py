@@ -9,6 +9,7 @@ from typing import Sequence, Union
 
 from alembic import op
 import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
 
 
 # revision identifiers, used by Alembic.
@@ -20,13 +21,96 @@ depends_on: Union[str, Sequence[str], None] = None
 
 def upgrade() -> None:
     """Upgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    # Схема в том виде, в каком её раньше создавал Base.metadata.create_all при импорте
+    # моделей. Базы, созданные так и ещё не помеченные Alembic, нужно пометить
+    # командой `alembic stamp aa5993361738` перед `alembic upgrade head`.
+    op.create_table(
+        'books',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('published_at', sa.DateTime(), nullable=True),
+        sa.Column('count_available', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'authors',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('username', sa.String(), nullable=False),
+        sa.Column('password', sa.LargeBinary(), nullable=True),
+        sa.Column('biography', sa.String(), nullable=True),
+        sa.Column('birthday', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'genres',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.create_table(
+        'readers',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('password', sa.LargeBinary(), nullable=True),
+        sa.Column('info', sa.String(), nullable=True),
+        sa.Column('can_get_more', sa.Integer(), nullable=True),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'admins',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('password', sa.LargeBinary(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'logs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('at_time', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.Column('level', sa.String(), nullable=True),
+        sa.Column('message', sa.String(), nullable=True),
+        sa.Column('context', sa.JSON(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'book_authors',
+        sa.Column('book_id', postgresql.UUID(), nullable=False),
+        sa.Column('author_id', postgresql.UUID(), nullable=False),
+        sa.ForeignKeyConstraint(['author_id'], ['authors.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('book_id', 'author_id')
+    )
+    op.create_table(
+        'book_genres',
+        sa.Column('book_id', postgresql.UUID(), nullable=False),
+        sa.Column('genre_id', postgresql.UUID(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['genre_id'], ['genres.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('book_id', 'genre_id')
+    )
+    op.create_table(
+        'reader_books',
+        sa.Column('reader_id', postgresql.UUID(), nullable=False),
+        sa.Column('book_id', postgresql.UUID(), nullable=False),
+        sa.Column('output_date', sa.DateTime(), nullable=True),
+        sa.Column('input_date', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['reader_id'], ['readers.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('reader_id', 'book_id')
+    )
 
 
 def downgrade() -> None:
     """Downgrade schema."""
-    # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ###
+    op.drop_table('reader_books')
+    op.drop_table('book_genres')
+    op.drop_table('book_authors')
+    op.drop_table('logs')
+    op.drop_table('admins')
+    op.drop_table('readers')
+    op.drop_table('genres')
+    op.drop_table('authors')
+    op.drop_table('books')
@@ -0,0 +1,77 @@
+"""Summary tables for circulation reports
+
+Revision ID: c41d7e2a9b60
+Revises: ff0b6f8932d9
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7e2a9b60'
+down_revision: Union[str, None] = 'ff0b6f8932d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'book_loan_stats',
+        sa.Column('book_id', postgresql.UUID(), nullable=False),
+        sa.Column('loans_total', sa.Integer(), nullable=False),
+        sa.Column('open_loans', sa.Integer(), nullable=False),
+        sa.Column('last_loan_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('book_id')
+    )
+    op.create_index('ix_book_loan_stats_loans_total', 'book_loan_stats', ['loans_total'])
+    op.create_table(
+        'genre_book_loan_stats',
+        sa.Column('genre_id', postgresql.UUID(), nullable=False),
+        sa.Column('book_id', postgresql.UUID(), nullable=False),
+        sa.Column('loans_total', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['genre_id'], ['genres.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('genre_id', 'book_id')
+    )
+    op.create_index('ix_genre_book_loan_stats_top', 'genre_book_loan_stats', ['genre_id', 'loans_total'])
+    op.create_table(
+        'reader_loan_stats',
+        sa.Column('reader_id', postgresql.UUID(), nullable=False),
+        sa.Column('loans_total', sa.Integer(), nullable=False),
+        sa.Column('open_loans', sa.Integer(), nullable=False),
+        sa.Column('last_loan_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['reader_id'], ['readers.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('reader_id')
+    )
+    op.create_index('ix_reader_loan_stats_loans_total', 'reader_loan_stats', ['loans_total'])
+
+    # первичное заполнение из накопленных выдач — то же, что делает app.reports.rebuild
+    conn = op.get_bind()
+    for table, key in (('book_loan_stats', 'book_id'), ('reader_loan_stats', 'reader_id')):
+        conn.execute(sa.text(
+            f"INSERT INTO {table} ({key}, loans_total, open_loans, last_loan_at) "
+            f"SELECT {key}, count(*), sum(CASE WHEN input_date IS NULL THEN 1 ELSE 0 END), max(output_date) "
+            f"FROM reader_books GROUP BY {key}"
+        ))
+    conn.execute(sa.text(
+        "INSERT INTO genre_book_loan_stats (genre_id, book_id, loans_total) "
+        "SELECT book_genres.genre_id, stats.book_id, stats.loans_total "
+        "FROM book_loan_stats stats JOIN book_genres ON book_genres.book_id = stats.book_id"
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reader_loan_stats_loans_total', table_name='reader_loan_stats')
+    op.drop_table('reader_loan_stats')
+    op.drop_index('ix_genre_book_loan_stats_top', table_name='genre_book_loan_stats')
+    op.drop_table('genre_book_loan_stats')
+    op.drop_index('ix_book_loan_stats_loans_total', table_name='book_loan_stats')
+    op.drop_table('book_loan_stats')
@@ -0,0 +1,110 @@
+"""Unified users table: readers, admins and author accounts in one place
+
+Revision ID: ff0b6f8932d9
+Revises: 307cfa254fe2
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ff0b6f8932d9'
+down_revision: Union[str, None] = '307cfa254fe2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Учётные записи, которые переезжают в users. id сохраняем: у читателей и авторов
+# user_id профиля совпадает с id профиля, так связь восстанавливается без сопоставления.
+# Авторы без пароля — только записи каталога, учётных записей у них нет.
+ACCOUNTS = """
+    SELECT id, coalesce(username, 'reader-' || id::text) AS username, password, 'reader' AS role, email FROM readers
+    UNION ALL
+    SELECT id, coalesce(username, 'admin-' || id::text), password, 'admin', NULL FROM admins
+    UNION ALL
+    SELECT id, username, password, 'author', NULL FROM authors WHERE password IS NOT NULL
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    duplicates = conn.execute(sa.text(
+        f"SELECT username FROM ({ACCOUNTS}) accounts GROUP BY username HAVING count(*) > 1 LIMIT 10"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(f"Rename users with duplicate usernames before upgrading: {', '.join(duplicates)}")
+
+    op.create_table(
+        'users',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('username', sa.String(), nullable=False),
+        sa.Column('password', sa.LargeBinary(), nullable=True),
+        sa.Column('role', sa.String(), nullable=False),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.CheckConstraint("role IN ('reader', 'admin', 'author')", name='ck_users_role'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username', name='users_username_key')
+    )
+    conn.execute(sa.text(f"INSERT INTO users (id, username, password, role, email) {ACCOUNTS}"))
+
+    op.add_column('readers', sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True))
+    conn.execute(sa.text("UPDATE readers SET user_id = id"))
+    op.alter_column('readers', 'user_id', nullable=False)
+    op.create_unique_constraint('readers_user_id_key', 'readers', ['user_id'])
+    op.create_foreign_key('readers_user_id_fkey', 'readers', 'users', ['user_id'], ['id'], ondelete='CASCADE')
+    op.drop_index('ix_readers_username', table_name='readers')
+    op.drop_column('readers', 'username')
+    op.drop_column('readers', 'password')
+    op.drop_column('readers', 'email')
+
+    op.add_column('authors', sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True))
+    conn.execute(sa.text("UPDATE authors SET user_id = id WHERE password IS NOT NULL"))
+    op.create_unique_constraint('authors_user_id_key', 'authors', ['user_id'])
+    op.create_foreign_key('authors_user_id_fkey', 'authors', 'users', ['user_id'], ['id'], ondelete='SET NULL')
+    op.drop_column('authors', 'password')
+
+    op.drop_table('admins')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    op.create_table(
+        'admins',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('password', sa.LargeBinary(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_admins_username', 'admins', ['username'])
+    conn.execute(sa.text(
+        "INSERT INTO admins (id, username, password) SELECT id, username, password FROM users WHERE role = 'admin'"
+    ))
+
+    op.add_column('authors', sa.Column('password', sa.LargeBinary(), nullable=True))
+    conn.execute(sa.text(
+        "UPDATE authors SET password = users.password FROM users WHERE users.id = authors.user_id"
+    ))
+    op.drop_constraint('authors_user_id_fkey', 'authors', type_='foreignkey')
+    op.drop_constraint('authors_user_id_key', 'authors', type_='unique')
+    op.drop_column('authors', 'user_id')
+
+    op.add_column('readers', sa.Column('username', sa.String(), nullable=True))
+    op.add_column('readers', sa.Column('password', sa.LargeBinary(), nullable=True))
+    op.add_column('readers', sa.Column('email', sa.String(), nullable=True))
+    conn.execute(sa.text(
+        "UPDATE readers SET username = users.username, password = users.password, email = users.email "
+        "FROM users WHERE users.id = readers.user_id"
+    ))
+    op.create_index('ix_readers_username', 'readers', ['username'])
+    op.drop_constraint('readers_user_id_fkey', 'readers', type_='foreignkey')
+    op.drop_constraint('readers_user_id_key', 'readers', type_='unique')
+    op.drop_column('readers', 'user_id')
+
+    op.drop_table('users')
@@ -1,251 +1,730 @@
-from datetime import datetime
-from typing import Literal
-from uuid import UUID
+import json
+from typing import AsyncIterator, Literal
+from uuid import UUID, uuid4
 
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import (
+    select, insert, update, delete, tuple_, func, or_, and_, cast, literal, literal_column, Text
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from app.database import SessionLocal
-from app.schemas import UserSchema, BookCreate, AuthorCreate, UserResponse, Genres
-from app.database.models import UserReader, Admin, Book, Author, Genre, reader_books
-from app.utils.jwt_secure import hash_password
+from app.schemas import (
+    UserSchema, BookCreate, AuthorCreate, UserResponse, Genres, BookOut, AuthorSummary, GenreOut,
+    Principal
+)
+from app.database.models import (
+    User, UserReader, Book, Author, Genre, book_authors, book_genres, reader_books,
+    book_search_vector, SEARCH_CONFIG
+)
+from app.loans import checkout, checkout_many, return_book, renew, LoanNotFound
+from app.reports import refresh_book_genres
+from app.utils.cache import catalog_cache, principal_cache
+from app.utils.jwt_secure import password_hasher
+from app.utils.pagination import encode_cursor, decode_cursor
+from settings import settings
 
 
-def create_user(user: UserSchema):
-    session = SessionLocal()
+class UsernameTaken(ValueError):
+    pass
+
+
+class AuthorExists(ValueError):
+    pass
+
+
+class UserHasLoans(ValueError):
+    pass
+
+
+def _insert(session: AsyncSession):
+    return pg_insert if session.bind.dialect.name == 'postgresql' else sqlite_insert
+
+
+# Регистрация без предварительной проверки имени: занятое имя отсекает уникальный
+# индекс users.username, а ON CONFLICT DO NOTHING возвращает пустой RETURNING
+# вместо ошибки, так что две одновременные регистрации не гоняются друг с другом
+async def create_user(session: AsyncSession, user: UserSchema):
     try:
-        hashed_pwd = hash_password(user.password)
-        if user.role == 'admin':
-            new_user = Admin(
-                username=user.username,
-                password=hashed_pwd
-            )
-        elif user.role == 'reader':
-            new_user = UserReader(
-                username=user.username,
-                email=user.email,
-                password=hashed_pwd
+        hashed_pwd = await password_hasher.hash(user.password)
+        new_user = _insert(session)(User).values(
+            id=uuid4(),
+            username=user.username,
+            password=hashed_pwd,
+            role=user.role,
+            email=user.email
+        ).on_conflict_do_nothing(index_elements=['username'])
+
+        if user.role == 'reader' and session.bind.dialect.name == 'postgresql':
+            # учётная запись и профиль читателя — один запрос с INSERT в CTE
+            inserted = new_user.returning(User.id).cte('new_user')
+            user_id = await session.scalar(
+                insert(UserReader)
+                .from_select(['id', 'user_id'], select(literal(uuid4(), UserReader.id.type), inserted.c.id))
+                .add_cte(inserted)
+                .returning(UserReader.user_id)
             )
-
         else:
-            new_user = Author(
-                username=user.username,
-                password=hashed_pwd
-            )
-
-        session.add(new_user)
-        session.commit()
-        session.refresh(new_user)
+            user_id = await session.scalar(new_user.returning(User.id))
+            if user_id is not None and user.role == 'reader':
+                await session.execute(insert(UserReader).values(id=uuid4(), user_id=user_id))
+        if user_id is None:
+            raise UsernameTaken("Username already registered")
+
+        await session.commit()
+        principal_cache.invalidate(user.role, user.username)
         return UserResponse(
-            id=new_user.id,
-            username=new_user.username,
-            email=getattr(new_user, 'email', None),
+            id=user_id,
+            username=user.username,
+            email=user.email,
             role=user.role
         )
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise e
-    finally:
-        session.close()
 
 
-def get_user_by_username(username: str, role: str):
-    session = SessionLocal()
-    try:
-        if role == 'reader':
-            user = session.query(UserReader).filter(UserReader.username == username).first()
-        elif role == 'author':
-            user = session.query(Author).filter(Author.username == username).first()
-        else:
-            user = session.query(Admin).filter(Admin.username == username).first()
+async def get_user_by_username(session: AsyncSession, username: str, role: str) -> Principal | None:
+    cached = principal_cache.get((role, username))
+    if cached is not None:
+        return cached
+
+    user = await session.scalar(
+        select(User).where(User.username == username)
+    )
+    if user is None or user.role != role:
+        return None
+
+    principal = Principal(
+        id=user.id,
+        username=user.username,
+        role=user.role,
+        password=user.password,
+        email=user.email
+    )
+    principal_cache.set((role, username), principal)
+    return principal
 
-        return user
-    finally:
-        session.close()
 
+async def set_password(session: AsyncSession, user: Principal, hashed_password: bytes):
+    await session.execute(update(User).where(User.id == user.id).values(password=hashed_password))
+    await session.commit()
+    principal_cache.invalidate(user.role, user.username)
 
-def create_genre(genres: Genres):
-    session = SessionLocal()
 
+async def delete_user(session: AsyncSession, username: str, role: Literal['reader', 'admin']) -> bool:
     try:
-        for genre in genres.names:
-            new_genre = Genre(
-                name=genre
-            )
+        # Каскад удалил бы и открытые выдачи, а экземпляры так и не вернулись бы в count_available.
+        # Строку читателя блокируем, чтобы встречная выдача не успела проскочить между проверкой и DELETE
+        reader_id = await session.scalar(
+            select(UserReader.id)
+            .join(User, User.id == UserReader.user_id)
+            .where(User.username == username, User.role == role)
+            .with_for_update(of=UserReader)
+        )
+        if reader_id is not None and await session.scalar(
+                select(reader_books.c.id)
+                .where(reader_books.c.reader_id == reader_id, reader_books.c.input_date.is_(None))
+                .limit(1)
+        ) is not None:
+            raise UserHasLoans("Reader has books that are not returned")
+
+        user_id = await session.scalar(
+            delete(User).where(User.username == username, User.role == role).returning(User.id)
+        )
+        if user_id is not None:
+            # в Postgres это уже сделали внешние ключи, SQLite-подмена их не проверяет
+            await session.execute(delete(UserReader).where(UserReader.user_id == user_id))
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        raise e
+
+    principal_cache.invalidate(role, username)
+    return user_id is not None
 
-            session.add(new_genre)
-            session.commit()
-            session.refresh(new_genre)
+
+async def create_genre(session: AsyncSession, genres: Genres):
+    try:
+        rows = await upsert_by_names(session, Genre, genres.names)
+        await session.commit()
+        await catalog_cache.invalidate('genres')
+        return [GenreOut(id=rows[name], name=name) for name in dict.fromkeys(genres.names)]
 
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise e
-    finally:
-        session.close()
 
 
-def create_book(book: BookCreate):
-    session = SessionLocal()
+async def create_book(session: AsyncSession, book: BookCreate):
     try:
-        authors = [get_something_id(Author, x) for x in book.authors]
-        genres = [get_something_id(Genre, x) for x in book.genres]
+        authors = await get_by_names(session, Author, book.authors)
+        genres = await get_by_names(session, Genre, book.genres)
+
+        missing = [x for x in book.authors if x not in authors] + [x for x in book.genres if x not in genres]
+        if missing:
+            raise ValueError(f"Unknown authors or genres: {', '.join(missing)}")
 
         new_book = Book(
             name=book.name,
             description=book.description,
             published_at=book.published_at,
             count_available=book.count_available,
-            authors=authors,
-            genres=genres
+            authors=list(authors.values()),
+            genres=list(genres.values())
         )
         session.add(new_book)
-        session.commit()
-        session.refresh(new_book)
-        new_book = session.query(Book).options(
-            joinedload(Book.authors),
-            joinedload(Book.genres)
-        ).filter_by(id=new_book.id).first()
-        return new_book
+        await session.commit()
+        await catalog_cache.invalidate('books', 'authors')
+        return await session.scalar(
+            select(Book).options(
+                selectinload(Book.authors),
+                selectinload(Book.genres)
+            ).where(Book.id == new_book.id).execution_options(populate_existing=True)
+        )
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise e
-    finally:
-        session.close()
-
-
-def get_books(skip=0, limit=10):
-    session = SessionLocal()
-    try:
-        books = session.query(Book).options(
-            joinedload(Book.authors),
-            joinedload(Book.genres)
-        ).all()
-        return books
-    finally:
-        session.close()
-
-
-def get_something_id(table, name):
-    session = SessionLocal()
-    try:
-        if table == Genre:
-            return session.query(table).filter(table.name == name).first()
-        else:
-            return session.query(table).filter(table.username == name).first()
-    finally:
-        session.close()
 
 
-def get_book_by_id(book_id: UUID):
-    session = SessionLocal()
-    try:
-        book = session.query(Book).filter(Book.id == book_id).options(
-            joinedload(Book.authors),
-            joinedload(Book.genres)
-        ).first()
+async def get_books(
+        session: AsyncSession,
+        limit: int = 20,
+        cursor: str | None = None,
+        genre: str | None = None,
+        author: str | None = None,
+        available: bool | None = None
+):
+    cache_key = json.dumps([limit, cursor, genre, author, available])
+    cached, versioned_key = await catalog_cache.get('books', cache_key, _load_books)
+    if cached is not None:
+        return cached
+
+    result = await _books_page(session, _filter_books(select(Book), genre, author, available), limit, cursor)
+    await catalog_cache.set(versioned_key, result, _dump_books)
+    return result
+
+
+async def get_author_books(session: AsyncSession, author_id: UUID, limit: int = 20, cursor: str | None = None):
+    cache_key = json.dumps(['author', str(author_id), limit, cursor])
+    cached, versioned_key = await catalog_cache.get('books', cache_key, _load_books)
+    if cached is not None:
+        return cached
+
+    # связь читается по ix_book_authors_author_id, порядок страниц — как у GET /books
+    query = select(Book).join(book_authors, book_authors.c.book_id == Book.id).where(
+        book_authors.c.author_id == author_id
+    )
+    result = await _books_page(session, query, limit, cursor)
+    # пустая первая страница — повод проверить, есть ли такой автор вообще
+    if not result[0] and cursor is None and await session.get(Author, author_id) is None:
+        return None
+    await catalog_cache.set(versioned_key, result, _dump_books)
+    return result
+
+
+async def _books_page(session: AsyncSession, query, limit: int, cursor: str | None):
+    # берём на одну запись больше, чтобы понять, есть ли следующая страница
+    books = (await session.scalars(
+        _books_keyset(query, cursor).options(
+            selectinload(Book.authors),
+            selectinload(Book.genres)
+        ).limit(limit + 1)
+    )).all()
+
+    next_cursor = None
+    if len(books) > limit:
+        books = books[:limit]
+        next_cursor = encode_cursor(books[-1].name, books[-1].id)
+
+    return [BookOut.model_validate(book) for book in books], next_cursor
+
+
+# Быстрый вариант get_books: только нужные колонки, авторы и жанры собираются
+# в JSON коррелированными подзапросами, ответ сразу кодируется в байты orjson
+async def get_books_json(
+        session: AsyncSession,
+        limit: int = 20,
+        cursor: str | None = None,
+        genre: str | None = None,
+        author: str | None = None,
+        available: bool | None = None
+) -> bytes:
+    cache_key = json.dumps(['fast', limit, cursor, genre, author, available])
+    cached, versioned_key = await catalog_cache.get('books', cache_key, str.encode)
+    if cached is not None:
+        return cached
+
+    query = _filter_books(_book_rows(session), genre, author, available)
+    rows = (await session.execute(_books_keyset(query, cursor).limit(limit + 1))).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].name, rows[-1].id)
+
+    load = _json_loader(session)
+    result = orjson.dumps({'items': [_book_row_dict(row, load) for row in rows], 'next_cursor': next_cursor})
+    await catalog_cache.set(versioned_key, result, bytes.decode)
+    return result
+
+
+async def get_books_by_ids(session: AsyncSession, ids: list[UUID]) -> list[dict]:
+    # Список чтения одним запросом: авторы и жанры приходят JSON-подзапросами в той же строке.
+    # Порядок — как в запросе, повторы схлопываются, несуществующие id пропускаются
+    rows = {row.id: row for row in (await session.execute(_book_rows(session).where(Book.id.in_(ids)))).all()}
+    load = _json_loader(session)
+    return [_book_row_dict(rows[book_id], load) for book_id in dict.fromkeys(ids) if book_id in rows]
+
+
+def _book_rows(session: AsyncSession):
+    return select(
+        Book.id, Book.name, Book.description, Book.published_at, Book.count_available,
+        _json_agg(session, Author, book_authors.c.author_id, Author.id, Author.username).label('authors'),
+        _json_agg(session, Genre, book_genres.c.genre_id, Genre.id, Genre.name).label('genres')
+    )
+
+
+def _book_row_dict(row, load) -> dict:
+    return {
+        'id': row.id,
+        'name': row.name,
+        'description': row.description,
+        'published_at': row.published_at,
+        'count_available': row.count_available,
+        'authors': load(row.authors),
+        'genres': load(row.genres)
+    }
+
+
+def _books_keyset(query, cursor: str | None):
+    if cursor is not None:
+        name, book_id = decode_cursor(cursor, 2)
+        query = query.where(tuple_(Book.name, Book.id) > (name, UUID(book_id)))
+    return query.order_by(Book.name, Book.id)
+
+
+def _json_agg(session: AsyncSession, table, link_column, *columns):
+    # JSON-массив связанных с книгой строк текстом; ключи — имена колонок из кода, не ввод пользователя
+    pairs = [arg for column in columns for arg in (literal_column(f"'{column.key}'"), column)]
+    if session.bind.dialect.name == 'postgresql':
+        agg = func.json_agg(func.json_build_object(*pairs))
+    else:
+        agg = func.json_group_array(func.json_object(*pairs))
+    return (
+        select(func.coalesce(cast(agg, Text), '[]'))
+        .select_from(table.__table__.join(link_column.table, link_column == table.id))
+        .where(link_column.table.c.book_id == Book.id)
+        .scalar_subquery()
+    )
+
+
+def _json_loader(session: AsyncSession):
+    if session.bind.dialect.name != 'sqlite':
+        return orjson.loads
+
+    # SQLite (тестовая подмена Postgres) хранит UUID как 32 hex-символа без дефисов
+    def load(raw: str):
+        items = orjson.loads(raw)
+        for item in items:
+            item['id'] = str(UUID(item['id']))
+        return items
+    return load
+
+
+def _filter_books(query, genre: str | None, author: str | None, available: bool | None):
+    if genre is not None:
+        query = query.where(Book.genres.any(Genre.name == genre))
+    if author is not None:
+        query = query.where(Book.authors.any(Author.username == author))
+    if available is True:
+        query = query.where(Book.count_available > 0)
+    elif available is False:
+        query = query.where(Book.count_available <= 0)
+    return query
+
+
+async def search_books(
+        session: AsyncSession,
+        q: str,
+        limit: int = 20,
+        cursor: str | None = None,
+        genre: str | None = None,
+        author: str | None = None
+):
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    rank = func.ts_rank_cd(book_search_vector, ts_query)
+
+    query = _filter_books(
+        select(Book, rank.label('rank')).where(book_search_vector.op('@@')(ts_query)),
+        genre, author, None
+    ).options(
+        selectinload(Book.authors),
+        selectinload(Book.genres)
+    )
+
+    if cursor is not None:
+        last_rank, book_id = decode_cursor(cursor, 2)
+        last_rank, book_id = float(last_rank), UUID(book_id)
+        query = query.where(or_(rank < last_rank, and_(rank == last_rank, Book.id > book_id)))
+
+    rows = (await session.execute(
+        query.order_by(rank.desc(), Book.id).limit(limit + 1)
+    )).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].rank, rows[-1].Book.id)
+    return [BookOut.model_validate(row.Book) for row in rows], next_cursor
+
+
+def _dump_books(value):
+    books, next_cursor = value
+    return {'items': [book.model_dump(mode='json') for book in books], 'next_cursor': next_cursor}
+
+
+def _load_books(data):
+    return [BookOut.model_validate(book) for book in data['items']], data['next_cursor']
+
+
+def _name_column(table):
+    return table.name if table == Genre else table.username
+
+
+# Резолвит список имён в строки одним запросом IN (...), ключ словаря — имя
+async def get_by_names(session: AsyncSession, table, names: list[str]) -> dict:
+    column = _name_column(table)
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+
+    rows = (await session.scalars(select(table).where(column.in_(names)))).all()
+    return {getattr(row, column.key): row for row in rows}
+
+
+# Вставляет недостающие имена и возвращает id всех — и новых, и существующих.
+# В Postgres это один запрос: INSERT ... ON CONFLICT DO NOTHING RETURNING в CTE
+# плюс SELECT уже существующих строк. Колонка имени должна быть уникальной.
+async def upsert_by_names(session: AsyncSession, table, names: list[str]) -> dict:
+    column = _name_column(table)
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+
+    dialect = session.bind.dialect.name
+    insert_stmt = (pg_insert if dialect == 'postgresql' else sqlite_insert)(table).values(
+        [{'id': uuid4(), column.key: name} for name in names]
+    ).on_conflict_do_nothing(index_elements=[column.key])
+    existing = select(table.id, column).where(column.in_(names))
+
+    if dialect == 'postgresql':
+        inserted = insert_stmt.returning(table.id, column).cte('inserted')
+        rows = (await session.execute(
+            select(inserted.c.id, inserted.c[column.key]).union_all(existing)
+        )).all()
+    else:
+        await session.execute(insert_stmt)
+        rows = (await session.execute(existing)).all()
+
+    result = {name: row_id for row_id, name in rows}
+    if len(result) < len(names):
+        # строку мог вставить параллельный запрос уже после нашего снимка
+        missing = [name for name in names if name not in result]
+        rows = (await session.execute(select(table.id, column).where(column.in_(missing)))).all()
+        result.update({name: row_id for row_id, name in rows})
+    return result
+
+
+async def get_book_by_id(session: AsyncSession, book_id: UUID):
+    cached, versioned_key = await catalog_cache.get(f'book:{book_id}', '', BookOut.model_validate)
+    if cached is not None:
+        return cached
+
+    book = await session.scalar(
+        select(Book).where(Book.id == book_id).options(
+            selectinload(Book.authors),
+            selectinload(Book.genres)
+        )
+    )
+    if book is None:
+        return None
 
-        return book
-    finally:
-        session.close()
+    result = BookOut.model_validate(book)
+    await catalog_cache.set(versioned_key, result, lambda value: value.model_dump(mode='json'))
+    return result
 
 
-def update_book(book_id: UUID, book_data):
-    session = SessionLocal()
+async def update_book(session: AsyncSession, book_id: UUID, book_data):
     try:
-        book = session.get(Book, book_id)
+        book = await session.get(Book, book_id, options=[
+            selectinload(Book.authors),
+            selectinload(Book.genres)
+        ])
         if book:
             for key, value in book_data.dict(exclude_unset=True).items():
                 if key in ['author_ids', 'genre_ids']:
                     if key == 'author_ids':
-                        book.authors = session.query(Author).filter(Author.id.in_(value)).all()
+                        book.authors = (await session.scalars(
+                            select(Author).where(Author.id.in_(value))
+                        )).all()
                     elif key == 'genre_ids':
-                        book.genres = session.query(Genre).filter(Genre.id.in_(value)).all()
+                        book.genres = (await session.scalars(
+                            select(Genre).where(Genre.id.in_(value))
+                        )).all()
+                        await session.flush()
+                        await refresh_book_genres(session, book_id)
                 else:
                     setattr(book, key, value)
-            session.commit()
-            session.refresh(book)
+            await session.commit()
+            await catalog_cache.invalidate('books', 'authors', f'book:{book_id}')
         return book
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise e
-    finally:
-        session.close()
 
 
-def delete_book(book_id: UUID):
-    session = SessionLocal()
+async def delete_book(session: AsyncSession, book_id: UUID):
+    book = await session.get(Book, book_id, options=[
+        selectinload(Book.authors),
+        selectinload(Book.genres)
+    ])
+    if book:
+        await session.delete(book)
+        await session.commit()
+        await catalog_cache.invalidate('books', 'authors', f'book:{book_id}')
+    return book
+
+
+async def create_author(session: AsyncSession, author: AuthorCreate):
+    new_author = Author(
+        username=author.username,
+        biography=author.biography,
+        birthday=author.birthday
+    )
+    session.add(new_author)
     try:
-        book = session.get(Book, book_id)
-        if book:
-            session.delete(book)
-            session.commit()
-        return book
-    finally:
-        session.close()
+        await session.commit()
+    except IntegrityError:
+        # имя занято: authors.username уникален
+        await session.rollback()
+        raise AuthorExists("Author already exists")
+    await catalog_cache.invalidate('authors')
+    return new_author
 
 
-def create_author(author: AuthorCreate):
-    session = SessionLocal()
-    try:
-        new_author = Author(
-            username=author.username,
-            biography=author.biography,
-            birthday=author.birthday
-        )
-        session.add(new_author)
-        session.commit()
-        session.refresh(new_author)
-        return new_author
-    finally:
-        session.close()
+async def get_authors(session: AsyncSession, limit: int = 20, cursor: str | None = None):
+    cache_key = json.dumps([limit, cursor])
+    cached, versioned_key = await catalog_cache.get('authors', cache_key, _load_authors)
+    if cached is not None:
+        return cached
 
+    rows = (await session.execute(_authors_query(cursor).limit(limit + 1))).all()
+    rows, next_cursor = _authors_next_cursor(rows, limit)
+    result = [AuthorSummary.model_validate(row._asdict()) for row in rows], next_cursor
+    await catalog_cache.set(versioned_key, result, _dump_authors)
+    return result
 
-def get_authors():
-    session = SessionLocal()
-    try:
-        return session.query(Author).all()
-    finally:
-        session.close()
 
+async def get_authors_json(session: AsyncSession, limit: int = 20, cursor: str | None = None) -> bytes:
+    cache_key = json.dumps(['fast', limit, cursor])
+    cached, versioned_key = await catalog_cache.get('authors', cache_key, str.encode)
+    if cached is not None:
+        return cached
 
-def readers():
-    session = SessionLocal()
-    try:
-        return session.query(UserReader).all()
-    finally:
-        session.close()
+    rows = (await session.execute(_authors_query(cursor).limit(limit + 1))).all()
+    rows, next_cursor = _authors_next_cursor(rows, limit)
+    result = orjson.dumps({'items': [row._asdict() for row in rows], 'next_cursor': next_cursor})
+    await catalog_cache.set(versioned_key, result, bytes.decode)
+    return result
 
 
-def give_book(user: UUID | str, book_id: UUID):
-    session = SessionLocal()
+def _authors_query(cursor: str | None):
+    # число книг — коррелированный count по ix_book_authors_author_id, только для авторов страницы
+    books_count = (
+        select(func.count())
+        .select_from(book_authors)
+        .where(book_authors.c.author_id == Author.id)
+        .scalar_subquery()
+    )
+    query = select(Author.id, Author.username, books_count.label('books_count'))
+    # имя автора уникально, поэтому ключа из одного username хватает и страницы идут по authors_username_key
+    if cursor is not None:
+        username, = decode_cursor(cursor, 1)
+        query = query.where(Author.username > username)
+    return query.order_by(Author.username)
 
-    try:
-        if isinstance(user, str):
-            user = get_something_id(UserReader, user).id  # предполагаем, что возвращает UUID
-
-        # Проверяем, есть ли уже такая запись
-        existing = session.execute(
-            select(reader_books).where(
-                (reader_books.c.reader_id == user) &
-                (reader_books.c.book_id == book_id) &
-                (reader_books.c.input_date is None)
-            )
-        ).first()
 
-        if existing:
-            raise ValueError("Книга уже выдана этому пользователю и не возвращена")
+def _authors_next_cursor(rows, limit: int):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1].username)
+    return rows, None
 
-        session.execute(
-            reader_books.insert().values(
-                reader_id=user,
-                book_id=book_id,
-                output_date=datetime.utcnow()
-            )
-        )
-        session.commit()
 
+def _dump_authors(result):
+    authors, next_cursor = result
+    return [[author.model_dump(mode='json') for author in authors], next_cursor]
+
+
+def _load_authors(data):
+    authors, next_cursor = data
+    return [AuthorSummary.model_validate(author) for author in authors], next_cursor
+
+
+async def readers(session: AsyncSession):
+    rows = (await session.execute(
+        select(UserReader.id, User.username, User.email, UserReader.info, UserReader.can_get_more)
+        .join(UserReader.user)
+    )).all()
+    return [row._asdict() for row in rows]
+
+
+async def give_book(session: AsyncSession, user: UUID | str, book_id: UUID):
+    return await checkout(session, await _reader_id(session, user), book_id)
+
+
+async def give_books(session: AsyncSession, user: UUID | str, book_ids: list[UUID]):
+    return await checkout_many(session, await _reader_id(session, user), book_ids)
+
+
+async def take_book_back(session: AsyncSession, user: UUID | str, book_id: UUID):
+    return await return_book(session, await _reader_id(session, user), book_id)
+
+
+async def renew_book(session: AsyncSession, user: UUID | str, book_id: UUID):
+    return await renew(session, await _reader_id(session, user), book_id)
+
+
+async def _reader_id(session: AsyncSession, user: UUID | str) -> UUID:
+    if isinstance(user, UUID):
+        return user
+    reader_id = await session.scalar(
+        select(UserReader.id).join(UserReader.user).where(User.username == user)
+    )
+    if reader_id is None:
+        raise LoanNotFound("Читатель не найден")
+    return reader_id
+
+
+async def import_books(
+        session: AsyncSession,
+        rows: AsyncIterator[tuple[int, dict | Exception]],
+        batch_size: int = settings.imports.batch_size,
+        max_errors: int = settings.imports.max_errors
+):
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+
+    def fail(row_no: int | None, error: str):
+        report['failed'] += 1
+        if len(report['errors']) < max_errors:
+            report['errors'].append({'row': row_no, 'error': error})
+
+    batch = []
+    try:
+        async for row_no, row in rows:
+            if isinstance(row, Exception):
+                fail(row_no, str(row))
+                continue
+            try:
+                batch.append((row_no, BookCreate.model_validate(row)))
+            except ValidationError as e:
+                fail(row_no, '; '.join(
+                    f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+                ))
+                continue
+
+            if len(batch) >= batch_size:
+                await _import_batch(session, batch, report, fail)
+                batch = []
+    except ValueError as e:
+        # поток дальше не разобрать — пишем то, что успели, и прекращаем
+        fail(None, str(e))
+
+    if batch:
+        await _import_batch(session, batch, report, fail)
+    if report['imported']:
+        await catalog_cache.invalidate('books', 'authors', 'genres')
+    return report
+
+
+async def _import_batch(session: AsyncSession, batch: list[tuple[int, BookCreate]], report: dict, fail):
+    try:
+        authors = await upsert_by_names(session, Author, [name for _, book in batch for name in book.authors])
+        genres = await upsert_by_names(session, Genre, [name for _, book in batch for name in book.genres])
+
+        books, links_authors, links_genres = [], [], []
+        for _, book in batch:
+            book_id = uuid4()
+            books.append({
+                'id': book_id,
+                'name': book.name,
+                'description': book.description,
+                'published_at': book.published_at,
+                'count_available': book.count_available
+            })
+            links_authors.extend({'book_id': book_id, 'author_id': authors[name]} for name in set(book.authors))
+            links_genres.extend({'book_id': book_id, 'genre_id': genres[name]} for name in set(book.genres))
+
+        await session.execute(insert(Book), books)
+        if links_authors:
+            await session.execute(insert(book_authors), links_authors)
+        if links_genres:
+            await session.execute(insert(book_genres), links_genres)
+        await session.commit()
+        report['imported'] += len(batch)
     except Exception as e:
-        session.rollback()
-        raise e
-    finally:
-        session.close()
+        await session.rollback()
+        if len(batch) == 1:
+            fail(batch[0][0], f"Row failed: {e}")
+            return
+        # Одна плохая строка не должна топить пачку: повторяем её построчно, тогда в отчёт
+        # попадают только виноватые строки, а остальные загружаются. Медленно, но лишь для
+        # пачек, в которых что-то упало
+        for item in batch:
+            await _import_batch(session, [item], report, fail)
+
+
+async def export_books(
+        session: AsyncSession,
+        chunk_size: int = settings.exports.chunk_size
+) -> AsyncIterator[list[dict]]:
+    # Серверный курсор отдаёт книги пачками по chunk_size, авторы и жанры догружаются
+    # двумя запросами на пачку — в памяти одновременно лежит только одна пачка
+    result = await session.stream(
+        select(Book.id, Book.name, Book.description, Book.published_at, Book.count_available)
+        .order_by(Book.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    async for partition in result.partitions():
+        ids = [row.id for row in partition]
+        names = {'authors': {}, 'genres': {}}
+        for key, link, model, column in (
+                ('authors', book_authors.c.author_id, Author, Author.username),
+                ('genres', book_genres.c.genre_id, Genre, Genre.name)
+        ):
+            rows = await session.execute(
+                select(link.table.c.book_id, column)
+                .join(model, model.id == link)
+                .where(link.table.c.book_id.in_(ids))
+                .order_by(column)
+            )
+            for book_id, name in rows:
+                names[key].setdefault(book_id, []).append(name)
+
+        yield [
+            {
+                'id': row.id,
+                'name': row.name,
+                'description': row.description,
+                'published_at': row.published_at,
+                'count_available': row.count_available,
+                'authors': names['authors'].get(row.id, []),
+                'genres': names['genres'].get(row.id, [])
+            }
+            for row in partition
+        ]
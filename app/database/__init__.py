@@ -1,10 +1,33 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
 from settings import settings
+from app.database.pool import TimedQueuePool, TimedAsyncQueuePool, engine_options
 
 DB_URL = settings.DB.DB_URL
+ASYNC_DB_URL = settings.DB.ASYNC_DB_URL
 
-engine = create_engine(DB_URL)
+engine = create_engine(DB_URL, **engine_options(DB_URL, TimedQueuePool))
 SessionLocal = sessionmaker(bind=engine)
 
+async_engine = create_async_engine(ASYNC_DB_URL, **engine_options(ASYNC_DB_URL, TimedAsyncQueuePool))
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
 Base = declarative_base()
+
+
+def pool_stats() -> dict:
+    return {
+        'sync': engine.pool.stats.snapshot(engine.pool),
+        'async': async_engine.pool.stats.snapshot(async_engine.pool)
+    }
+
+
+async def get_session():
+    # Одна сессия на запрос: все CRUD-вызовы внутри обработчика работают через неё
+    async with AsyncSessionLocal() as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, String, DateTime, Integer, Table, ForeignKey, MetaData, LargeBinary, func, JSON
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, DateTime, Integer, BigInteger, Table, ForeignKey, MetaData, LargeBinary, func, JSON, Index
+from sqlalchemy import literal_column, text, CheckConstraint
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
 from sqlalchemy.orm import relationship
-from app.database import Base, engine
+from app.database import Base
 from uuid import uuid4
 from datetime import datetime
 
@@ -13,23 +14,75 @@ book_authors = Table(
     'book_authors',
     Base.metadata,
     Column('book_id', UUID, ForeignKey('books.id', ondelete='CASCADE'), primary_key=True),
-    Column('author_id', UUID, ForeignKey('authors.id', ondelete='CASCADE'), primary_key=True)
+    Column('author_id', UUID, ForeignKey('authors.id', ondelete='CASCADE'), primary_key=True),
+    # PK (book_id, author_id) не помогает искать по второй колонке
+    Index('ix_book_authors_author_id', 'author_id')
 )
 
 book_genres = Table(
     'book_genres',
     Base.metadata,
     Column('book_id', UUID, ForeignKey('books.id', ondelete='CASCADE'), primary_key=True),
-    Column('genre_id', UUID, ForeignKey('genres.id', ondelete='CASCADE'), primary_key=True)
+    Column('genre_id', UUID, ForeignKey('genres.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_book_genres_genre_id', 'genre_id')
 )
 
 reader_books = Table(
     'reader_books',
     Base.metadata,
-    Column('reader_id', UUID, ForeignKey('readers.id', ondelete='CASCADE'), primary_key=True),
-    Column('book_id', UUID, ForeignKey('books.id', ondelete='CASCADE'), primary_key=True),
+    Column('id', UUID(as_uuid=True), primary_key=True, default=uuid4),
+    Column('reader_id', UUID, ForeignKey('readers.id', ondelete='CASCADE'), nullable=False),
+    Column('book_id', UUID, ForeignKey('books.id', ondelete='CASCADE'), nullable=False),
     Column('output_date', DateTime, default=datetime.utcnow),
-    Column('input_date', DateTime, nullable=True)
+    Column('due_date', DateTime, nullable=True),
+    Column('renewals', Integer, nullable=False, default=0),
+    Column('input_date', DateTime, nullable=True),
+    # одна открытая выдача книги на читателя; закрытые (возвращённые) не мешают взять снова
+    Index(
+        'ux_reader_books_open', 'reader_id', 'book_id', unique=True,
+        postgresql_where=text('input_date IS NULL'),
+        sqlite_where=text('input_date IS NULL')
+    ),
+    Index('ix_reader_books_book_id', 'book_id'),
+    # просроченные выдачи: только открытые, отсортированные по сроку
+    Index(
+        'ix_reader_books_open_due', 'due_date',
+        postgresql_where=text('input_date IS NULL'),
+        sqlite_where=text('input_date IS NULL')
+    )
+)
+
+
+# Сводки по выдачам для отчётов. Обновляются в тех же транзакциях, что выдача
+# и возврат (app.reports), пересобираются целиком командой `python -m app.reports rebuild`.
+book_loan_stats = Table(
+    'book_loan_stats',
+    Base.metadata,
+    Column('book_id', UUID, ForeignKey('books.id', ondelete='CASCADE'), primary_key=True),
+    Column('loans_total', Integer, nullable=False, default=0),
+    Column('open_loans', Integer, nullable=False, default=0),
+    Column('last_loan_at', DateTime),
+    Index('ix_book_loan_stats_loans_total', 'loans_total')
+)
+
+# счётчик книги продублирован по её жанрам, чтобы топ жанра читался по индексу, без соединения
+genre_book_loan_stats = Table(
+    'genre_book_loan_stats',
+    Base.metadata,
+    Column('genre_id', UUID, ForeignKey('genres.id', ondelete='CASCADE'), primary_key=True),
+    Column('book_id', UUID, ForeignKey('books.id', ondelete='CASCADE'), primary_key=True),
+    Column('loans_total', Integer, nullable=False, default=0),
+    Index('ix_genre_book_loan_stats_top', 'genre_id', 'loans_total')
+)
+
+reader_loan_stats = Table(
+    'reader_loan_stats',
+    Base.metadata,
+    Column('reader_id', UUID, ForeignKey('readers.id', ondelete='CASCADE'), primary_key=True),
+    Column('loans_total', Integer, nullable=False, default=0),
+    Column('open_loans', Integer, nullable=False, default=0),
+    Column('last_loan_at', DateTime),
+    Index('ix_reader_loan_stats_loans_total', 'loans_total')
 )
 
 
@@ -45,17 +98,48 @@ class Book(Base):
     authors = relationship('Author', secondary=book_authors, back_populates='books')
     genres = relationship('Genre', secondary=book_genres, back_populates='books')
 
+    __table_args__ = (
+        Index('ix_books_name_id', 'name', 'id'),
+    )
+
+
+# Полнотекстовый индекс по названию и описанию книги. Сама колонка (generated
+# tsvector + GIN) создаётся миграцией и есть только в Postgres, поэтому в ORM
+# не маппится — поиск обращается к ней напрямую.
+SEARCH_CONFIG = 'simple'
+book_search_vector = literal_column('books.search_vector', type_=TSVECTOR)
+
+
+class User(Base):
+    # Учётные записи всех ролей: вход — один поиск по уникальному индексу username.
+    # Профили читателя и автора ссылаются сюда один к одному.
+    __tablename__ = 'users'
+    __table_args__ = (
+        CheckConstraint("role IN ('reader', 'admin', 'author')", name='ck_users_role'),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
+    username = Column(String, unique=True, nullable=False)
+    password = Column(LargeBinary)
+    role = Column(String, nullable=False)
+    email = Column(String)
+
+    reader = relationship('UserReader', back_populates='user', uselist=False)
+    author = relationship('Author', back_populates='user', uselist=False)
+
 
 class Author(Base):
     __tablename__ = 'authors'
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    username = Column(String, nullable=False)
-    password = Column(LargeBinary)
+    # имя автора в каталоге; у автора может и не быть учётной записи
+    username = Column(String, unique=True, nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='SET NULL'), unique=True)
     biography = Column(String)
     birthday = Column(DateTime)
 
     books = relationship('Book', secondary=book_authors, back_populates='authors')
+    user = relationship('User', back_populates='author')
 
 
 class Genre(Base):
@@ -71,32 +155,41 @@ class UserReader(Base):
     __tablename__ = 'readers'
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    username = Column(String)
-    password = Column(LargeBinary)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id', ondelete='CASCADE'), unique=True, nullable=False)
     info = Column(String)
     can_get_more = Column(Integer, default=5)
-    email = Column(String)
-
-    books = relationship('Book', secondary=reader_books, backref='readers')
 
-
-class Admin(Base):
-    __tablename__ = 'admins'
-
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
-    username = Column(String)
-    password = Column(LargeBinary)
+    # только чтение: выдача и возврат идут через app.loans, чтобы не разъехались счётчики
+    books = relationship('Book', secondary=reader_books, backref='readers', viewonly=True)
+    user = relationship('User', back_populates='reader')
 
 
 class Logs(Base):
+    # В Postgres таблица секционирована по at_time (миграция 5e8a0c3b7d21), и её первичный
+    # ключ там (id, at_time); разделы создаёт и удаляет app.utils.log_maintenance
     __tablename__ = 'logs'
+    __table_args__ = (
+        Index('ix_logs_at_time', 'at_time'),
+        {'postgresql_partition_by': 'RANGE (at_time)'}
+    )
 
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    at_time = Column(DateTime, server_default=func.now())
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    at_time = Column(DateTime, nullable=False, server_default=func.now())
     level = Column(String)
     message = Column(String)
     context = Column(JSON)
 
 
-Base.metadata.create_all(bind=engine)
+class LogRollup(Base):
+    # поминутная сводка по маршруту: сюда смотрят дашборды, а не в сырые логи
+    __tablename__ = 'log_rollups'
 
+    minute = Column(DateTime, primary_key=True)
+    method = Column(String, primary_key=True)
+    route = Column(String, primary_key=True)
+    requests = Column(Integer, nullable=False)
+    errors = Column(Integer, nullable=False)
+    p50_ms = Column(Integer)
+    p95_ms = Column(Integer)
+    p99_ms = Column(Integer)
+    max_ms = Column(Integer)
@@ -0,0 +1,91 @@
+import threading
+import time
+from uuid import uuid4
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from settings import settings
+
+
+class PoolStats:
+    # Время ожидания соединения из пула: растёт, когда запросов больше, чем
+    # pool_size + max_overflow, и это первый признак, что пул мал для воркера
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, waited: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def snapshot(self, pool) -> dict:
+        return {
+            'size': pool.size(),
+            'in_use': pool.checkedout(),
+            'idle': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'wait_avg_ms': self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0,
+            'wait_max_ms': self.wait_max * 1000
+        }
+
+
+class _TimedPool:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() пересоздаёт пул, счётчики переносим в новый
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def engine_options(url: str, poolclass) -> dict:
+    options = dict(
+        poolclass=poolclass,
+        pool_size=settings.DB.pool_size,
+        max_overflow=settings.DB.max_overflow,
+        pool_timeout=settings.DB.pool_timeout,
+        pool_recycle=settings.DB.pool_recycle,
+        pool_pre_ping=settings.DB.pool_pre_ping
+    )
+    if settings.DB.pgbouncer and url.startswith('postgresql+asyncpg'):
+        # Кеш prepared statements asyncpg и SQLAlchemy выключаем, а безымянные
+        # операторы получают уникальные имена, чтобы не столкнуться в чужой сессии
+        options['connect_args'] = {
+            'statement_cache_size': 0,
+            'prepared_statement_cache_size': 0,
+            'prepared_statement_name_func': lambda: f'__asyncpg_{uuid4()}__'
+        }
+    return options
+
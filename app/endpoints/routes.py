@@ -1,22 +1,39 @@
 from uuid import UUID
-from fastapi import APIRouter, HTTPException, status, Cookie, Response, Body
-from app.schemas import UserSchema, Token, BookCreate, BookOut, AuthorCreate, AuthorOut, User, Genres
-from app.utils.jwt_secure import encode_jwt, check_password, decode_jwt
+from fastapi import APIRouter, HTTPException, status, Cookie, Response, Body, Query, Depends, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import AsyncSessionLocal, get_session, pool_stats
+from app.loans import LoanError, LoanNotFound
+from app.reports import top_books, active_readers, overdue_loans
+from app.utils.cache import catalog_cache, principal_cache
+from app.utils.exporters import csv_chunks, ndjson_chunks
+from app.utils.importers import iter_csv, iter_ndjson
+from app.utils.log_writer import log_writer
+from app.utils.metrics import TimedRoute, metrics
+from app.utils.rate_limit import admission
+from app.schemas import UserSchema, Token, BookCreate, BookOut, BookPage, AuthorCreate, AuthorPage, User, Genres, GenreOut
+from app.utils.jwt_secure import encode_jwt, decode_jwt, password_hasher, PasswordHasherBusy
+from settings import settings
 from app.crud import (
-    create_user, get_user_by_username, create_book,
-    get_books, get_book_by_id, create_author, get_authors, create_genre, readers, give_book
+    UsernameTaken, AuthorExists, UserHasLoans,
+    create_user, get_user_by_username, set_password, delete_user, create_book,
+    get_books, get_books_json, get_books_by_ids, search_books, import_books, export_books, get_book_by_id,
+    create_author, get_authors, get_authors_json, get_author_books, create_genre, readers,
+    give_book, give_books, take_book_back, renew_book
 )
 
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.post('/register', response_model=Token)
-async def registration(response: Response, data: UserSchema):
-    db_user = get_user_by_username(data.username, data.role)
-    if db_user:
-        raise HTTPException(status_code=400, detail="Username already registered")
-    create_user(data)
+async def registration(response: Response, data: UserSchema, session: AsyncSession = Depends(get_session)):
+    try:
+        await create_user(session, data)
+    except UsernameTaken as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server is busy, try again later", headers={'Retry-After': '1'})
 
     jwt_payload = {
         'username': data.username,
@@ -30,10 +47,17 @@ async def registration(response: Response, data: UserSchema):
 
 
 @router.post('/login', response_model=Token)
-async def auth(response: Response, form_data: User):
-    db_user = get_user_by_username(form_data.username, form_data.role)
-    if not db_user or not check_password(form_data.password, db_user.password):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
+async def auth(response: Response, form_data: User, session: AsyncSession = Depends(get_session)):
+    db_user = await get_user_by_username(session, form_data.username, form_data.role)
+    try:
+        if not db_user or not await password_hasher.verify(form_data.password, db_user.password):
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+
+        # хеш со старым cost-фактором тихо обновляем, пока пароль у нас на руках
+        if password_hasher.needs_rehash(db_user.password):
+            await set_password(session, db_user, await password_hasher.hash(form_data.password))
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server is busy, try again later", headers={'Retry-After': '1'})
 
     jwt_payload = {
         'username': db_user.username,
@@ -46,11 +70,29 @@ async def auth(response: Response, form_data: User):
     return Token(access_token=token, token_type='Bearer')
 
 
+@router.delete('/users/{username}')
+async def delete_user_view(
+    username: str,
+    role: str = Query('reader', pattern='^(reader|admin)$'),
+    access_token: str = Cookie(),
+    session: AsyncSession = Depends(get_session)
+):
+    if decode_jwt(access_token)['role'] != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    try:
+        deleted = await delete_user(session, username, role)
+    except UserHasLoans as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"detail": "Пользователь удалён"}
+
+
 @router.get('/readers')
-async def get_readers(access_token: str = Cookie()):
+async def get_readers(access_token: str = Cookie(), session: AsyncSession = Depends(get_session)):
     role = decode_jwt(access_token)['role']
     if role == 'admin':
-        return readers()
+        return await readers(session)
     return HTTPException(status_code=401)
 
 
@@ -58,56 +100,300 @@ async def get_readers(access_token: str = Cookie()):
 async def give_book_view(
     user: UUID | str,
     book_id: UUID = Body(...),
-    access_token: str = Cookie()
+    access_token: str = Cookie(),
+    session: AsyncSession = Depends(get_session)
+):
+    role = decode_jwt(access_token)['role']
+    if role != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can give books")
+
+    try:
+        loan = await give_book(session, user, book_id)
+        return {"detail": "Книга успешно выдана", "due_date": loan['due_date']}
+    except LoanNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except LoanError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post('/give_books')
+async def give_books_view(
+    user: UUID | str,
+    book_ids: list[UUID] = Body(..., min_length=1, max_length=100),
+    access_token: str = Cookie(),
+    session: AsyncSession = Depends(get_session)
 ):
     role = decode_jwt(access_token)['role']
     if role != 'admin':
         raise HTTPException(status_code=403, detail="Only admins can give books")
 
     try:
-        give_book(user, book_id)
-        return {"detail": "Книга успешно выдана"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return {"results": await give_books(session, user, book_ids)}
+    except LoanNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except LoanError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 
-@router.post('/genres')
-async def create_genres(genres: Genres, access_token: str = Cookie()):
+@router.post('/return_book')
+async def return_book_view(
+    user: UUID | str,
+    book_id: UUID = Body(...),
+    access_token: str = Cookie(),
+    session: AsyncSession = Depends(get_session)
+):
+    role = decode_jwt(access_token)['role']
+    if role != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can take books back")
+
+    try:
+        await take_book_back(session, user, book_id)
+        return {"detail": "Книга возвращена"}
+    except LoanNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post('/renew_book')
+async def renew_book_view(
+    user: UUID | str,
+    book_id: UUID = Body(...),
+    access_token: str = Cookie(),
+    session: AsyncSession = Depends(get_session)
+):
+    role = decode_jwt(access_token)['role']
+    if role != 'admin':
+        raise HTTPException(status_code=403, detail="Only admins can renew books")
+
+    try:
+        loan = await renew_book(session, user, book_id)
+        return {"detail": "Выдача продлена", "due_date": loan['due_date']}
+    except LoanNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except LoanError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post('/genres', response_model=list[GenreOut])
+async def create_genres(genres: Genres, access_token: str = Cookie(), session: AsyncSession = Depends(get_session)):
     role = decode_jwt(access_token)['role']
     if role != 'admin':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-    return create_genre(genres)
+    return await create_genre(session, genres)
 
 
 @router.post('/books', response_model=BookOut)
-async def create_book_view(book: BookCreate, access_token: str = Cookie()):
+async def create_book_view(book: BookCreate, access_token: str = Cookie(), session: AsyncSession = Depends(get_session)):
+    role = decode_jwt(access_token)['role']
+    if role != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    try:
+        return await create_book(session, book)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post('/books/import')
+async def import_books_view(request: Request, access_token: str = Cookie(), session: AsyncSession = Depends(get_session)):
+    role = decode_jwt(access_token)['role']
+    if role != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+    # text/csv или NDJSON (по умолчанию); тело читается потоком, а не целиком
+    if 'csv' in request.headers.get('content-type', ''):
+        rows = iter_csv(request.stream())
+    else:
+        rows = iter_ndjson(request.stream())
+    return await import_books(session, rows)
+
+
+@router.get('/books/export')
+async def export_books_view(
+    format: str = Query('ndjson', pattern='^(ndjson|csv)$'),
+    access_token: str = Cookie()
+):
     role = decode_jwt(access_token)['role']
     if role != 'admin':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-    return create_book(book)
+
+    # сессия живёт вместе с потоком ответа: сессия из get_session закрылась бы раньше,
+    # чем клиент дочитает выгрузку
+    async def body():
+        async with AsyncSessionLocal() as session:
+            encode = csv_chunks if format == 'csv' else ndjson_chunks
+            async for chunk in encode(export_books(session)):
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type='text/csv' if format == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename="books.{format}"'}
+    )
+
+
+@router.get('/books', response_model=BookPage)
+async def list_books(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    genre: str | None = None,
+    author: str | None = None,
+    available: bool | None = None,
+    ids: list[UUID] | None = Query(None, max_length=100),
+    session: AsyncSession = Depends(get_session)
+):
+    # ?ids=...&ids=... — конкретные книги одним запросом, без фильтров и страниц
+    if ids:
+        return BookPage(items=await get_books_by_ids(session, ids))
+    try:
+        if settings.App.FAST_LISTS:
+            body = await get_books_json(session, limit, cursor, genre, author, available)
+            return Response(content=body, media_type='application/json')
+        books, next_cursor = await get_books(session, limit, cursor, genre, author, available)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return BookPage(items=books, next_cursor=next_cursor)
 
 
-@router.get('/books', response_model=list[BookOut])
-async def list_books():
-    return get_books()
+@router.get('/books/search', response_model=BookPage)
+async def search_books_view(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    genre: str | None = None,
+    author: str | None = None,
+    session: AsyncSession = Depends(get_session)
+):
+    try:
+        books, next_cursor = await search_books(session, q, limit, cursor, genre, author)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return BookPage(items=books, next_cursor=next_cursor)
 
 
 @router.get('/books/{book_id}', response_model=BookOut)
-async def get_book(book_id: UUID):
-    book = get_book_by_id(book_id)
+async def get_book(book_id: UUID, session: AsyncSession = Depends(get_session)):
+    book = await get_book_by_id(session, book_id)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     return book
 
 
 @router.post('/authors')
-async def create_author_view(author: AuthorCreate, access_token: str = Cookie()):
+async def create_author_view(author: AuthorCreate, access_token: str = Cookie(), session: AsyncSession = Depends(get_session)):
     role = decode_jwt(access_token)['role']
     if role != 'admin':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-    return create_author(author)
+    try:
+        return await create_author(session, author)
+    except AuthorExists as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get('/authors', response_model=AuthorPage)
+async def list_authors(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_session)
+):
+    try:
+        if settings.App.FAST_LISTS:
+            return Response(content=await get_authors_json(session, limit, cursor), media_type='application/json')
+        authors, next_cursor = await get_authors(session, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return AuthorPage(items=authors, next_cursor=next_cursor)
+
+
+@router.get('/authors/{author_id}/books', response_model=BookPage)
+async def list_author_books(
+    author_id: UUID,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_session)
+):
+    try:
+        page = await get_author_books(session, author_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if page is None:
+        raise HTTPException(status_code=404, detail="Author not found")
+    books, next_cursor = page
+    return BookPage(items=books, next_cursor=next_cursor)
+
+
+@router.get('/reports/top_books')
+async def top_books_report(
+    genre: str | None = None,
+    limit: int = Query(10, ge=1, le=100),
+    access_token: str = Cookie(),
+    session: AsyncSession = Depends(get_session)
+):
+    if decode_jwt(access_token)['role'] != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    return await top_books(session, genre, limit)
+
+
+@router.get('/reports/active_readers')
+async def active_readers_report(
+    limit: int = Query(10, ge=1, le=100),
+    access_token: str = Cookie(),
+    session: AsyncSession = Depends(get_session)
+):
+    if decode_jwt(access_token)['role'] != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    return await active_readers(session, limit)
+
+
+@router.get('/reports/overdue')
+async def overdue_report(
+    limit: int = Query(50, ge=1, le=500),
+    access_token: str = Cookie(),
+    session: AsyncSession = Depends(get_session)
+):
+    if decode_jwt(access_token)['role'] != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    return await overdue_loans(session, limit)
+
+
+@router.get('/stats/cache')
+async def cache_stats(access_token: str = Cookie()):
+    role = decode_jwt(access_token)['role']
+    if role != 'admin':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    return catalog_cache.stats()
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+async def prometheus_metrics():
+    pools = pool_stats()
+    cache = catalog_cache.stats()
+    principals = principal_cache.stats()
+    admitted = admission.stats()
 
+    def per_engine(key: str, scale: float = 1):
+        return [({'engine': name}, stats[key] * scale) for name, stats in pools.items()]
 
-@router.get('/authors', response_model=list[AuthorOut])
-async def list_authors():
-    return get_authors()
\ No newline at end of file
+    return PlainTextResponse(metrics.render([
+        ('db_pool_size', 'gauge', 'Connections kept in the pool.', per_engine('size')),
+        ('db_pool_connections_in_use', 'gauge', 'Connections checked out of the pool.', per_engine('in_use')),
+        ('db_pool_overflow', 'gauge', 'Connections opened above pool_size.', per_engine('overflow')),
+        ('db_pool_checkouts_total', 'counter', 'Connections handed out by the pool.', per_engine('checkouts')),
+        ('db_pool_timeouts_total', 'counter', 'Checkouts that hit pool_timeout.', per_engine('timeouts')),
+        ('db_pool_wait_seconds_avg', 'gauge', 'Average wait for a connection.', per_engine('wait_avg_ms', 0.001)),
+        ('db_pool_wait_seconds_max', 'gauge', 'Longest wait for a connection.', per_engine('wait_max_ms', 0.001)),
+        ('log_writer_written_total', 'counter', 'Log records written to the database.', [({}, log_writer.written)]),
+        ('log_writer_dropped_total', 'counter', 'Log records dropped on overflow.', [({}, log_writer.dropped)]),
+        ('catalog_cache_hits_total', 'counter', 'Catalog cache hits.', [({}, cache['hits'])]),
+        ('catalog_cache_misses_total', 'counter', 'Catalog cache misses.', [({}, cache['misses'])]),
+        ('catalog_cache_size', 'gauge', 'Entries in the local catalog cache.', [({}, cache['size'])]),
+        ('principal_cache_hits_total', 'counter', 'User lookups served from memory.', [({}, principals['hits'])]),
+        ('principal_cache_misses_total', 'counter', 'User lookups that went to the database.',
+         [({}, principals['misses'])]),
+        ('principal_cache_size', 'gauge', 'Users held in the principal cache.', [({}, principals['size'])]),
+        ('password_hash_pending', 'gauge', 'bcrypt jobs queued or running.', [({}, password_hasher.pending)]),
+        ('admission_rejected_total', 'counter', 'Requests turned away by rate or concurrency limits.', [
+            ({'group': group, 'reason': reason}, count)
+            for (group, reason), count in sorted(admitted['rejected'].items())
+        ]),
+        ('admission_in_flight', 'gauge', 'Requests running in a limited route group.',
+         [({'group': group}, count) for group, count in admitted['in_flight'].items()])
+    ]), media_type='text/plain; version=0.0.4')
@@ -0,0 +1,236 @@
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import select, update, insert, and_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Book, UserReader, reader_books
+from app.reports import record_checkout, record_checkouts, record_return
+from app.utils.cache import catalog_cache
+from settings import settings
+
+
+# Выдача, возврат и продление книг. Каждая операция — одна транзакция из
+# условных UPDATE ... WHERE ... RETURNING: проверка и изменение счётчика
+# происходят в одном запросе, поэтому гонок "прочитал, потом записал" нет,
+# а блокируется только одна строка книги и одна строка читателя.
+# Выдача блокирует книгу, читателя, затем выдачу и сводки app.reports. Возврат
+# начинает с закрытия выдачи: если её нет, он ничего не блокирует и не трогает
+# счётчики; с выдачей той же книги тому же читателю он встречается только на
+# ux_reader_books_open, где Postgres при взаимной блокировке откатит одну из двух.
+
+
+class LoanError(ValueError):
+    pass
+
+
+class BookUnavailable(LoanError):
+    pass
+
+
+class LoanLimitReached(LoanError):
+    pass
+
+
+class AlreadyBorrowed(LoanError):
+    pass
+
+
+class LoanNotFound(LoanError):
+    pass
+
+
+class RenewalLimitReached(LoanError):
+    pass
+
+
+def _open_loan(reader_id: UUID, book_id: UUID):
+    return and_(
+        reader_books.c.reader_id == reader_id,
+        reader_books.c.book_id == book_id,
+        reader_books.c.input_date.is_(None)
+    )
+
+
+def _add_days(session: AsyncSession, column, days: int):
+    # SQLite (тестовая подмена Postgres) не умеет timestamp + interval
+    if session.bind.dialect.name == 'sqlite':
+        return func.datetime(column, f'+{days} days')
+    return column + timedelta(days=days)
+
+
+async def checkout(session: AsyncSession, reader_id: UUID, book_id: UUID) -> dict:
+    now = datetime.utcnow()
+    try:
+        book = (await session.execute(
+            update(Book)
+            .where(Book.id == book_id, Book.count_available > 0)
+            .values(count_available=Book.count_available - 1)
+            .returning(Book.id)
+        )).first()
+        if book is None:
+            raise BookUnavailable("Книга не найдена или все экземпляры выданы")
+
+        reader = (await session.execute(
+            update(UserReader)
+            .where(UserReader.id == reader_id, UserReader.can_get_more > 0)
+            .values(can_get_more=UserReader.can_get_more - 1)
+            .returning(UserReader.id)
+        )).first()
+        if reader is None:
+            raise LoanLimitReached("Читатель не найден или исчерпал лимит книг")
+
+        due_date = now + timedelta(days=settings.loans.period_days)
+        try:
+            loan_id = (await session.execute(
+                insert(reader_books)
+                .values(reader_id=reader_id, book_id=book_id, output_date=now, due_date=due_date, renewals=0)
+                .returning(reader_books.c.id)
+            )).scalar_one()
+        except IntegrityError:
+            # сработал частичный уникальный индекс ux_reader_books_open
+            raise AlreadyBorrowed("Книга уже выдана этому пользователю и не возвращена")
+
+        await record_checkout(session, reader_id, book_id, now)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+
+    await catalog_cache.invalidate('books', f'book:{book_id}')
+    return {'id': loan_id, 'reader_id': reader_id, 'book_id': book_id, 'output_date': now, 'due_date': due_date}
+
+
+async def checkout_many(session: AsyncSession, reader_id: UUID, book_ids: list[UUID]) -> list[dict]:
+    # Пачка выдач одному читателю в одной транзакции. Число запросов не зависит от
+    # числа книг: каждое условие проверяется сразу для всей пачки. По каждой книге
+    # возвращается итог: выдана или почему нет; недоступные книги не мешают остальным.
+    now = datetime.utcnow()
+    book_ids = list(dict.fromkeys(book_ids))
+    results = {}
+    try:
+        borrowed = set((await session.execute(
+            select(reader_books.c.book_id)
+            .where(reader_books.c.reader_id == reader_id, reader_books.c.input_date.is_(None),
+                   reader_books.c.book_id.in_(book_ids))
+        )).scalars())
+        for book_id in borrowed:
+            results[book_id] = {
+                'status': 'already_borrowed', 'detail': "Книга уже выдана этому пользователю и не возвращена"
+            }
+
+        # книги блокируем по возрастанию id: две встречные пачки не возьмут их крест-накрест
+        wanted = [book_id for book_id in book_ids if book_id not in borrowed]
+        available = set((await session.execute(
+            select(Book.id)
+            .where(Book.id.in_(wanted), Book.count_available > 0)
+            .order_by(Book.id)
+            .with_for_update()
+        )).scalars())
+        can_get_more = (await session.execute(
+            select(UserReader.can_get_more).where(UserReader.id == reader_id).with_for_update()
+        )).scalar()
+        if can_get_more is None:
+            raise LoanNotFound("Читатель не найден")
+
+        granted = []
+        for book_id in book_ids:
+            if book_id in results:
+                continue
+            if book_id not in available:
+                results[book_id] = {'status': 'unavailable', 'detail': "Книга не найдена или все экземпляры выданы"}
+            elif len(granted) >= can_get_more:
+                results[book_id] = {'status': 'limit_reached', 'detail': "Читатель исчерпал лимит книг"}
+            else:
+                granted.append(book_id)
+
+        if granted:
+            due_date = now + timedelta(days=settings.loans.period_days)
+            await session.execute(
+                update(Book).where(Book.id.in_(granted)).values(count_available=Book.count_available - 1)
+            )
+            await session.execute(
+                update(UserReader).where(UserReader.id == reader_id)
+                .values(can_get_more=UserReader.can_get_more - len(granted))
+            )
+            try:
+                loans = (await session.execute(
+                    insert(reader_books).returning(reader_books.c.id, reader_books.c.book_id),
+                    [
+                        {'reader_id': reader_id, 'book_id': book_id, 'output_date': now, 'due_date': due_date,
+                         'renewals': 0}
+                        for book_id in granted
+                    ]
+                )).all()
+            except IntegrityError:
+                # параллельная выдача той же книги тому же читателю успела раньше
+                raise AlreadyBorrowed("Книга уже выдана этому пользователю и не возвращена")
+            for loan in loans:
+                results[loan.book_id] = {'status': 'issued', 'loan_id': loan.id, 'due_date': due_date}
+            await record_checkouts(session, reader_id, granted, now)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+
+    if granted:
+        await catalog_cache.invalidate('books', *(f'book:{book_id}' for book_id in granted))
+    return [{'book_id': book_id, **results[book_id]} for book_id in book_ids]
+
+
+async def return_book(session: AsyncSession, reader_id: UUID, book_id: UUID) -> dict:
+    now = datetime.utcnow()
+    try:
+        # сначала закрываем выдачу: без неё счётчики не трогаем и строки книги и читателя не блокируем
+        loan = (await session.execute(
+            update(reader_books)
+            .where(_open_loan(reader_id, book_id))
+            .values(input_date=now)
+            .returning(reader_books.c.id, reader_books.c.output_date, reader_books.c.due_date)
+        )).first()
+        if loan is None:
+            raise LoanNotFound("Открытая выдача не найдена")
+        await session.execute(
+            update(Book).where(Book.id == book_id).values(count_available=Book.count_available + 1)
+        )
+        await session.execute(
+            update(UserReader).where(UserReader.id == reader_id).values(can_get_more=UserReader.can_get_more + 1)
+        )
+        await record_return(session, reader_id, book_id)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+
+    await catalog_cache.invalidate('books', f'book:{book_id}')
+    return {
+        'id': loan.id, 'reader_id': reader_id, 'book_id': book_id,
+        'output_date': loan.output_date, 'due_date': loan.due_date, 'input_date': now
+    }
+
+
+async def renew(session: AsyncSession, reader_id: UUID, book_id: UUID) -> dict:
+    try:
+        loan = (await session.execute(
+            update(reader_books)
+            .where(_open_loan(reader_id, book_id), reader_books.c.renewals < settings.loans.max_renewals)
+            .values(
+                due_date=_add_days(session, reader_books.c.due_date, settings.loans.period_days),
+                renewals=reader_books.c.renewals + 1
+            )
+            .returning(reader_books.c.id, reader_books.c.due_date, reader_books.c.renewals)
+        )).first()
+        if loan is None:
+            exists = (await session.execute(
+                reader_books.select().where(_open_loan(reader_id, book_id))
+            )).first()
+            if exists is None:
+                raise LoanNotFound("Открытая выдача не найдена")
+            raise RenewalLimitReached("Превышено число продлений")
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+
+    return {'id': loan.id, 'reader_id': reader_id, 'book_id': book_id, 'due_date': loan.due_date, 'renewals': loan.renewals}
@@ -1,36 +1,224 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi import Request
-from sqlalchemy.orm import Session
+import math
+import random
+import re
 import time
-from app.database.models import Logs
-from app.database import SessionLocal
 
+from starlette.datastructures import Headers, QueryParams, MutableHeaders
+from starlette.requests import cookie_parser
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+from app.utils.jwt_secure import decode_jwt
+from app.utils.log_writer import log_writer
+from app.utils.metrics import Metrics, RequestTimings, current_timings, metrics
+from app.utils.rate_limit import Admission, admission, route_group
+from settings import settings
+
+
+REDACTED = '***'
+
+
+class LoggingMiddleware:
+    # Чистый ASGI: тело запроса идёт в приложение потоком, в лог попадают только
+    # первые max_body_bytes, поэтому память на запрос не зависит от размера загрузки
+    def __init__(
+            self,
+            app: ASGIApp,
+            max_body_bytes: int = settings.logs.max_body_bytes,
+            redact_fields=settings.logs.redact_fields,
+            path_sample_rates: dict[str, float] = settings.logs.path_sample_rates
+    ):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.redact_fields = frozenset(redact_fields)
+        # длинные префиксы проверяем первыми
+        self.path_sample_rates = sorted(path_sample_rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+        fields = '|'.join(re.escape(field) for field in redact_fields)
+        self._json_pattern = re.compile(rf'("(?:{fields})"\s*:\s*)(?:"(?:[^"\\]|\\.)*"?|[^,}}\s]+)')
+        self._form_pattern = re.compile(rf'((?:^|&)(?:{fields})=)[^&]*')
+
+    def sample_rate(self, path: str) -> float:
+        for prefix, rate in self.path_sample_rates:
+            if path.startswith(prefix):
+                return rate
+        return 1.0
+
+    def redact(self, body: str) -> str:
+        # регулярками, а не через json.loads: обрезанное тело всё равно должно маскироваться
+        body = self._json_pattern.sub(rf'\1"{REDACTED}"', body)
+        return self._form_pattern.sub(rf'\1{REDACTED}', body)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        path = scope['path']
+        rate = self.sample_rate(path)
+        if rate < 1.0 and random.random() >= rate:
+            await self.app(scope, receive, send)
+            return
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
         start_time = time.time()
+        captured = bytearray()
+        truncated = False
+        status_code = 500
 
-        body = await request.body()
-        response = await call_next(request)
-
-        duration = round((time.time() - start_time) * 1000)
-        session: Session = SessionLocal()
-
-        log = Logs(
-            level="INFO",
-            message=f"{request.method} {request.url.path} - {response.status_code}",
-            context={
-                "method": request.method,
-                "path": request.url.path,
-                "query_params": dict(request.query_params),
-                "status_code": response.status_code,
-                "duration_ms": duration,
-                "body": body.decode("utf-8") if body else None
+        async def receive_wrapper() -> Message:
+            nonlocal truncated
+            message = await receive()
+            if message['type'] == 'http.request':
+                chunk = message.get('body', b'')
+                room = self.max_body_bytes - len(captured)
+                if room > 0:
+                    captured.extend(chunk[:room])
+                if len(chunk) > max(room, 0):
+                    truncated = True
+            return message
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration = round((time.time() - start_time) * 1000)
+            method = scope['method']
+            query_params = {
+                key: REDACTED if key in self.redact_fields else value
+                for key, value in QueryParams(scope['query_string']).items()
             }
-        )
 
-        session.add(log)
-        session.commit()
-        session.close()
+            # запись уходит в очередь, в БД её пачкой отправит фоновый LogWriter
+            log_writer.push(
+                level="INFO",
+                message=f"{method} {path} - {status_code}",
+                context={
+                    "method": method,
+                    "path": path,
+                    # шаблон маршрута: по нему app.utils.log_maintenance сворачивает логи в сводки
+                    "route": getattr(scope.get('route'), 'path', None),
+                    "query_params": query_params,
+                    "status_code": status_code,
+                    "duration_ms": duration,
+                    "body": self.redact(captured.decode("utf-8", errors="replace")) if captured else None,
+                    "body_truncated": truncated
+                }
+            )
+
+
+class MetricsMiddleware:
+    # Меряет запрос целиком и по частям (SQL, авторизация, сериализация): части
+    # копятся в RequestTimings через contextvar, итог уходит в гистограммы по
+    # шаблону маршрута и в заголовок Server-Timing
+    def __init__(self, app: ASGIApp, registry: Metrics = metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        status_code = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                MutableHeaders(scope=message).append('Server-Timing', timings.server_timing(time.perf_counter()))
+            await send(message)
+
+        self.registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.registry.in_flight -= 1
+            current_timings.reset(token)
+            # шаблон вида /books/{book_id}, а не сам путь, иначе метки разрастутся по числу книг
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            self.registry.observe(scope['method'], route, status_code, time.perf_counter() - timings.started, timings)
+
+
+class AdmissionMiddleware:
+    # Отсекает лишние запросы до того, как они займут bcrypt или соединение с БД:
+    # превышение скорости по IP или пользователю — 429, переполненная группа — 503.
+    # Стоит внутри LoggingMiddleware и MetricsMiddleware, так что отказы видны и там
+    def __init__(
+            self,
+            app: ASGIApp,
+            policy: Admission = admission,
+            enabled: bool = settings.limits.enabled,
+            trust_forwarded: bool = settings.limits.trust_forwarded
+    ):
+        self.app = app
+        self.policy = policy
+        self.enabled = enabled
+        self.trust_forwarded = trust_forwarded
+
+    def client_ip(self, scope: Scope, headers: Headers) -> str:
+        forwarded = headers.get('x-forwarded-for') if self.trust_forwarded else None
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+        client = scope.get('client')
+        return client[0] if client else 'unknown'
+
+    @staticmethod
+    def user(headers: Headers) -> str | None:
+        # ключ только из проверенного токена: по поддельному имени можно было бы выжечь чужое ведро
+        token = cookie_parser(headers.get('cookie', '')).get('access_token')
+        if not token:
+            return None
+        try:
+            payload = decode_jwt(token)
+        except Exception:
+            return None
+        return f"{payload.get('role')}:{payload.get('username')}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        group = route_group(scope['method'], scope['path']) if scope['type'] == 'http' and self.enabled else None
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Сначала проверяем оба ведра и только потом забираем токены: отказ по пользователю
+        # не должен тратить бюджет IP. Между проверкой и списанием нет await, так что
+        # в одном event loop никто не вклинится
+        headers = Headers(scope=scope)
+        ip_limiter, ip = self.policy.ip[group], self.client_ip(scope, headers)
+        wait = ip_limiter.peek(ip)
+        if wait:
+            await self.reject(scope, receive, send, group, 'ip_rate', 429, wait)
+            return
+        user_limiter = self.policy.user.get(group)
+        user = self.user(headers) if user_limiter else None
+        if user:
+            wait = user_limiter.peek(user)
+            if wait:
+                await self.reject(scope, receive, send, group, 'user_rate', 429, wait)
+                return
+            user_limiter.acquire(user)
+        ip_limiter.acquire(ip)
+
+        limiter = self.policy.concurrency[group]
+        if not limiter.try_acquire():
+            await self.reject(scope, receive, send, group, 'concurrency', 503, 1)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
 
-        return response
+    async def reject(
+            self, scope: Scope, receive: Receive, send: Send, group: str, reason: str, status: int, wait: float
+    ):
+        self.policy.reject(group, reason)
+        detail = "Too many requests" if status == 429 else "Server is busy, try again later"
+        response = JSONResponse({'detail': detail}, status_code=status, headers={'Retry-After': str(math.ceil(wait))})
+        await response(scope, receive, send)
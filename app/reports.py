@@ -0,0 +1,184 @@
+import asyncio
+import sys
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import select, insert, update, delete, func, case, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import (
+    Book, Genre, User, UserReader, book_genres, reader_books,
+    book_loan_stats, genre_book_loan_stats, reader_loan_stats
+)
+
+
+# Отчёты по выдачам читаются из сводных таблиц: каждая выдача и возврат
+# правят пару строк счётчиков в своей транзакции (см. app.loans), а отчёт —
+# это чтение первых N строк по индексу, сколько бы выдач ни накопилось.
+# Если сводки разошлись с reader_books, их пересобирает rebuild().
+
+
+def _insert(session: AsyncSession):
+    return pg_insert if session.bind.dialect.name == 'postgresql' else sqlite_insert
+
+
+async def record_checkout(session: AsyncSession, reader_id: UUID, book_id: UUID, at: datetime):
+    await record_checkouts(session, reader_id, [book_id], at)
+
+
+async def record_checkouts(session: AsyncSession, reader_id: UUID, book_ids: list[UUID], at: datetime):
+    # три запроса на любую пачку выдач одному читателю; book_ids без повторов
+    insert_ = _insert(session)
+    books = insert_(book_loan_stats).values([
+        {'book_id': book_id, 'loans_total': 1, 'open_loans': 1, 'last_loan_at': at} for book_id in book_ids
+    ])
+    await session.execute(books.on_conflict_do_update(index_elements=['book_id'], set_={
+        'loans_total': book_loan_stats.c.loans_total + 1,
+        'open_loans': book_loan_stats.c.open_loans + 1,
+        'last_loan_at': at
+    }))
+
+    await session.execute(
+        insert_(reader_loan_stats)
+        .values(reader_id=reader_id, loans_total=len(book_ids), open_loans=len(book_ids), last_loan_at=at)
+        .on_conflict_do_update(index_elements=['reader_id'], set_={
+            'loans_total': reader_loan_stats.c.loans_total + len(book_ids),
+            'open_loans': reader_loan_stats.c.open_loans + len(book_ids),
+            'last_loan_at': at
+        })
+    )
+
+    await session.execute(
+        insert_(genre_book_loan_stats)
+        .from_select(
+            ['genre_id', 'book_id', 'loans_total'],
+            select(book_genres.c.genre_id, book_genres.c.book_id, literal(1)).where(book_genres.c.book_id.in_(book_ids))
+        )
+        .on_conflict_do_update(
+            index_elements=['genre_id', 'book_id'],
+            set_={'loans_total': genre_book_loan_stats.c.loans_total + 1}
+        )
+    )
+
+
+async def record_return(session: AsyncSession, reader_id: UUID, book_id: UUID):
+    await session.execute(
+        update(book_loan_stats).where(book_loan_stats.c.book_id == book_id)
+        .values(open_loans=book_loan_stats.c.open_loans - 1)
+    )
+    await session.execute(
+        update(reader_loan_stats).where(reader_loan_stats.c.reader_id == reader_id)
+        .values(open_loans=reader_loan_stats.c.open_loans - 1)
+    )
+
+
+async def refresh_book_genres(session: AsyncSession, book_id: UUID):
+    # после смены жанров книги её счётчик переезжает в новые жанры
+    await session.execute(delete(genre_book_loan_stats).where(genre_book_loan_stats.c.book_id == book_id))
+    await session.execute(
+        insert(genre_book_loan_stats).from_select(
+            ['genre_id', 'book_id', 'loans_total'],
+            select(book_genres.c.genre_id, book_loan_stats.c.book_id, book_loan_stats.c.loans_total)
+            .join(book_genres, book_genres.c.book_id == book_loan_stats.c.book_id)
+            .where(book_loan_stats.c.book_id == book_id)
+        )
+    )
+
+
+async def top_books(session: AsyncSession, genre: str | None = None, limit: int = 10) -> list[dict]:
+    if genre is None:
+        query = (
+            select(Book.id, Book.name, book_loan_stats.c.loans_total, book_loan_stats.c.open_loans)
+            .join(Book, Book.id == book_loan_stats.c.book_id)
+            .order_by(book_loan_stats.c.loans_total.desc(), Book.id)
+        )
+    else:
+        query = (
+            select(Book.id, Book.name, genre_book_loan_stats.c.loans_total, book_loan_stats.c.open_loans)
+            .join(Genre, Genre.id == genre_book_loan_stats.c.genre_id)
+            .join(Book, Book.id == genre_book_loan_stats.c.book_id)
+            .join(book_loan_stats, book_loan_stats.c.book_id == genre_book_loan_stats.c.book_id)
+            .where(Genre.name == genre)
+            .order_by(genre_book_loan_stats.c.loans_total.desc(), Book.id)
+        )
+    rows = (await session.execute(query.limit(limit))).all()
+    return [
+        {'book_id': row.id, 'name': row.name, 'loans_total': row.loans_total, 'open_loans': row.open_loans}
+        for row in rows
+    ]
+
+
+async def active_readers(session: AsyncSession, limit: int = 10) -> list[dict]:
+    rows = (await session.execute(
+        select(
+            reader_loan_stats.c.reader_id, User.username, reader_loan_stats.c.loans_total,
+            reader_loan_stats.c.open_loans, reader_loan_stats.c.last_loan_at
+        )
+        .join(UserReader, UserReader.id == reader_loan_stats.c.reader_id)
+        .join(User, User.id == UserReader.user_id)
+        .order_by(reader_loan_stats.c.loans_total.desc(), reader_loan_stats.c.reader_id)
+        .limit(limit)
+    )).all()
+    return [row._asdict() for row in rows]
+
+
+async def overdue_loans(session: AsyncSession, limit: int = 50) -> list[dict]:
+    # сводка тут не нужна: частичный индекс ix_reader_books_open_due уже хранит
+    # только открытые выдачи в порядке срока, запрос читает из него первые limit строк
+    rows = (await session.execute(
+        select(
+            reader_books.c.id.label('loan_id'), reader_books.c.reader_id, User.username,
+            reader_books.c.book_id, Book.name, reader_books.c.due_date
+        )
+        .join(UserReader, UserReader.id == reader_books.c.reader_id)
+        .join(User, User.id == UserReader.user_id)
+        .join(Book, Book.id == reader_books.c.book_id)
+        .where(reader_books.c.input_date.is_(None), reader_books.c.due_date < datetime.utcnow())
+        .order_by(reader_books.c.due_date)
+        .limit(limit)
+    )).all()
+    return [row._asdict() for row in rows]
+
+
+async def rebuild(session: AsyncSession) -> dict:
+    # Полный пересчёт из reader_books одной транзакцией: отчёты видят либо старые, либо новые сводки
+    is_open = func.sum(case((reader_books.c.input_date.is_(None), 1), else_=0))
+    try:
+        for table in (genre_book_loan_stats, book_loan_stats, reader_loan_stats):
+            await session.execute(delete(table))
+
+        for table, key in ((book_loan_stats, reader_books.c.book_id), (reader_loan_stats, reader_books.c.reader_id)):
+            await session.execute(insert(table).from_select(
+                [key.key, 'loans_total', 'open_loans', 'last_loan_at'],
+                select(key, func.count(), is_open, func.max(reader_books.c.output_date)).group_by(key)
+            ))
+        await session.execute(insert(genre_book_loan_stats).from_select(
+            ['genre_id', 'book_id', 'loans_total'],
+            select(book_genres.c.genre_id, book_loan_stats.c.book_id, book_loan_stats.c.loans_total)
+            .join(book_genres, book_genres.c.book_id == book_loan_stats.c.book_id)
+        ))
+
+        counts = {
+            table.name: await session.scalar(select(func.count()).select_from(table))
+            for table in (book_loan_stats, genre_book_loan_stats, reader_loan_stats)
+        }
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    return counts
+
+
+async def _main(command: str):
+    from app.database import AsyncSessionLocal
+
+    if command != 'rebuild':
+        raise SystemExit(f"Unknown command: {command}. Usage: python -m app.reports rebuild")
+    async with AsyncSessionLocal() as session:
+        print(await rebuild(session))
+
+
+if __name__ == '__main__':
+    asyncio.run(_main(sys.argv[1] if len(sys.argv) > 1 else ''))
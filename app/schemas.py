@@ -64,12 +64,37 @@ class BookOut(BaseModel):
         from_attributes = True
 
 
+class BookPage(BaseModel):
+    items: List[BookOut]
+    next_cursor: Optional[str] = None
+
+
+class AuthorSummary(AuthorOut):
+    books_count: int
+
+
+class AuthorPage(BaseModel):
+    items: List[AuthorSummary]
+    next_cursor: Optional[str] = None
+
+
 class AuthorCreate(BaseModel):
     username: str
     biography: Optional[str] = None
     birthday: Optional[datetime] = None
 
 
+class Principal(BaseModel):
+    id: UUID
+    username: str
+    role: Literal['admin', 'reader', 'author']
+    password: Optional[bytes] = None
+    email: Optional[str] = None
+
+    class Config:
+        frozen = True
+
+
 class UserResponse(BaseModel):
     id: UUID
     username: str
@@ -0,0 +1,80 @@
+from uuid import uuid4
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from main import app
+from app.utils.jwt_secure import encode_jwt
+
+
+HEADERS = {"Cookie": f"access_token={encode_jwt({'username': 'admin', 'role': 'admin'})}"}
+
+
+def test_authors_are_paged_with_book_counts(assert_query_count):
+    tag = f"paged-{uuid4().hex[:8]}"
+    authors = [f"{tag}-{i}" for i in range(3)]
+
+    with TestClient(app) as ac:
+        ac.post("/genres", json={"names": [tag]}, headers=HEADERS)
+        for author in authors:
+            ac.post("/authors", json={"username": author}, headers=HEADERS)
+        # у автора i ровно i книг
+        for i, author in enumerate(authors):
+            for j in range(i):
+                response = ac.post("/books", json={
+                    "name": f"{tag}-book-{i}-{j}", "description": "d", "genres": [tag],
+                    "count_available": 1, "authors": [author]
+                }, headers=HEADERS)
+                assert response.status_code == status.HTTP_200_OK
+
+        seen, cursor = [], None
+        while True:
+            response = ac.get("/authors", params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+            assert_query_count(response, 1)
+            page = response.json()
+            assert len(page["items"]) <= 2
+            seen += page["items"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        names = [author["username"] for author in seen]
+        assert names == sorted(names)
+        assert len(set(names)) == len(names)
+        counts = {author["username"]: author["books_count"] for author in seen}
+        assert [counts[author] for author in authors] == [0, 1, 2]
+        assert ac.get("/authors", params={"cursor": "garbage"}).status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_author_books_are_paged(assert_query_count):
+    tag = f"shelf-{uuid4().hex[:8]}"
+
+    with TestClient(app) as ac:
+        ac.post("/genres", json={"names": [tag]}, headers=HEADERS)
+        ac.post("/authors", json={"username": tag}, headers=HEADERS)
+        ac.post("/authors", json={"username": f"{tag}-other"}, headers=HEADERS)
+        for i in range(3):
+            ac.post("/books", json={
+                "name": f"{tag}-{i}", "description": "d", "genres": [tag], "count_available": 1,
+                "authors": [tag] if i < 2 else [f"{tag}-other"]
+            }, headers=HEADERS)
+        author = next(
+            item for item in ac.get("/authors", params={"limit": 100}).json()["items"] if item["username"] == tag
+        )
+
+        first = ac.get(f"/authors/{author['id']}/books", params={"limit": 1})
+        assert_query_count(first, 3)
+        second = ac.get(f"/authors/{author['id']}/books", params={"limit": 1, "cursor": first.json()["next_cursor"]})
+        assert [book["name"] for book in first.json()["items"] + second.json()["items"]] == [f"{tag}-0", f"{tag}-1"]
+        assert second.json()["next_cursor"] is None
+
+        assert ac.get(f"/authors/{uuid4()}/books").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_duplicate_author_is_a_conflict():
+    name = f"twice-{uuid4().hex[:8]}"
+
+    with TestClient(app) as ac:
+        assert ac.post("/authors", json={"username": name}, headers=HEADERS).status_code == status.HTTP_200_OK
+        response = ac.post("/authors", json={"username": name}, headers=HEADERS)
+        assert response.status_code == status.HTTP_409_CONFLICT
@@ -0,0 +1,57 @@
+import asyncio
+
+from app.utils.cache import CatalogCache, LocalCache, MemoryBackend
+
+
+def _identity(value):
+    return value
+
+
+async def _fill(cache: CatalogCache, scope: str, key: str, value):
+    _, versioned_key = await cache.get(scope, key, _identity)
+    await cache.set(versioned_key, value, _identity)
+
+
+def test_invalidation_is_scoped():
+    cache = CatalogCache(LocalCache(maxsize=16, ttl=60))
+
+    async def scenario():
+        await _fill(cache, 'books', 'page', ['a'])
+        await _fill(cache, 'book:1', '', {'id': 1})
+        await cache.invalidate('book:1')
+        return (await cache.get('books', 'page', _identity))[0], (await cache.get('book:1', '', _identity))[0]
+
+    page, book = asyncio.run(scenario())
+    assert page == ['a']
+    assert book is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 3
+
+
+def test_read_racing_invalidation_is_not_cached():
+    cache = CatalogCache(LocalCache(maxsize=16, ttl=60))
+
+    async def scenario():
+        # чтение промахнулось и ушло в БД, тем временем запись инвалидировала scope
+        _, versioned_key = await cache.get('books', 'page', _identity)
+        await cache.invalidate('books')
+        await cache.set(versioned_key, ['stale'], _identity)
+        return (await cache.get('books', 'page', _identity))[0]
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_shared_backend_invalidates_other_workers():
+    shared = MemoryBackend()
+    first = CatalogCache(LocalCache(maxsize=16, ttl=60), shared)
+    second = CatalogCache(LocalCache(maxsize=16, ttl=60), shared)
+
+    async def scenario():
+        await _fill(first, 'authors', 'all', ['tolkien'])
+        warm, _ = await second.get('authors', 'all', _identity)
+        await first.invalidate('authors')
+        return warm, (await second.get('authors', 'all', _identity))[0]
+
+    warm, stale = asyncio.run(scenario())
+    assert warm == ['tolkien']
+    assert stale is None
@@ -0,0 +1,69 @@
+import os
+import re
+import tempfile
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+
+def _write_keys(directory) -> tuple[str, str]:
+    # свежая пара RS256: ключи в репозитории не хранятся
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_path = os.path.join(directory, 'private_key.pem')
+    public_path = os.path.join(directory, 'public_key.pem')
+    with open(private_path, 'wb') as f:
+        f.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ))
+    with open(public_path, 'wb') as f:
+        f.write(private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ))
+    return private_path, public_path
+
+
+# Без DB_URL в окружении тесты гоняются на локальном SQLite вместо Postgres
+if not os.getenv('DB_URL'):
+    _db_path = os.path.join(tempfile.gettempdir(), 'library_test.db')
+    if os.path.exists(_db_path):
+        os.remove(_db_path)
+    os.environ['DB_URL'] = f'sqlite:///{_db_path}'
+    os.environ['ASYNC_DB_URL'] = f'sqlite+aiosqlite:///{_db_path}'
+
+# Пара ключей JWT на один прогон во временном каталоге, до импорта settings
+if not os.getenv('JWT_PRIVATE_KEY_PATH'):
+    _private_path, _public_path = _write_keys(tempfile.mkdtemp(prefix='library_test_keys_'))
+    os.environ['JWT_PRIVATE_KEY_PATH'] = _private_path
+    os.environ['JWT_PUBLIC_KEY_PATH'] = _public_path
+
+# Тесты шлют /login и записи пачками с одного адреса; ограничитель проверяется
+# отдельно в middleware_test, где у него свои лимиты
+os.environ.setdefault('LIMITS_ENABLED', '0')
+
+from app.database import Base, engine  # noqa: E402
+from app.database import models  # noqa: E402,F401
+
+# Postgres готовится миграциями (alembic upgrade head), а SQLite-подмена
+# живёт вне Alembic — её схему берём прямо из моделей
+if engine.dialect.name == 'sqlite':
+    Base.metadata.create_all(bind=engine)
+
+
+@pytest.fixture
+def assert_query_count():
+    # Число SQL-запросов обработчика берём из Server-Timing, так N+1 в crud.py ломает тест
+    def check(response, expected: int):
+        match = re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', response.headers.get('server-timing', ''))
+        assert match, 'response has no Server-Timing db entry'
+        assert int(match.group(1)) == expected, \
+            f'{response.request.method} {response.request.url} ran {match.group(1)} queries, expected {expected}'
+    return check
+
+
+@pytest.fixture
+def write_keys():
+    return _write_keys
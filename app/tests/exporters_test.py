@@ -0,0 +1,66 @@
+import asyncio
+import json
+from uuid import uuid4
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from main import app
+from app.crud import export_books
+from app.database import AsyncSessionLocal
+from app.utils.importers import iter_csv, iter_ndjson
+from app.utils.jwt_secure import encode_jwt
+
+
+HEADERS = {"Cookie": f"access_token={encode_jwt({'username': 'admin', 'role': 'admin'})}"}
+
+
+async def _parse(parser, body: bytes) -> list[dict]:
+    async def stream():
+        yield body
+    return [row async for _, row in parser(stream())]
+
+
+def test_export_round_trips_through_import():
+    tag = f"export-{uuid4().hex[:8]}"
+    books = [
+        {"name": f"{tag}-{i}", "description": f"line one\nline, \"two\" {i}", "count_available": i,
+         "authors": [f"{tag}-author-{i % 2}", f"{tag}-author-x"], "genres": [f"{tag}-genre"]}
+        for i in range(5)
+    ]
+
+    with TestClient(app) as ac:
+        report = ac.post(
+            "/books/import", content="\n".join(json.dumps(book) for book in books), headers=HEADERS
+        ).json()
+        assert report["imported"] == 5
+
+        assert ac.get("/books/export").status_code == 422
+        reader = {"Cookie": f"access_token={encode_jwt({'username': 'r', 'role': 'reader'})}"}
+        assert ac.get("/books/export", headers=reader).status_code == status.HTTP_403_FORBIDDEN
+
+        ndjson = ac.get("/books/export", headers=HEADERS)
+        csv = ac.get("/books/export", params={"format": "csv"}, headers=HEADERS)
+
+    assert ndjson.headers["content-type"] == "application/x-ndjson"
+    assert csv.headers["content-type"].startswith("text/csv")
+    for parser, response in ((iter_ndjson, ndjson), (iter_csv, csv)):
+        rows = sorted(
+            (row for row in asyncio.run(_parse(parser, response.content)) if row["name"].startswith(tag)),
+            key=lambda row: row["name"]
+        )
+        assert [row["name"] for row in rows] == [book["name"] for book in books]
+        assert [row["description"] for row in rows] == [book["description"] for book in books]
+        assert [sorted(row["authors"]) for row in rows] == [sorted(book["authors"]) for book in books]
+        assert all(row["genres"] == [f"{tag}-genre"] for row in rows)
+        assert [int(row["count_available"]) for row in rows] == list(range(5))
+
+
+def test_export_reads_in_chunks():
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            return [len(chunk) async for chunk in export_books(session, chunk_size=2)]
+
+    sizes = asyncio.run(scenario())
+    assert len(sizes) > 1
+    assert max(sizes) <= 2
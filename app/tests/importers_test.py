@@ -0,0 +1,58 @@
+import asyncio
+from uuid import uuid4
+
+from sqlalchemy import select
+
+from app.crud import import_books
+from app.database import AsyncSessionLocal
+from app.database.models import Book
+from app.utils.importers import iter_csv, iter_ndjson
+
+
+async def _chunks(data: bytes, size: int = 3):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def _collect(rows):
+    return [row async for row in rows]
+
+
+def test_ndjson_split_across_chunks():
+    data = '{"name": "Книга"}\n\nnot json\n{"name": "B"}'.encode()
+    rows = asyncio.run(_collect(iter_ndjson(_chunks(data))))
+
+    assert rows[0] == (1, {'name': 'Книга'})
+    assert rows[1][0] == 3 and isinstance(rows[1][1], ValueError)
+    assert rows[2] == (4, {'name': 'B'})
+
+
+def test_csv_quoted_newlines_and_lists():
+    data = b'name,description,authors,published_at\nA,"two\nlines",x|y,\nB,d,,2020-01-01\n'
+    rows = asyncio.run(_collect(iter_csv(_chunks(data))))
+
+    assert rows == [
+        (2, {'name': 'A', 'description': 'two\nlines', 'authors': ['x', 'y'], 'published_at': None}),
+        (4, {'name': 'B', 'description': 'd', 'authors': [], 'published_at': '2020-01-01'}),
+    ]
+
+
+def test_bad_row_does_not_sink_its_batch():
+    tag = f"import-{uuid4().hex[:8]}"
+
+    async def rows():
+        for i in range(4):
+            # count_available за пределами целого в БД проходит валидацию, но падает на INSERT
+            yield i + 1, {"name": f"{tag}-{i}", "description": "d", "genres": [tag], "authors": [tag],
+                          "count_available": 10 ** 20 if i == 2 else 1}
+
+    async def scenario():
+        async with AsyncSessionLocal() as session:
+            report = await import_books(session, rows(), batch_size=10)
+            names = (await session.scalars(select(Book.name).where(Book.name.startswith(tag)))).all()
+        return report, sorted(names)
+
+    report, names = asyncio.run(scenario())
+    assert (report['imported'], report['failed']) == (3, 1)
+    assert [error['row'] for error in report['errors']] == [3]
+    assert names == [f"{tag}-0", f"{tag}-1", f"{tag}-3"]
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import time
+
+import jwt
+import pytest
+
+from app.utils.jwt_secure import (
+    KeyManager, encode_jwt, decode_jwt, hash_password, PasswordHasher, PasswordHasherBusy
+)
+
+
+def test_rotation_without_restart(tmp_path, write_keys):
+    write_keys(tmp_path)
+    os.rename(tmp_path / 'private_key.pem', tmp_path / 'old.private.pem')
+    os.rename(tmp_path / 'public_key.pem', tmp_path / 'old.public.pem')
+    keys = KeyManager('', '', keys_dir=str(tmp_path), reload_interval=0)
+
+    old_token = encode_jwt({'username': 'u', 'role': 'reader'}, keys=keys)
+    assert jwt.get_unverified_header(old_token)['kid'] == 'old'
+
+    time.sleep(0.01)
+    write_keys(tmp_path)
+    os.rename(tmp_path / 'private_key.pem', tmp_path / 'new.private.pem')
+    os.rename(tmp_path / 'public_key.pem', tmp_path / 'new.public.pem')
+
+    new_token = encode_jwt({'username': 'u', 'role': 'reader'}, keys=keys)
+    assert jwt.get_unverified_header(new_token)['kid'] == 'new'
+    assert decode_jwt(old_token, keys=keys)['username'] == 'u'
+    assert decode_jwt(new_token, keys=keys)['username'] == 'u'
+
+    # старый ключ отозван — его токены больше не принимаются, даже из кеша
+    os.remove(tmp_path / 'old.private.pem')
+    os.remove(tmp_path / 'old.public.pem')
+    with pytest.raises(jwt.InvalidTokenError):
+        decode_jwt(old_token, keys=keys)
+
+
+def test_verified_token_cache(tmp_path, write_keys):
+    private_path, public_path = write_keys(tmp_path)
+    keys = KeyManager(private_path, public_path, cache_size=1)
+
+    first = encode_jwt({'username': 'a', 'role': 'reader'}, keys=keys)
+    second = encode_jwt({'username': 'b', 'role': 'reader'}, keys=keys)
+    decode_jwt(first, keys=keys)
+    assert keys.verified.get(first) is not None
+
+    decode_jwt(second, keys=keys)
+    assert keys.verified.get(first) is None
+    assert len(keys.verified) == 1
+
+
+def test_password_hasher_rehash_and_queue_limit():
+    hasher = PasswordHasher(rounds=5, workers=1, queue_limit=1)
+    assert hasher.needs_rehash(hash_password('secret', rounds=4))
+    assert not hasher.needs_rehash(hash_password('secret', rounds=5))
+
+    async def burst():
+        return await asyncio.gather(
+            hasher.hash('a'), hasher.hash('b'),
+            return_exceptions=True
+        )
+
+    first, second = asyncio.run(burst())
+    assert hasher.needs_rehash(first) is False
+    assert isinstance(second, PasswordHasherBusy)
+    assert asyncio.run(hasher.verify('a', first))
@@ -0,0 +1,40 @@
+import asyncio
+import json
+import os
+
+from benchmarks.load_bench import run, compare, ENDPOINTS
+
+
+def test_load_bench_reports_every_endpoint_without_errors():
+    report = asyncio.run(run(
+        books=30, authors=5, genres=3, readers=5, loans=5,
+        concurrency=(1, 4), requests=12, login_requests=2
+    ))
+
+    assert set(report['results']) == set(ENDPOINTS)
+    for levels in report['results'].values():
+        assert set(levels) == {'1', '4'}
+        for stats in levels.values():
+            assert stats['errors'] == 0
+            assert stats['p50_ms'] <= stats['p95_ms'] <= stats['p99_ms']
+
+    assert compare(report, report, tolerance=0.0) == []
+
+
+def test_compare_flags_latency_and_throughput_regressions():
+    baseline = {'results': {'books': {'10': {'p95_ms': 10.0, 'rps': 1000.0}}}}
+    current = {'results': {'books': {'10': {'p95_ms': 15.0, 'rps': 700.0}}}}
+
+    assert len(compare(current, baseline, tolerance=0.2)) == 2
+    assert compare(current, baseline, tolerance=0.6) == []
+
+
+def test_committed_baseline_covers_every_endpoint():
+    with open(os.path.join(os.path.dirname(__file__), '..', '..', 'benchmarks', 'baseline.json')) as f:
+        baseline = json.load(f)
+
+    levels = {str(level) for level in baseline['config']['concurrency']}
+    assert set(baseline['results']) == set(ENDPOINTS)
+    for stats in baseline['results'].values():
+        assert set(stats) == levels
+        assert all(level['errors'] == 0 for level in stats.values())
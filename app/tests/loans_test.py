@@ -0,0 +1,101 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from app.database import AsyncSessionLocal
+from app.database.models import Book, User, UserReader
+from app.loans import (
+    checkout, checkout_many, return_book, renew, BookUnavailable, LoanNotFound, RenewalLimitReached
+)
+from benchmarks.checkout_bench import run
+from settings import settings
+
+
+def test_concurrent_checkouts_never_oversell():
+    stats = asyncio.run(run(readers=60, copies=7))
+
+    assert stats['succeeded'] == 7
+    assert stats['open_loans'] == 7
+    assert stats['count_available'] == 0
+
+
+def test_checkout_return_renew_cycle():
+    async def scenario():
+        book_id, reader_id = uuid4(), uuid4()
+        async with AsyncSessionLocal() as session:
+            session.add(Book(id=book_id, name='cycle', description='', count_available=1))
+            session.add(UserReader(
+                id=reader_id, user=User(username=f'cycle-{reader_id}', role='reader'), can_get_more=5
+            ))
+            await session.commit()
+
+            first = await checkout(session, reader_id, book_id)
+            with pytest.raises(BookUnavailable):
+                await checkout(session, reader_id, book_id)
+
+            for _ in range(settings.loans.max_renewals):
+                renewed = await renew(session, reader_id, book_id)
+            assert renewed['due_date'] > first['due_date']
+            with pytest.raises(RenewalLimitReached):
+                await renew(session, reader_id, book_id)
+
+            await return_book(session, reader_id, book_id)
+            with pytest.raises(LoanNotFound):
+                await return_book(session, reader_id, book_id)
+
+            # после возврата ту же книгу можно взять снова
+            await checkout(session, reader_id, book_id)
+            reader = await session.get(UserReader, reader_id, populate_existing=True)
+            return reader.can_get_more
+
+    assert asyncio.run(scenario()) == 4
+
+
+def test_batch_checkout_reports_each_book():
+    async def scenario():
+        reader_id, other_id = uuid4(), uuid4()
+        free, taken, empty, spare = (uuid4() for _ in range(4))
+        async with AsyncSessionLocal() as session:
+            session.add_all([
+                Book(id=free, name='batch-free', description='', count_available=1),
+                Book(id=taken, name='batch-taken', description='', count_available=2),
+                Book(id=empty, name='batch-empty', description='', count_available=0),
+                Book(id=spare, name='batch-spare', description='', count_available=1),
+                UserReader(id=reader_id, user=User(username=f'batch-{reader_id}', role='reader'), can_get_more=3)
+            ])
+            await session.commit()
+            await checkout(session, reader_id, taken)
+
+            results = await checkout_many(session, reader_id, [free, taken, empty, uuid4(), free, spare])
+            reader = await session.get(UserReader, reader_id, populate_existing=True)
+            return results, reader.can_get_more, free, taken, empty, spare
+
+    results, can_get_more, free, taken, empty, spare = asyncio.run(scenario())
+    statuses = [(result['book_id'], result['status']) for result in results]
+    assert statuses[:3] == [(free, 'issued'), (taken, 'already_borrowed'), (empty, 'unavailable')]
+    assert statuses[3][1] == 'unavailable'
+    assert statuses[4] == (spare, 'issued')
+    assert len(results) == 5
+    assert 'due_date' in results[0] and 'detail' in results[1]
+    assert can_get_more == 0
+
+
+def test_batch_checkout_respects_reader_limit():
+    async def scenario():
+        reader_id = uuid4()
+        book_ids = [uuid4() for _ in range(3)]
+        async with AsyncSessionLocal() as session:
+            session.add_all([
+                *(Book(id=book_id, name=f'limit-{i}', description='', count_available=1)
+                  for i, book_id in enumerate(book_ids)),
+                UserReader(id=reader_id, user=User(username=f'limit-{reader_id}', role='reader'), can_get_more=2)
+            ])
+            await session.commit()
+            results = await checkout_many(session, reader_id, book_ids)
+            left = [(await session.get(Book, book_id, populate_existing=True)).count_available for book_id in book_ids]
+            return [result['status'] for result in results], left
+
+    statuses, left = asyncio.run(scenario())
+    assert statuses == ['issued', 'issued', 'limit_reached']
+    assert left == [0, 0, 1]
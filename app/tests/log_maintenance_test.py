@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert, select, func
+
+from main import app
+from app.database import async_engine
+from app.database.models import Logs, LogRollup
+from app.utils.log_maintenance import LogMaintenance, partition_start, partition_name
+
+
+def _log(at: datetime, route: str | None, status_code: int, duration_ms: int, path: str = '/books/1') -> dict:
+    return {
+        'at_time': at, 'level': 'INFO', 'message': 'rollup',
+        'context': {'method': 'GET', 'path': path, 'route': route, 'status_code': status_code,
+                    'duration_ms': duration_ms}
+    }
+
+
+def test_rollups_and_retention():
+    noon = datetime(2020, 1, 1, 12, 0)
+    maintenance = LogMaintenance(interval=0, retention_days=14, rollup_delay=120)
+
+    async def scenario():
+        async with async_engine.begin() as conn:
+            await conn.execute(insert(Logs), [
+                *(_log(noon.replace(hour=11, second=s), '/books/{book_id}', 200, ms) for s, ms in ((5, 30), (9, 10), (20, 20))),
+                _log(noon.replace(hour=11, second=40), '/books/{book_id}', 500, 400),
+                _log(noon.replace(hour=11, minute=1), None, 404, 1, path='/nope'),
+                # ещё не закрытая минута: LogWriter мог не дописать её пачки
+                _log(noon.replace(hour=11, minute=59), '/books/{book_id}', 200, 5)
+            ])
+
+        first = await maintenance.run_once(noon, steps=(maintenance.rollup,))
+        again = await maintenance.run_once(noon, steps=(maintenance.rollup,))
+        async with async_engine.connect() as conn:
+            rollups = (await conn.execute(
+                select(LogRollup).where(LogRollup.minute < datetime(2020, 1, 2)).order_by(LogRollup.minute)
+            )).all()
+
+        expired = await maintenance.run_once(noon + timedelta(days=20), steps=(maintenance.drop_expired,))
+        async with async_engine.connect() as conn:
+            left = await conn.scalar(select(func.count()).select_from(Logs).where(Logs.at_time < datetime(2020, 2, 1)))
+        return first, again, rollups, expired, left
+
+    first, again, rollups, expired, left = asyncio.run(scenario())
+    assert first == {'rollup': 2}
+    assert again == {'rollup': 0}
+    books, missing = rollups
+    assert (books.route, books.requests, books.errors) == ('/books/{book_id}', 4, 1)
+    assert (books.p50_ms, books.p95_ms, books.max_ms) == (20, 400, 400)
+    assert (missing.route, missing.requests, missing.errors) == ('/nope', 1, 0)
+    assert expired == {'drop_expired': 6}
+    assert left == 0
+
+
+def test_partition_bounds():
+    at = datetime(2026, 10, 18, 15, 30)  # воскресенье
+    assert partition_start(at, 'day') == datetime(2026, 10, 18)
+    assert partition_start(at, 'week') == datetime(2026, 10, 12)
+    assert partition_name(partition_start(at, 'week')) == 'logs_p20261012'
+
+
+def test_request_logs_carry_route_template():
+    # выход из TestClient останавливает LogWriter, и очередь дописывается в БД
+    with TestClient(app) as ac:
+        ac.get('/books/00000000-0000-0000-0000-000000000000')
+
+    async def last_route():
+        async with async_engine.connect() as conn:
+            return await conn.scalar(
+                select(Logs.context['route'].as_string())
+                .where(Logs.context['path'].as_string() == '/books/00000000-0000-0000-0000-000000000000')
+            )
+
+    assert asyncio.run(last_route()) == '/books/{book_id}'
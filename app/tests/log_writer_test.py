@@ -0,0 +1,60 @@
+import asyncio
+
+from sqlalchemy import select, func
+
+from app.database import async_engine
+from app.database.models import Logs
+from app.utils.log_writer import LogWriter
+from app.utils.metrics import RequestTimings, current_timings
+
+
+async def _count_logs():
+    async with async_engine.connect() as conn:
+        return await conn.scalar(select(func.count()).select_from(Logs).where(Logs.message == 'batched'))
+
+
+def test_flushes_queue_on_stop():
+    async def scenario():
+        writer = LogWriter(batch_size=10, flush_interval=60)
+        writer.start()
+        for i in range(25):
+            writer.push('INFO', 'batched', {'i': i})
+        await writer.stop()
+        return writer, await _count_logs()
+
+    writer, count = asyncio.run(scenario())
+    assert count == 25
+    assert writer.written == 25
+    assert writer.dropped == 0
+
+
+def test_drops_when_queue_is_full():
+    async def scenario():
+        writer = LogWriter(queue_size=5, flush_interval=60)
+        writer.start()
+        for i in range(20):
+            writer.push('INFO', 'overflow', {'i': i})
+        await writer.stop()
+        return writer
+
+    writer = asyncio.run(scenario())
+    assert writer.dropped >= 15
+    assert writer.written + writer.dropped == 20
+
+
+def test_flush_task_does_not_inherit_request_context():
+    timings = RequestTimings()
+
+    async def scenario():
+        writer = LogWriter(batch_size=10, flush_interval=60)
+        # первый push внутри запроса сам запускает фоновую задачу
+        token = current_timings.set(timings)
+        try:
+            writer.push('INFO', 'detached', {'i': 0})
+        finally:
+            current_timings.reset(token)
+        await writer.stop()
+        return writer
+
+    assert asyncio.run(scenario()).written == 1
+    assert timings.queries == 0
@@ -1,3 +1,6 @@
+import base64
+import json
+
 import pytest
 from httpx import AsyncClient
 from fastapi import status
@@ -28,20 +31,28 @@ def test_create_and_list_books():
     token = encode_jwt({"username": "admin_user", "role": "admin"})
     headers = {"Cookie": f"access_token={token}"}
 
+    suffix = uuid4().hex
     book_data = {
-        "title": "Test Book",
+        "name": f"Test Book {suffix}",
         "description": "A book for testing",
-        "author_id": str(uuid4()),
-        "genre_id": str(uuid4())
+        "authors": [f"author-{suffix}"],
+        "genres": [f"genre-{suffix}"],
+        "count_available": 1
     }
 
     with TestClient(app) as ac:
         create = ac.post("/books", json=book_data, headers=headers)
-        # может упасть, если нет автора/жанра в базе — тогда можно сделать мок
-        assert create.status_code in [status.HTTP_200_OK, status.HTTP_500_INTERNAL_SERVER_ERROR]
+        assert create.status_code == status.HTTP_400_BAD_REQUEST
+
+        ac.post("/authors", json={"username": f"author-{suffix}"}, headers=headers)
+        ac.post("/genres", json={"names": [f"genre-{suffix}"]}, headers=headers)
+        create = ac.post("/books", json=book_data, headers=headers)
+        assert create.status_code == status.HTTP_200_OK
+        assert create.json()["authors"][0]["username"] == f"author-{suffix}"
 
-        list_books = ac.get("/books")
+        list_books = ac.get("/books", params={"genre": f"genre-{suffix}"})
         assert list_books.status_code == status.HTTP_200_OK
+        assert [book["name"] for book in list_books.json()["items"]] == [book_data["name"]]
 
 
 def test_create_and_list_authors():
@@ -74,12 +85,12 @@ def test_give_book_access_control():
 
     with TestClient(app) as ac:
         # Попытка от пользователя — должен получить отказ
-        response = ac.post("/give_book", params={"user": fake_user_id}, json={"book_id": fake_book_id}, headers=headers_user)
+        response = ac.post("/give_book", params={"user": fake_user_id}, json=fake_book_id, headers=headers_user)
         assert response.status_code == status.HTTP_403_FORBIDDEN
 
-        # Попытка от админа
-        response = ac.post("/give_book", params={"user": fake_user_id}, json={"book_id": fake_book_id}, headers=headers_admin)
-        assert response.status_code in [status.HTTP_200_OK, status.HTTP_500_INTERNAL_SERVER_ERROR]
+        # Попытка от админа — такого читателя нет
+        response = ac.post("/give_book", params={"user": fake_user_id}, json=fake_book_id, headers=headers_admin)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
 
 
 def test_create_genres():
@@ -87,5 +98,116 @@ def test_create_genres():
     headers = {"Cookie": f"access_token={token}"}
 
     with TestClient(app) as ac:
-        response = ac.post("/genres", json={"name": "Fantasy"}, headers=headers)
-        assert response.status_code in [status.HTTP_200_OK, status.HTTP_500_INTERNAL_SERVER_ERROR]
+        response = ac.post("/genres", json={"names": ["Fantasy"]}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert [genre["name"] for genre in response.json()] == ["Fantasy"]
+
+
+def test_list_books_pagination():
+    with TestClient(app) as ac:
+        response = ac.get("/books", params={"limit": 1})
+        assert response.status_code == status.HTTP_200_OK
+        assert "items" in response.json()
+        assert "next_cursor" in response.json()
+
+        response = ac.get("/books", params={"cursor": "not-a-cursor"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        # корректный base64 с чужими типами внутри — тоже 400, а не 500
+        for values in ([1, 2], ["a", None], [None, None], ["a", "not-a-uuid"]):
+            cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+            assert ac.get("/books", params={"cursor": cursor}).status_code == status.HTTP_400_BAD_REQUEST
+            assert ac.get("/books/search", params={"q": "x", "cursor": cursor}).status_code == status.HTTP_400_BAD_REQUEST
+        cursor = base64.urlsafe_b64encode(json.dumps([1]).encode()).decode()
+        assert ac.get("/authors", params={"cursor": cursor}).status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_search_requires_query():
+    with TestClient(app) as ac:
+        response = ac.get("/books/search")
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert response.json()["detail"][0]["loc"] == ["query", "q"]
+
+
+def test_genre_upsert_returns_new_and_existing():
+    token = encode_jwt({"username": "admin", "role": "admin"})
+    headers = {"Cookie": f"access_token={token}"}
+
+    with TestClient(app) as ac:
+        first = ac.post("/genres", json={"names": ["Drama", "Comedy"]}, headers=headers)
+        second = ac.post("/genres", json={"names": ["Comedy", "Drama", "Satire"]}, headers=headers)
+        assert first.status_code == second.status_code == status.HTTP_200_OK
+
+        first_ids = {g["name"]: g["id"] for g in first.json()}
+        second_ids = {g["name"]: g["id"] for g in second.json()}
+        assert set(second_ids) == {"Comedy", "Drama", "Satire"}
+        assert second_ids["Drama"] == first_ids["Drama"]
+
+
+def test_fast_lists_match_regular_responses(monkeypatch):
+    from settings import settings
+
+    token = encode_jwt({"username": "admin", "role": "admin"})
+    headers = {"Cookie": f"access_token={token}"}
+    suffix = uuid4().hex
+
+    with TestClient(app) as ac:
+        ac.post("/genres", json={"names": [f"fast-{suffix}"]}, headers=headers)
+        ac.post("/authors", json={"username": f"fast-{suffix}"}, headers=headers)
+        for i in range(3):
+            response = ac.post("/books", json={
+                "name": f"fast-{suffix}-{i}", "description": "d", "genres": [f"fast-{suffix}"],
+                "count_available": i, "authors": [f"fast-{suffix}"], "published_at": "2020-01-02T03:04:05.123456"
+            }, headers=headers)
+            assert response.status_code == status.HTTP_200_OK
+
+        params = {"limit": 2, "genre": f"fast-{suffix}"}
+        regular_page = ac.get("/books", params=params).json()
+        regular_authors = ac.get("/authors").json()
+        monkeypatch.setattr(settings.App, "FAST_LISTS", True)
+        fast_page = ac.get("/books", params=params).json()
+        fast_authors = ac.get("/authors").json()
+
+        assert fast_page == regular_page
+        assert len(fast_page["items"]) == 2
+        assert fast_page["items"][0]["authors"][0]["username"] == f"fast-{suffix}"
+        next_page = ac.get("/books", params={**params, "cursor": fast_page["next_cursor"]}).json()
+        assert [book["name"] for book in next_page["items"]] == [f"fast-{suffix}-2"]
+        assert fast_authors == regular_authors
+
+
+def test_multi_get_and_batch_checkout(assert_query_count):
+    headers = {"Cookie": f"access_token={encode_jwt({'username': 'admin', 'role': 'admin'})}"}
+    suffix = uuid4().hex
+
+    with TestClient(app) as ac:
+        ac.post("/genres", json={"names": [f"batch-{suffix}"]}, headers=headers)
+        ac.post("/authors", json={"username": f"batch-{suffix}"}, headers=headers)
+        ids = [
+            ac.post("/books", json={
+                "name": f"batch-{suffix}-{i}", "description": "d", "genres": [f"batch-{suffix}"],
+                "count_available": 1, "authors": [f"batch-{suffix}"]
+            }, headers=headers).json()["id"]
+            for i in range(5)
+        ]
+        ac.post("/register", json={"username": f"batch-{suffix}", "password": "pw", "role": "reader"})
+
+        # порядок ответа — порядок ids, число запросов не зависит от числа книг
+        response = ac.get("/books", params={"ids": [ids[3], ids[0], str(uuid4()), ids[4]]})
+        assert_query_count(response, 1)
+        items = response.json()["items"]
+        assert [book["id"] for book in items] == [ids[3], ids[0], ids[4]]
+        assert items[0]["authors"][0]["username"] == f"batch-{suffix}"
+        assert items[0]["genres"][0]["name"] == f"batch-{suffix}"
+
+        response = ac.post("/give_books", params={"user": f"batch-{suffix}"}, json=ids[:2] + ids[:1], headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert [result["status"] for result in response.json()["results"]] == ["issued", "issued"]
+        assert_query_count(response, 10)
+        response = ac.post("/give_books", params={"user": f"batch-{suffix}"}, json=ids[1:4], headers=headers)
+        assert [result["status"] for result in response.json()["results"]] == ["already_borrowed", "issued", "issued"]
+        assert_query_count(response, 10)
+        assert ac.get(f"/books/{ids[2]}").json()["count_available"] == 0
+
+        assert ac.post("/give_books", params={"user": "nobody"}, json=ids, headers=headers).status_code == 404
+        assert ac.post("/give_books", params={"user": f"batch-{suffix}"}, json=[], headers=headers).status_code == 422
@@ -0,0 +1,71 @@
+from uuid import uuid4
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from main import app
+from app.utils.cache import catalog_cache
+from app.utils.jwt_secure import encode_jwt
+
+
+def _seed_books(ac, headers, count: int) -> str:
+    suffix = uuid4().hex
+    ac.post("/genres", json={"names": [f"metrics-{suffix}"]}, headers=headers)
+    ac.post("/authors", json={"username": f"metrics-{suffix}"}, headers=headers)
+    for i in range(count):
+        ac.post("/books", json={
+            "name": f"metrics-{suffix}-{i}", "description": "d", "genres": [f"metrics-{suffix}"],
+            "count_available": 1, "authors": [f"metrics-{suffix}"]
+        }, headers=headers)
+    return f"metrics-{suffix}"
+
+
+def test_book_reads_do_not_grow_queries_with_page_size(monkeypatch, assert_query_count):
+    monkeypatch.setattr(catalog_cache, "enabled", False)
+    headers = {"Cookie": f"access_token={encode_jwt({'username': 'admin', 'role': 'admin'})}"}
+
+    with TestClient(app) as ac:
+        genre = _seed_books(ac, headers, 4)
+
+        # страница книг, авторы и жанры selectinload'ом — по запросу на каждое
+        assert_query_count(ac.get("/books", params={"genre": genre, "limit": 1}), 3)
+        page = ac.get("/books", params={"genre": genre, "limit": 4})
+        assert_query_count(page, 3)
+
+        book_id = page.json()["items"][0]["id"]
+        assert_query_count(ac.get(f"/books/{book_id}"), 3)
+
+
+def test_metrics_endpoint_and_server_timing():
+    headers = {"Cookie": f"access_token={encode_jwt({'username': 'admin', 'role': 'admin'})}"}
+
+    with TestClient(app) as ac:
+        response = ac.get(f"/books/{uuid4()}")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        timing = response.headers["server-timing"]
+        for part in ("db;dur=", "auth;dur=", "serialize;dur=", "total;dur="):
+            assert part in timing
+
+        assert ac.get("/stats/cache", headers=headers).status_code == status.HTTP_200_OK
+
+        body = ac.get("/metrics").text
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/books/{book_id}",le="+Inf"}' in body
+        assert 'http_requests_total{method="GET",route="/books/{book_id}",status="404"}' in body
+        assert 'http_request_db_queries_count{method="GET",route="/books/{book_id}"}' in body
+        assert 'db_pool_connections_in_use{engine="async"}' in body
+        assert "log_writer_dropped_total" in body
+        assert "http_requests_in_flight 1" in body
+        assert 'admission_in_flight{group="write"} 0' in body
+
+
+def test_failed_statement_is_counted(assert_query_count):
+    headers = {"Cookie": f"access_token={encode_jwt({'username': 'admin', 'role': 'admin'})}"}
+    name = f"metrics-{uuid4().hex}"
+
+    with TestClient(app) as ac:
+        ac.post("/authors", json={"username": name}, headers=headers)
+        # INSERT падает на уникальном authors.username, и его время всё равно попадает в Server-Timing
+        for _ in range(3):
+            response = ac.post("/authors", json={"username": name}, headers=headers)
+            assert response.status_code == status.HTTP_409_CONFLICT
+            assert_query_count(response, 1)
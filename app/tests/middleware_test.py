@@ -0,0 +1,113 @@
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from fastapi.testclient import TestClient
+
+from app.middleware import AdmissionMiddleware, LoggingMiddleware
+from app.utils import log_writer as log_writer_module
+from app.utils.jwt_secure import encode_jwt
+from app.utils.rate_limit import Admission, ConcurrencyLimiter
+
+
+async def echo_length(request: Request):
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+    return PlainTextResponse(str(size))
+
+
+def _client(monkeypatch, **options):
+    records = []
+    monkeypatch.setattr(log_writer_module.log_writer, 'push', lambda **record: records.append(record))
+    app = Starlette(routes=[Route('/upload', echo_length, methods=['POST'])])
+    return TestClient(LoggingMiddleware(app, **options)), records
+
+
+def test_body_is_streamed_and_capture_is_bounded(monkeypatch):
+    client, records = _client(monkeypatch, max_body_bytes=16)
+
+    response = client.post('/upload', content=b'x' * 100_000)
+    assert response.text == '100000'
+
+    context = records[0]['context']
+    assert context['body'] == 'x' * 16
+    assert context['body_truncated'] is True
+    assert context['status_code'] == 200
+
+
+def test_password_is_redacted(monkeypatch):
+    client, records = _client(monkeypatch)
+
+    client.post('/upload', json={'username': 'u', 'password': 'secret'}, params={'token': 't'})
+
+    context = records[0]['context']
+    assert 'secret' not in context['body']
+    assert context['query_params'] == {'token': '***'}
+
+
+def test_path_sampling(monkeypatch):
+    client, records = _client(monkeypatch, path_sample_rates={'/upload': 0.0})
+
+    client.post('/upload', content=b'data')
+    assert records == []
+
+
+def _admission_client(**limits):
+    async def ok(request: Request):
+        return PlainTextResponse('ok')
+
+    app = Starlette(routes=[
+        Route('/login', ok, methods=['POST']),
+        Route('/books', ok, methods=['GET', 'POST'])
+    ])
+    policy = Admission(**limits)
+    return TestClient(AdmissionMiddleware(app, policy=policy, enabled=True)), policy
+
+
+def test_token_bucket_per_ip_and_per_user():
+    client, policy = _admission_client(auth_ip_rate=0.5, auth_ip_burst=2, write_user_rate=0.5, write_user_burst=1)
+
+    assert [client.post('/login').status_code for _ in range(3)] == [200, 200, 429]
+    response = client.post('/login')
+    assert response.headers['retry-after'] == '2'
+
+    # у каждого пользователя своё ведро, чтения не ограничиваются
+    alice = {'Cookie': f"access_token={encode_jwt({'username': 'alice', 'role': 'admin'})}"}
+    bob = {'Cookie': f"access_token={encode_jwt({'username': 'bob', 'role': 'admin'})}"}
+    assert client.post('/books', headers=alice).status_code == 200
+    assert client.post('/books', headers=alice).status_code == 429
+    assert client.post('/books', headers=bob).status_code == 200
+    assert all(client.get('/books').status_code == 200 for _ in range(5))
+
+    assert policy.stats()['rejected'] == {('auth', 'ip_rate'): 2, ('write', 'user_rate'): 1}
+
+
+def test_user_rejection_keeps_ip_budget():
+    client, policy = _admission_client(
+        write_ip_rate=0.001, write_ip_burst=2, write_user_rate=0.001, write_user_burst=1
+    )
+    alice = {'Cookie': f"access_token={encode_jwt({'username': 'alice', 'role': 'admin'})}"}
+    bob = {'Cookie': f"access_token={encode_jwt({'username': 'bob', 'role': 'admin'})}"}
+
+    assert client.post('/books', headers=alice).status_code == 200
+    # отказ по ведру alice не тратит токен IP, и bob с того же адреса ещё проходит
+    assert client.post('/books', headers=alice).status_code == 429
+    assert client.post('/books', headers=bob).status_code == 200
+    assert client.post('/books', headers=bob).status_code == 429
+    assert policy.stats()['rejected'] == {('write', 'user_rate'): 1, ('write', 'ip_rate'): 1}
+
+
+def test_concurrency_limit_sheds_load():
+    client, policy = _admission_client(write_concurrency=1)
+    # занимаем единственное место, как это сделал бы долгий запрос
+    assert policy.concurrency['write'].try_acquire()
+    response = client.post('/books')
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    policy.concurrency['write'].release()
+    assert client.post('/books').status_code == 200
+    assert policy.concurrency['write'].in_flight == 0
+
+    unlimited = ConcurrencyLimiter(0)
+    assert all(unlimited.try_acquire() for _ in range(100))
@@ -0,0 +1,84 @@
+import asyncio
+from uuid import uuid4
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from main import app
+from app.crud import get_user_by_username, set_password
+from app.database import AsyncSessionLocal
+from app.utils.cache import principal_cache
+from app.utils.jwt_secure import encode_jwt, hash_password
+
+
+def test_login_reuses_cached_principal_until_password_changes(assert_query_count):
+    user = {"username": f"principal-{uuid4().hex}", "password": "first-pass", "role": "reader"}
+
+    with TestClient(app) as ac:
+        assert ac.post("/register", json=user).status_code == status.HTTP_200_OK
+        assert_query_count(ac.post("/login", json=user), 1)
+        assert_query_count(ac.post("/login", json=user), 0)
+
+        async def change_password():
+            async with AsyncSessionLocal() as session:
+                principal = await get_user_by_username(session, user["username"], "reader")
+                await set_password(session, principal, hash_password("second-pass", rounds=4))
+        asyncio.run(change_password())
+
+        assert ("reader", user["username"]) not in principal_cache._items
+        assert ac.post("/login", json=user).status_code == status.HTTP_401_UNAUTHORIZED
+        assert ac.post("/login", json={**user, "password": "second-pass"}).status_code == status.HTTP_200_OK
+
+
+def test_deleted_user_cannot_log_in():
+    user = {"username": f"principal-{uuid4().hex}", "password": "pass", "role": "reader"}
+    headers = {"Cookie": f"access_token={encode_jwt({'username': 'admin', 'role': 'admin'})}"}
+
+    with TestClient(app) as ac:
+        ac.post("/register", json=user)
+        assert ac.post("/login", json=user).status_code == status.HTTP_200_OK
+
+        assert ac.delete(f"/users/{user['username']}", headers=headers).status_code == status.HTTP_200_OK
+        assert ac.post("/login", json=user).status_code == status.HTTP_401_UNAUTHORIZED
+        assert ac.delete(f"/users/{user['username']}", headers=headers).status_code == status.HTTP_404_NOT_FOUND
+        assert "principal_cache_hits_total" in ac.get("/metrics").text
+
+
+def test_registration_is_one_insert_and_usernames_are_unique_across_roles(assert_query_count):
+    username = f"principal-{uuid4().hex}"
+
+    with TestClient(app) as ac:
+        response = ac.post("/register", json={"username": username, "password": "pass", "role": "admin"})
+        assert response.status_code == status.HTTP_200_OK
+        assert_query_count(response, 1)
+
+        response = ac.post("/register", json={"username": username, "password": "pass", "role": "reader"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert_query_count(response, 1)
+
+        login = {"username": username, "password": "pass"}
+        assert ac.post("/login", json={**login, "role": "reader"}).status_code == status.HTTP_401_UNAUTHORIZED
+        assert ac.post("/login", json={**login, "role": "admin"}).status_code == status.HTTP_200_OK
+
+
+def test_reader_with_open_loans_is_not_deleted():
+    tag = f"holder-{uuid4().hex[:8]}"
+    user = {"username": tag, "password": "pass", "role": "reader"}
+    headers = {"Cookie": f"access_token={encode_jwt({'username': 'admin', 'role': 'admin'})}"}
+
+    with TestClient(app) as ac:
+        ac.post("/register", json=user)
+        ac.post("/genres", json={"names": [tag]}, headers=headers)
+        ac.post("/authors", json={"username": tag}, headers=headers)
+        book = ac.post("/books", json={
+            "name": tag, "description": "d", "genres": [tag], "count_available": 1, "authors": [tag]
+        }, headers=headers).json()
+        assert ac.post("/give_book", params={"user": tag}, json=book["id"], headers=headers).status_code == 200
+
+        # книга на руках: удаление потеряло бы экземпляр из count_available
+        assert ac.delete(f"/users/{tag}", headers=headers).status_code == status.HTTP_409_CONFLICT
+        assert ac.post("/login", json=user).status_code == status.HTTP_200_OK
+
+        assert ac.post("/return_book", params={"user": tag}, json=book["id"], headers=headers).status_code == 200
+        assert ac.delete(f"/users/{tag}", headers=headers).status_code == status.HTTP_200_OK
+        assert ac.get(f"/books/{book['id']}").json()["count_available"] == 1
@@ -0,0 +1,34 @@
+import pytest
+from sqlalchemy import text
+
+from app.database import engine
+
+
+# Планы запросов имеют смысл только на Postgres с применёнными миграциями.
+# enable_seqscan=off убирает последовательное сканирование маленьких тестовых
+# таблиц, так что в плане остаётся индекс, если планировщик вообще может его взять.
+pytestmark = pytest.mark.skipif(engine.dialect.name != 'postgresql', reason='query plans need Postgres')
+
+HOT_PATHS = [
+    ("SELECT id FROM users WHERE username = 'someone'", 'users_username_key'),
+    ("SELECT id FROM readers WHERE user_id = gen_random_uuid()", 'readers_user_id_key'),
+    ("SELECT id FROM authors WHERE username = 'someone'", 'authors_username_key'),
+    ("SELECT id FROM books WHERE (name, id) > ('a', gen_random_uuid()) ORDER BY name, id LIMIT 20",
+     'ix_books_name_id'),
+    ("SELECT book_id FROM book_authors WHERE author_id = gen_random_uuid()", 'ix_book_authors_author_id'),
+    ("SELECT id FROM authors WHERE username > 'a' ORDER BY username LIMIT 20", 'authors_username_key'),
+    ("SELECT book_id FROM book_genres WHERE genre_id = gen_random_uuid()", 'ix_book_genres_genre_id'),
+    ("SELECT id FROM reader_books WHERE book_id = gen_random_uuid()", 'ix_reader_books_book_id'),
+    ("SELECT id FROM reader_books WHERE reader_id = gen_random_uuid() AND book_id = gen_random_uuid() "
+     "AND input_date IS NULL", 'ux_reader_books_open'),
+    ("SELECT id FROM reader_books WHERE input_date IS NULL AND due_date < now()", 'ix_reader_books_open_due'),
+]
+
+
+@pytest.mark.parametrize('query, index', HOT_PATHS)
+def test_hot_path_uses_index(query, index):
+    with engine.connect() as conn:
+        conn.execute(text('SET enable_seqscan = off'))
+        plan = '\n'.join(conn.execute(text(f'EXPLAIN {query}')).scalars())
+
+    assert index in plan, plan
@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+from main import app
+from app.database import AsyncSessionLocal
+from app.database.models import Book, Genre, User, UserReader, reader_books
+from app.loans import checkout, return_book
+from app.reports import top_books, active_readers, overdue_loans, rebuild
+from app.utils.jwt_secure import encode_jwt
+
+
+def test_summaries_follow_checkouts_and_returns():
+    async def scenario():
+        tag = uuid4().hex[:8]
+        genre = Genre(id=uuid4(), name=f'reports-{tag}')
+        books = [
+            Book(id=uuid4(), name=f'reports-{tag}-{i}', description='', count_available=5, genres=[genre])
+            for i in range(3)
+        ]
+        readers = [
+            UserReader(id=uuid4(), user=User(username=f'reports-{tag}-{i}', role='reader'), can_get_more=10)
+            for i in range(3)
+        ]
+        async with AsyncSessionLocal() as session:
+            session.add_all([genre, *books, *readers])
+            await session.commit()
+
+            # книга 0 — у трёх читателей, книга 1 — у двух, книга 2 — у одного
+            for i, book in enumerate(books):
+                for reader in readers[:3 - i]:
+                    await checkout(session, reader.id, book.id)
+            await return_book(session, readers[0].id, books[0].id)
+
+            top = await top_books(session, genre.name)
+            assert [row['book_id'] for row in top] == [book.id for book in books]
+            assert [(row['loans_total'], row['open_loans']) for row in top] == [(3, 2), (2, 2), (1, 1)]
+
+            active = {row['reader_id']: row for row in await active_readers(session, limit=100)}
+            assert active[readers[0].id]['loans_total'] == 3
+            assert active[readers[0].id]['open_loans'] == 2
+            assert active[readers[2].id]['loans_total'] == 1
+
+            # выдача с истёкшим сроком попадает в отчёт о просрочках
+            await session.execute(
+                update(reader_books)
+                .where(reader_books.c.reader_id == readers[1].id, reader_books.c.book_id == books[1].id)
+                .values(due_date=datetime.utcnow() - timedelta(days=1))
+            )
+            await session.commit()
+            overdue = await overdue_loans(session, limit=500)
+            assert (readers[1].id, books[1].id) in {(row['reader_id'], row['book_id']) for row in overdue}
+            assert all(row['due_date'] < datetime.utcnow() for row in overdue)
+
+            # пересборка с нуля даёт те же сводки, что и инкрементальные обновления
+            await rebuild(session)
+            assert await top_books(session, genre.name) == top
+            rebuilt = {row['reader_id']: row for row in await active_readers(session, limit=100)}
+            assert rebuilt[readers[0].id] == active[readers[0].id]
+
+    asyncio.run(scenario())
+
+
+def test_reports_are_admin_only():
+    admin = {"Cookie": f"access_token={encode_jwt({'username': 'admin', 'role': 'admin'})}"}
+    reader = {"Cookie": f"access_token={encode_jwt({'username': 'reader', 'role': 'reader'})}"}
+
+    with TestClient(app) as ac:
+        for url in ("/reports/top_books", "/reports/active_readers", "/reports/overdue"):
+            assert ac.get(url, headers=reader).status_code == status.HTTP_403_FORBIDDEN
+            assert ac.get(url, headers=admin).status_code == status.HTTP_200_OK
+        assert ac.get("/reports/top_books?limit=0", headers=admin).status_code == 422
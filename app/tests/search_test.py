@@ -0,0 +1,55 @@
+from uuid import uuid4
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from main import app
+from app.database import engine
+from app.utils.jwt_secure import encode_jwt
+
+
+# Колонка search_vector и GIN-индекс создаются миграцией, в SQLite-подмене их нет
+pytestmark = pytest.mark.skipif(engine.dialect.name != 'postgresql', reason='full-text search needs Postgres')
+
+HEADERS = {"Cookie": f"access_token={encode_jwt({'username': 'admin', 'role': 'admin'})}"}
+
+
+def test_search_ranks_and_pages_results():
+    # слово только из букв: конфигурация simple не разобьёт его на части
+    word = ''.join(chr(ord('a') + int(c, 16)) for c in uuid4().hex[:12])
+    books = {
+        # название весит больше описания (A против B), совпадение в обоих — больше всего
+        'both': {"name": f"{word} both", "description": f"about {word}"},
+        'title': {"name": f"{word} title", "description": "nothing here"},
+        'body-0': {"name": "plain 0", "description": f"about {word}"},
+        'body-1': {"name": "plain 1", "description": f"about {word}"},
+        'body-2': {"name": "plain 2", "description": f"about {word}"},
+        'miss': {"name": "plain miss", "description": "nothing here"},
+    }
+
+    with TestClient(app) as ac:
+        ac.post("/genres", json={"names": [word]}, headers=HEADERS)
+        ac.post("/authors", json={"username": word}, headers=HEADERS)
+        ids = {}
+        for key, book in books.items():
+            response = ac.post("/books", json={
+                **book, "genres": [word], "authors": [word], "count_available": 1
+            }, headers=HEADERS)
+            assert response.status_code == status.HTTP_200_OK
+            ids[response.json()["id"]] = key
+
+        seen, cursor = [], None
+        while True:
+            response = ac.get("/books/search", params={"q": word, "limit": 2, **({"cursor": cursor} if cursor else {})})
+            assert response.status_code == status.HTTP_200_OK
+            page = response.json()
+            assert len(page["items"]) <= 2
+            seen += [ids[book["id"]] for book in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+    # равный ранг у книг с совпадением только в описании — их порядок задаёт id
+    body = sorted(book_id for book_id, key in ids.items() if key.startswith('body'))
+    assert seen == ['both', 'title', *(ids[book_id] for book_id in body)]
@@ -0,0 +1,200 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from settings import settings
+
+
+class LocalCache:
+    # LRU с TTL в памяти процесса
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: OrderedDict[str, tuple[object, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float | None = None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class PrincipalCache(LocalCache):
+    # Снимки пользователей по ключу (роль, username): get_current_user и /login
+    # обходятся без запроса в БД. Отсутствующих пользователей не кешируем.
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize, ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple[str, str]):
+        value = super().get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def invalidate(self, role: str, username: str):
+        with self._lock:
+            self._items.pop((role, username), None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self)
+        }
+
+
+class MemoryBackend:
+    # Заглушка общего кеша для локального запуска и тестов, интерфейс как у RedisBackend
+    def __init__(self):
+        self._items = LocalCache(maxsize=100_000, ttl=float('inf'))
+        self._counters: dict[str, int] = {}
+
+    async def get(self, key: str) -> str | None:
+        return self._items.get(key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        self._items.set(key, value, ttl)
+
+    async def get_version(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    async def incr(self, key: str) -> int:
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+
+class RedisBackend:
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL points to Redis, but the redis package is not installed")
+        self._client = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> str | None:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._client.set(key, value, ex=max(int(ttl), 1))
+
+    async def get_version(self, key: str) -> int:
+        return int(await self._client.get(key) or 0)
+
+    async def incr(self, key: str) -> int:
+        return await self._client.incr(key)
+
+
+class CatalogCache:
+    # Записи лежат под ключом "<scope>:<версия scope>:<key>". Инвалидация scope —
+    # это увеличение его версии: старые записи больше не находятся и сами
+    # вытесняются по LRU/TTL. С общим бэкендом версии хранятся в нём, поэтому
+    # запись в одном воркере сразу видна остальным.
+    def __init__(self, local: LocalCache, shared=None, enabled: bool = True):
+        self.local = local
+        self.shared = shared
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._versions: dict[str, int] = {}
+
+    async def _key(self, scope: str, key: str) -> str:
+        if self.shared is not None:
+            version = await self.shared.get_version(f'version:{scope}')
+        else:
+            version = self._versions.get(scope, 0)
+        return f'{scope}:{version}:{key}'
+
+    async def get(self, scope: str, key: str, loads) -> tuple[object, str | None]:
+        # Вместе со значением отдаём ключ с версией scope на момент чтения: промах надо
+        # сохранять именно под ним. Если пока запрос шёл в БД, scope инвалидировали,
+        # результат ляжет под старую версию и уже никому не попадётся.
+        if not self.enabled:
+            return None, None
+
+        full_key = await self._key(scope, key)
+        value = self.local.get(full_key)
+        if value is None and self.shared is not None:
+            raw = await self.shared.get(full_key)
+            if raw is not None:
+                value = loads(json.loads(raw))
+                self.local.set(full_key, value)
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value, full_key
+
+    async def set(self, full_key: str | None, value, dumps):
+        if not self.enabled or full_key is None:
+            return
+
+        self.local.set(full_key, value)
+        if self.shared is not None:
+            await self.shared.set(full_key, json.dumps(dumps(value)), self.local.ttl)
+
+    async def invalidate(self, *scopes: str):
+        for scope in scopes:
+            if self.shared is not None:
+                await self.shared.incr(f'version:{scope}')
+            else:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'size': len(self.local)
+        }
+
+
+def _shared_backend(url: str | None):
+    if not url:
+        return None
+    if url.startswith('memory://'):
+        return MemoryBackend()
+    return RedisBackend(url)
+
+
+catalog_cache = CatalogCache(
+    local=LocalCache(settings.cache.local_size, settings.cache.ttl),
+    shared=_shared_backend(settings.cache.backend_url),
+    enabled=settings.cache.enabled
+)
+
+principal_cache = PrincipalCache(
+    maxsize=settings.cache.principal_size if settings.cache.enabled else 0,
+    ttl=settings.cache.principal_ttl
+)
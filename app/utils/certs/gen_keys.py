@@ -1,6 +1,12 @@
+import os
+
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 
+# те же пути, что в settings.auth_jwt: скрипт запускается до приложения, без его импорта
+private_key_path = os.getenv('JWT_PRIVATE_KEY_PATH', os.path.join('app', 'private_key.pem'))
+public_key_path = os.getenv('JWT_PUBLIC_KEY_PATH', os.path.join('app', 'public_key.pem'))
+
 
 private_key = rsa.generate_private_key(
     public_exponent=65537,
@@ -8,7 +14,7 @@ private_key = rsa.generate_private_key(
 )
 
 
-with open("private_key.pem", "wb") as f:
+with open(private_key_path, "wb") as f:
     f.write(private_key.private_bytes(
         encoding=serialization.Encoding.PEM,
         format=serialization.PrivateFormat.PKCS8,
@@ -17,7 +23,7 @@ with open("private_key.pem", "wb") as f:
 
 public_key = private_key.public_key()
 
-with open("public_key.pem", "wb") as f:
+with open(public_key_path, "wb") as f:
     f.write(public_key.public_bytes(
         encoding=serialization.Encoding.PEM,
         format=serialization.PublicFormat.SubjectPublicKeyInfo
@@ -0,0 +1,37 @@
+import csv
+import io
+from typing import AsyncIterator
+
+import orjson
+
+from app.utils.importers import LIST_SEPARATOR, LIST_FIELDS
+
+
+# Кодирование выгрузки по пачкам: формат тот же, что принимает импорт
+# (app.utils.importers), так что выгрузку можно загрузить обратно как есть.
+CSV_FIELDS = ('id', 'name', 'description', 'published_at', 'count_available', *LIST_FIELDS)
+
+
+async def ndjson_chunks(chunks: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    async for rows in chunks:
+        yield b''.join(orjson.dumps(row) + b'\n' for row in rows)
+
+
+async def csv_chunks(chunks: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    async for rows in chunks:
+        for row in rows:
+            writer.writerow([
+                LIST_SEPARATOR.join(row[name]) if name in LIST_FIELDS
+                else row[name].isoformat() if name == 'published_at' and row[name] is not None
+                else row[name]
+                for name in CSV_FIELDS
+            ])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # пустой каталог: отдаём хотя бы заголовок
+    if buffer.tell():
+        yield buffer.getvalue().encode()
@@ -0,0 +1,79 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterator
+
+
+# Разбор потока импорта по мере поступления байтов: в памяти держим
+# только текущую незаконченную строку, а не весь файл.
+LIST_SEPARATOR = '|'
+LIST_FIELDS = ('authors', 'genres')
+MAX_LINE_CHARS = 1_000_000
+
+
+async def _iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    tail = ''
+    async for chunk in stream:
+        tail += decoder.decode(chunk)
+        *lines, tail = tail.split('\n')
+        if len(tail) > MAX_LINE_CHARS:
+            raise ValueError("Line is too long")
+        for line in lines:
+            yield line.rstrip('\r')
+    tail += decoder.decode(b'', final=True)
+    if tail:
+        yield tail.rstrip('\r')
+
+
+async def iter_ndjson(stream: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, dict | Exception]]:
+    line_no = 0
+    async for line in _iter_lines(stream):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("Row must be a JSON object")
+        except ValueError as e:
+            yield line_no, e
+            continue
+        yield line_no, row
+
+
+async def iter_csv(stream: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, dict | Exception]]:
+    # Запись может занимать несколько строк, если в кавычках есть перевод строки:
+    # копим строки, пока число кавычек не станет чётным
+    header = None
+    record, record_start, line_no = '', 0, 0
+    async for line in _iter_lines(stream):
+        line_no += 1
+        if not record:
+            if not line.strip():
+                continue
+            record_start = line_no
+        record = f'{record}\n{line}' if record else line
+        if record.count('"') % 2:
+            if len(record) > MAX_LINE_CHARS:
+                raise ValueError("Line is too long")
+            continue
+
+        values, record = next(csv.reader([record])), ''
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield record_start, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+
+        row = {}
+        for name, value in zip(header, values):
+            if name in LIST_FIELDS:
+                row[name] = [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()]
+            else:
+                row[name] = value if value != '' else None
+        yield record_start, row
+
+    if record:
+        yield record_start, ValueError("Unterminated quoted field")
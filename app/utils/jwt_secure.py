@@ -1,41 +1,167 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import bcrypt
-from settings import settings
 import jwt
+from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+from app.utils.cache import LocalCache
+from app.utils.metrics import timed_auth
+from settings import settings
+
+
+DEFAULT_KID = 'default'
+
+
+class TokenCache(LocalCache):
+    # LRU уже проверенных токенов: повторный запрос с тем же токеном не гоняет RS256 verify
+    def set(self, token: str, payload: dict, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        exp = payload.get('exp')
+        if isinstance(exp, (int, float)):
+            # не держим токен в кеше дольше, чем он живёт
+            ttl = min(ttl, exp - time.time())
+        if ttl > 0:
+            super().set(token, payload, ttl)
+
+
+class KeyManager:
+    # Держит распарсенные RSA-ключи в памяти и выбирает их по заголовку kid.
+    # Файлы перечитываются не чаще раза в reload_interval секунд, так что для
+    # ротации достаточно положить новую пару в keys_dir, без рестарта.
+    def __init__(
+            self,
+            private_key_path: str,
+            public_key_path: str,
+            keys_dir: str | None = None,
+            reload_interval: float = 30,
+            cache_size: int = 4096,
+            cache_ttl: float = 60
+    ):
+        self.private_key_path = private_key_path
+        self.public_key_path = public_key_path
+        self.keys_dir = keys_dir
+        self.reload_interval = reload_interval
+        self.verified = TokenCache(cache_size, cache_ttl)
+
+        self._private_keys = {}
+        self._public_keys = {}
+        self._active_kid = None
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _key_files(self) -> dict[str, tuple[str, str, float]]:
+        # путь -> (kid, 'private' | 'public', mtime)
+        files = {}
+        if self.keys_dir:
+            for name in os.listdir(self.keys_dir):
+                parts = name.rsplit('.', 2)
+                if len(parts) == 3 and parts[1] in ('private', 'public') and parts[2] == 'pem':
+                    path = os.path.join(self.keys_dir, name)
+                    files[path] = (parts[0], parts[1], os.stat(path).st_mtime)
+        else:
+            for path, kind in ((self.private_key_path, 'private'), (self.public_key_path, 'public')):
+                if os.path.exists(path):
+                    files[path] = (DEFAULT_KID, kind, os.stat(path).st_mtime)
+        return files
+
+    def refresh(self, force: bool = False) -> bool:
+        now = time.monotonic()
+        if not force and self._snapshot is not None and now - self._checked_at < self.reload_interval:
+            return False
+
+        with self._lock:
+            self._checked_at = now
+            files = self._key_files()
+            if files == self._snapshot:
+                return False
+
+            private_keys, public_keys, private_mtimes = {}, {}, {}
+            for path, (kid, kind, mtime) in files.items():
+                with open(path, 'rb') as key_file:
+                    data = key_file.read()
+                if kind == 'private':
+                    private_keys[kid] = load_pem_private_key(data, password=None)
+                    private_mtimes[kid] = mtime
+                else:
+                    public_keys[kid] = load_pem_public_key(data)
+
+            for kid, key in private_keys.items():
+                public_keys.setdefault(kid, key.public_key())
+
+            self._private_keys = private_keys
+            self._public_keys = public_keys
+            self._active_kid = max(private_mtimes, key=lambda kid: (private_mtimes[kid], kid), default=None)
+            self._snapshot = files
+            # ключи могли отозвать — ранее проверенные токены больше не доверенные
+            self.verified.clear()
+            return True
+
+    def signing_key(self):
+        self.refresh()
+        if self._active_kid is None:
+            raise FileNotFoundError("No private key available for signing JWT")
+        return self._active_kid, self._private_keys[self._active_kid]
+
+    def verification_key(self, kid: str | None):
+        self.refresh()
+        key = self._public_keys.get(kid or self._active_kid or DEFAULT_KID)
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown JWT key id")
+        return key
+
+
+key_manager = KeyManager(
+    private_key_path=settings.auth_jwt.private_key_path,
+    public_key_path=settings.auth_jwt.public_key_path,
+    keys_dir=settings.auth_jwt.keys_dir,
+    reload_interval=settings.auth_jwt.keys_reload_interval,
+    cache_size=settings.auth_jwt.token_cache_size,
+    cache_ttl=settings.auth_jwt.token_cache_ttl
+)
 
 
 def encode_jwt(
         payload,
-        private_key: str = settings.auth_jwt.private_key_path,
-        algorithm: str = settings.auth_jwt.algorithm
+        algorithm: str = settings.auth_jwt.algorithm,
+        keys: KeyManager = key_manager
 ):
-    with open(private_key) as p_key:
-        private_key = p_key.read()
+    kid, private_key = keys.signing_key()
     encoded = jwt.encode(
         payload,
         private_key,
-        algorithm=algorithm
+        algorithm=algorithm,
+        headers={'kid': kid}
     )
     return encoded
 
 
 def decode_jwt(
         token,
-        public_key: str = settings.auth_jwt.public_key_path,
-        algorithm: str = settings.auth_jwt.algorithm
+        algorithm: str = settings.auth_jwt.algorithm,
+        keys: KeyManager = key_manager
 ):
-    with open(public_key) as pb_key:
-        public_key = pb_key.read()
+    with timed_auth():
+        keys.refresh()
+        cached = keys.verified.get(token)
+        if cached is not None:
+            return dict(cached)
 
-    decoded = jwt.decode(
-        token,
-        public_key,
-        algorithms=algorithm
-    )
-    return decoded
+        public_key = keys.verification_key(jwt.get_unverified_header(token).get('kid'))
+        decoded = jwt.decode(
+            token,
+            public_key,
+            algorithms=[algorithm]
+        )
+        keys.verified.set(token, decoded)
+        return dict(decoded)
 
 
-def hash_password(password: str) -> bytes:
-    salt = bcrypt.gensalt()
+def hash_password(password: str, rounds: int = settings.passwords.bcrypt_rounds) -> bytes:
+    salt = bcrypt.gensalt(rounds=rounds)
     pwd_bytes: bytes = password.encode()
 
     return bcrypt.hashpw(pwd_bytes, salt)
@@ -44,3 +170,51 @@ def hash_password(password: str) -> bytes:
 def check_password(password: str, hashed_password: bytes) -> bool:
     return bcrypt.checkpw(password.encode(), hashed_password)
 
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    # bcrypt отпускает GIL, поэтому пула потоков хватает, чтобы event loop не стоял
+    def __init__(self, rounds: int, workers: int, queue_limit: int):
+        self.rounds = rounds
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def _run(self, func, *args):
+        if self._pending >= self.queue_limit:
+            raise PasswordHasherBusy("Too many password hashing requests in flight")
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> bytes:
+        with timed_auth():
+            return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: bytes) -> bool:
+        with timed_auth():
+            return await self._run(check_password, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: bytes) -> bool:
+        # $2b$<cost>$<salt+hash>
+        try:
+            return int(hashed_password.split(b'$')[2]) < self.rounds
+        except (IndexError, ValueError):
+            return True
+
+
+password_hasher = PasswordHasher(
+    rounds=settings.passwords.bcrypt_rounds,
+    workers=settings.passwords.hash_workers,
+    queue_limit=settings.passwords.hash_queue_limit
+)
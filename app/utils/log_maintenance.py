@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import math
+import re
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.database import async_engine
+from app.database.models import Logs, LogRollup
+from settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+MINUTE = timedelta(minutes=1)
+# за один проход сворачиваем не больше часа логов, чтобы догонялка после простоя не съела память
+ROLLUP_WINDOW = timedelta(hours=1)
+# ключ pg_try_advisory_xact_lock: обслуживание в один момент делает только один воркер
+LOCK_KEY = 0x6C6F6773
+_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+def floor_minute(at: datetime) -> datetime:
+    return at.replace(second=0, microsecond=0)
+
+
+def partition_start(at: datetime, interval: str) -> datetime:
+    day = datetime(at.year, at.month, at.day)
+    return day - timedelta(days=day.weekday()) if interval == 'week' else day
+
+
+def partition_step(interval: str) -> timedelta:
+    return timedelta(days=7 if interval == 'week' else 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f'logs_p{start:%Y%m%d}'
+
+
+def percentile(ordered: list[int], q: float) -> int:
+    # nearest-rank по отсортированному списку: значение всегда одно из наблюдавшихся
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+class LogMaintenance:
+    # Обслуживание таблицы logs: разделы вперёд, поминутные сводки по маршрутам и удаление
+    # старых разделов целиком (DROP TABLE вместо DELETE). Без Postgres разделов нет,
+    # и устаревшие строки удаляются обычным DELETE.
+    def __init__(
+            self,
+            interval: float = 60,
+            partition_interval: str = 'day',
+            partitions_ahead: int = 2,
+            retention_days: int = 14,
+            rollup_retention_days: int = 90,
+            rollup_delay: float = 120,
+            engine=async_engine
+    ):
+        if partition_interval not in ('day', 'week'):
+            raise ValueError(f"Unknown partition interval: {partition_interval}")
+
+        self.interval = interval
+        self.partition_interval = partition_interval
+        self.partitions_ahead = partitions_ahead
+        self.retention = timedelta(days=retention_days)
+        self.rollup_retention = timedelta(days=rollup_retention_days)
+        self.rollup_delay = timedelta(seconds=rollup_delay)
+        self.engine = engine
+        self._task: asyncio.Task | None = None
+
+    @property
+    def partitioned(self) -> bool:
+        return self.engine.dialect.name == 'postgresql'
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running or self.interval <= 0:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        # разделы на ближайшие периоды нужны сразу, остальное ждёт первого интервала
+        steps = (self.ensure_partitions,)
+        while True:
+            try:
+                await self.run_once(steps=steps)
+            except Exception:
+                logger.exception("Log maintenance failed")
+            steps = (self.ensure_partitions, self.rollup, self.drop_expired)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, now: datetime | None = None, steps=None) -> dict:
+        now = now or datetime.utcnow()
+        result = {}
+        # каждый шаг в своей транзакции: DROP раздела не должен держать блокировку, пока идёт свёртка
+        for step in steps or (self.ensure_partitions, self.rollup, self.drop_expired):
+            async with self.engine.begin() as conn:
+                if self.partitioned and not await conn.scalar(
+                        text('SELECT pg_try_advisory_xact_lock(:key)'), {'key': LOCK_KEY}
+                ):
+                    continue
+                result[step.__name__] = await step(conn, now)
+        return result
+
+    async def ensure_partitions(self, conn, now: datetime) -> list[str]:
+        if not self.partitioned:
+            return []
+        created = []
+        start = partition_start(now, self.partition_interval)
+        step = partition_step(self.partition_interval)
+        for _ in range(self.partitions_ahead + 1):
+            name = partition_name(start)
+            if await conn.scalar(text('SELECT to_regclass(:name)'), {'name': name}) is None:
+                await conn.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF logs FOR VALUES FROM ('{start}') TO ('{start + step}')"
+                ))
+                created.append(name)
+            start += step
+        return created
+
+    async def rollup(self, conn, now: datetime) -> int:
+        until = floor_minute(now - self.rollup_delay)
+        done = await conn.scalar(select(func.max(LogRollup.minute)))
+        since = done + MINUTE if done is not None else now - self.retention
+        # пропускаем минуты без логов: иначе после долгой паузы окно застрянет на пустом часе
+        first = await conn.scalar(select(func.min(Logs.at_time)).where(Logs.at_time >= since))
+        if first is None or first >= until:
+            return 0
+        since = floor_minute(first)
+        until = min(until, since + ROLLUP_WINDOW)
+
+        if conn.dialect.name == 'postgresql':
+            return await self._rollup_in_sql(conn, since, until)
+        return await self._rollup_in_python(conn, since, until)
+
+    async def _rollup_in_sql(self, conn, since: datetime, until: datetime) -> int:
+        # Перцентили считает сам Postgres: percentile_disc — тот же nearest-rank, что percentile(),
+        # и сырые строки раздела не уезжают в процесс
+        duration = func.coalesce(Logs.context['duration_ms'].as_integer(), 0)
+        minute = func.date_trunc('minute', Logs.at_time)
+        method = func.coalesce(Logs.context['method'].as_string(), '')
+        # запросы мимо маршрутов (404) без шаблона — их сводим по пути как есть
+        route = func.coalesce(Logs.context['route'].as_string(), Logs.context['path'].as_string(), '')
+        rows = (
+            select(
+                minute, method, route,
+                func.count(),
+                # ошибка — это ответ 5xx: 4xx говорят о клиенте, а не о сервисе
+                func.count().filter(Logs.context['status_code'].as_integer() >= 500),
+                *(func.percentile_disc(q).within_group(duration) for q in (0.5, 0.95, 0.99)),
+                func.max(duration)
+            )
+            .where(Logs.at_time >= since, Logs.at_time < until)
+            .group_by(minute, method, route)
+        )
+        statement = pg_insert(LogRollup).from_select(
+            ['minute', 'method', 'route', 'requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'], rows
+        )
+        result = await conn.execute(self._upsert(statement).returning(LogRollup.minute))
+        return len(result.all())
+
+    async def _rollup_in_python(self, conn, since: datetime, until: datetime) -> int:
+        # SQLite-подмена без percentile_disc: окно не больше часа, строки сворачиваем здесь
+        durations, errors = defaultdict(list), defaultdict(int)
+        rows = await conn.execute(
+            select(
+                Logs.at_time,
+                Logs.context['method'].as_string().label('method'),
+                Logs.context['route'].as_string().label('route'),
+                Logs.context['path'].as_string().label('path'),
+                Logs.context['status_code'].as_integer().label('status_code'),
+                Logs.context['duration_ms'].as_integer().label('duration_ms')
+            )
+            .where(Logs.at_time >= since, Logs.at_time < until)
+        )
+        for row in rows:
+            key = (floor_minute(row.at_time), row.method or '', row.route or row.path or '')
+            durations[key].append(row.duration_ms or 0)
+            if (row.status_code or 0) >= 500:
+                errors[key] += 1
+
+        values = []
+        for key, samples in durations.items():
+            samples.sort()
+            values.append({
+                'minute': key[0], 'method': key[1], 'route': key[2],
+                'requests': len(samples), 'errors': errors[key],
+                'p50_ms': percentile(samples, 50), 'p95_ms': percentile(samples, 95),
+                'p99_ms': percentile(samples, 99), 'max_ms': samples[-1]
+            })
+        if values:
+            await conn.execute(self._upsert(sqlite_insert(LogRollup).values(values)))
+        return len(values)
+
+    @staticmethod
+    def _upsert(statement):
+        return statement.on_conflict_do_update(
+            index_elements=['minute', 'method', 'route'],
+            set_={column: statement.excluded[column] for column in (
+                'requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'
+            )}
+        )
+
+    async def drop_expired(self, conn, now: datetime) -> int:
+        cutoff = now - self.retention
+        # сводки маленькие, их чистим обычным DELETE
+        await conn.execute(delete(LogRollup).where(LogRollup.minute < now - self.rollup_retention))
+        if not self.partitioned:
+            return (await conn.execute(delete(Logs).where(Logs.at_time < cutoff))).rowcount
+
+        partitions = await conn.execute(text(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = 'logs'::regclass"
+        ))
+        dropped = 0
+        for name, bound in partitions.all():
+            upper = _UPPER_BOUND.search(bound)
+            # раздел DEFAULT границ не имеет и не удаляется
+            if upper and datetime.fromisoformat(upper.group(1)) <= cutoff:
+                await conn.execute(text(f'DROP TABLE {name}'))
+                dropped += 1
+        return dropped
+
+
+log_maintenance = LogMaintenance(
+    interval=settings.logs.maintenance_interval,
+    partition_interval=settings.logs.partition_interval,
+    partitions_ahead=settings.logs.partitions_ahead,
+    retention_days=settings.logs.retention_days,
+    rollup_retention_days=settings.logs.rollup_retention_days,
+    rollup_delay=settings.logs.rollup_delay
+)
+
+
+if __name__ == '__main__':
+    # разовый проход, например из cron, если в приложении LOG_MAINTENANCE_INTERVAL=0
+    if sys.argv[1:] != ['run']:
+        raise SystemExit("Usage: python -m app.utils.log_maintenance run")
+    print(asyncio.run(log_maintenance.run_once()))
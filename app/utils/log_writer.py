@@ -0,0 +1,127 @@
+import asyncio
+import contextvars
+import logging
+import random
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from app.database import async_engine
+from app.database.models import Logs
+from settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class LogWriter:
+    # Копит записи логов в очереди и пишет их в таблицу logs одним многострочным INSERT
+    # по достижении batch_size записей или раз в flush_interval секунд
+    def __init__(
+            self,
+            batch_size: int = 500,
+            flush_interval: float = 1.0,
+            queue_size: int = 10000,
+            overflow_policy: str = 'drop',
+            sample_rate: float = 0.1,
+            engine=async_engine
+    ):
+        if overflow_policy not in ('drop', 'sample'):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.sample_rate = sample_rate
+        self.engine = engine
+
+        self.written = 0
+        self.dropped = 0
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        # Пустой контекст: при запуске из push() задача иначе унаследовала бы contextvars
+        # запроса (current_timings), и запись пачек считалась бы запросами в его Server-Timing
+        self._task = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+
+    async def stop(self):
+        if not self.running:
+            return
+        # всё, что в очереди до маркера, ещё успеет записаться
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    def push(self, level: str, message: str, context: dict | None = None):
+        if not self.running:
+            self.start()
+
+        if self.overflow_policy == 'sample' and self._queue.qsize() >= self.queue_size // 2:
+            if random.random() >= self.sample_rate:
+                self.dropped += 1
+                return
+
+        try:
+            self._queue.put_nowait({
+                'at_time': datetime.utcnow(),
+                'level': level,
+                'message': message,
+                'context': context
+            })
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = []
+            item = await self._queue.get()
+            deadline = loop.time() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            if batch:
+                await self._write(batch)
+
+    async def _write(self, batch: list[dict]):
+        try:
+            async with self.engine.begin() as conn:
+                await conn.execute(insert(Logs), batch)
+            self.written += len(batch)
+        except Exception:
+            # логи не должны ронять сервис: теряем пачку и идём дальше
+            logger.exception("Failed to write %d log records", len(batch))
+            self.dropped += len(batch)
+
+
+log_writer = LogWriter(
+    batch_size=settings.logs.batch_size,
+    flush_interval=settings.logs.flush_interval,
+    queue_size=settings.logs.queue_size,
+    overflow_policy=settings.logs.overflow_policy,
+    sample_rate=settings.logs.sample_rate
+)
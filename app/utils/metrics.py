@@ -0,0 +1,174 @@
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Метрики в текстовом формате Prometheus без внешних зависимостей: гистограммы
+# по маршрутам копятся в памяти процесса, /metrics отдаёт их как есть.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestTimings:
+    # Время одного запроса по частям; живёт в contextvar, который ставит MetricsMiddleware
+    __slots__ = ('started', 'db', 'queries', 'auth', 'endpoint_done')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db = 0.0
+        self.queries = 0
+        self.auth = 0.0
+        self.endpoint_done = None
+
+    def server_timing(self, now: float) -> str:
+        # serialize — от возврата из обработчика до начала ответа: response_model и кодирование JSON
+        serialize = now - self.endpoint_done if self.endpoint_done is not None else 0.0
+        return ', '.join([
+            f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries"',
+            f'auth;dur={self.auth * 1000:.2f}',
+            f'serialize;dur={serialize * 1000:.2f}',
+            f'total;dur={(now - self.started) * 1000:.2f}'
+        ])
+
+
+current_timings: ContextVar[RequestTimings | None] = ContextVar('current_timings', default=None)
+
+
+@contextmanager
+def timed_auth():
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = current_timings.get()
+        if timings is not None:
+            timings.auth += time.perf_counter() - started
+
+
+# Время старта кладём в контекст выполнения, а не в conn.info: контекст живёт один запрос,
+# а соединение из пула — долго. На ошибке after_cursor_execute не вызывается,
+# поэтому упавший запрос досчитывает handle_error
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_timings.get() is not None and context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _finish_query(context):
+    timings = current_timings.get()
+    started = getattr(context, '_query_started', None)
+    if timings is not None and started is not None:
+        timings.db += time.perf_counter() - started
+        timings.queries += 1
+        context._query_started = None
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _finish_query(context)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    _finish_query(exception_context.execution_context)
+
+
+class TimedRoute(APIRoute):
+    # Отмечает момент, когда обработчик вернул результат, — дальше идёт сериализация ответа
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        endpoint = self.dependant.call
+        if not inspect.iscoroutinefunction(endpoint):
+            return
+
+        @functools.wraps(endpoint)
+        async def call(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                timings = current_timings.get()
+                if timings is not None:
+                    timings.endpoint_done = time.perf_counter()
+
+        self.dependant.call = call
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels) -> str:
+    return ','.join(f'{key}="{value}"' for key, value in labels.items())
+
+
+class Metrics:
+    def __init__(self):
+        self.in_flight = 0
+        self.requests: dict[tuple, int] = {}
+        self.latency: dict[tuple, Histogram] = {}
+        self.db_time: dict[tuple, Histogram] = {}
+        self.queries: dict[tuple, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method: str, route: str, status: int, duration: float, timings: RequestTimings):
+        key = (method, route)
+        with self._lock:
+            self.requests[(method, route, status)] = self.requests.get((method, route, status), 0) + 1
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(duration)
+            self.db_time.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(timings.db)
+            self.queries.setdefault(key, Histogram(QUERY_BUCKETS)).observe(timings.queries)
+
+    def render(self, gauges: list[tuple[str, str, str, list[tuple[dict, float]]]] = ()) -> str:
+        # gauges: (имя, тип, описание, [(метки, значение), ...]) — снимки чужих счётчиков
+        lines = []
+        with self._lock:
+            lines += [
+                '# HELP http_requests_in_flight Requests being processed right now.',
+                '# TYPE http_requests_in_flight gauge',
+                f'http_requests_in_flight {self.in_flight}',
+                '# HELP http_requests_total Finished requests.',
+                '# TYPE http_requests_total counter'
+            ]
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}')
+
+            for name, help_text, histograms in (
+                    ('http_request_duration_seconds', 'Request latency.', self.latency),
+                    ('http_request_db_seconds', 'SQL time per request.', self.db_time),
+                    ('http_request_db_queries', 'SQL queries per request.', self.queries)
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (method, route), histogram in sorted(histograms.items()):
+                    labels = _labels(method=method, route=route)
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+        for name, type_, help_text, samples in gauges:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {type_}']
+            for labels, value in samples:
+                lines.append(f'{name}{{{_labels(**labels)}}} {value}' if labels else f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
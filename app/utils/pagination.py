@@ -0,0 +1,20 @@
+import base64
+import json
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([str(v) if v is not None else None for v in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+    # encode_cursor пишет только строки; всё прочее — подделанный курсор, а не повод для 500
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(v, str) for v in values):
+        raise ValueError("Invalid cursor")
+    return values
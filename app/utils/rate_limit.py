@@ -0,0 +1,128 @@
+import time
+from collections import OrderedDict
+
+from settings import settings
+
+
+# Допуск запросов в процесс: вёдра токенов по ключу (IP, пользователь) и пределы
+# одновременных запросов по группам маршрутов. Всё живёт в памяти процесса и работает
+# в одном event loop, поэтому блокировки не нужны; при N воркерах пределы — на каждый.
+AUTH_PATHS = frozenset({'/login', '/register'})
+READ_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+
+
+def route_group(method: str, path: str) -> str | None:
+    if path in AUTH_PATHS:
+        return 'auth'
+    if method not in READ_METHODS:
+        return 'write'
+    return None
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int, max_keys: int = 10000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+
+    def _bucket(self, key: str) -> TokenBucket:
+        now = self.clock()
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        # вытесненное ведро просто начнётся заново полным
+        self._buckets[key] = bucket
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return bucket
+
+    def peek(self, key: str) -> float:
+        # как acquire, но токен не забирает: запрос ещё могут отклонить по другому ведру
+        if self.rate <= 0:
+            return 0.0
+        bucket = self._bucket(key)
+        return 0.0 if bucket.tokens >= 1 else (1 - bucket.tokens) / self.rate
+
+    def acquire(self, key: str) -> float:
+        # 0 — запрос проходит, иначе через сколько секунд появится следующий токен
+        if self.rate <= 0:
+            return 0.0
+        bucket = self._bucket(key)
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+
+class ConcurrencyLimiter:
+    # без очереди: сверх предела запрос сразу получает отказ, а не ждёт
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+
+    def try_acquire(self) -> bool:
+        if 0 < self.limit <= self.in_flight:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+
+
+class Admission:
+    def __init__(
+            self,
+            auth_ip_rate: float = 1,
+            auth_ip_burst: int = 10,
+            write_ip_rate: float = 20,
+            write_ip_burst: int = 40,
+            write_user_rate: float = 10,
+            write_user_burst: int = 20,
+            auth_concurrency: int = 16,
+            write_concurrency: int = 10,
+            max_keys: int = 10000
+    ):
+        self.ip = {
+            'auth': RateLimiter(auth_ip_rate, auth_ip_burst, max_keys),
+            'write': RateLimiter(write_ip_rate, write_ip_burst, max_keys)
+        }
+        # на /login и /register пользователя ещё нет, только IP
+        self.user = {'write': RateLimiter(write_user_rate, write_user_burst, max_keys)}
+        self.concurrency = {'auth': ConcurrencyLimiter(auth_concurrency), 'write': ConcurrencyLimiter(write_concurrency)}
+        self.rejected: dict[tuple[str, str], int] = {}
+
+    def reject(self, group: str, reason: str):
+        self.rejected[(group, reason)] = self.rejected.get((group, reason), 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            'rejected': dict(self.rejected),
+            'in_flight': {group: limiter.in_flight for group, limiter in self.concurrency.items()}
+        }
+
+
+admission = Admission(
+    auth_ip_rate=settings.limits.auth_ip_rate,
+    auth_ip_burst=settings.limits.auth_ip_burst,
+    write_ip_rate=settings.limits.write_ip_rate,
+    write_ip_burst=settings.limits.write_ip_burst,
+    write_user_rate=settings.limits.write_user_rate,
+    write_user_burst=settings.limits.write_user_burst,
+    auth_concurrency=settings.limits.auth_concurrency,
+    write_concurrency=settings.limits.write_concurrency,
+    max_keys=settings.limits.max_keys
+)
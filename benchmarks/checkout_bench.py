@@ -0,0 +1,70 @@
+"""Конкурентная выдача одной популярной книги: проверка на перевыдачу и пропускная способность.
+
+Запуск из корня проекта (база берётся из DB_URL/ASYNC_DB_URL)::
+
+    python -m benchmarks.checkout_bench [readers] [copies]
+"""
+import asyncio
+import sys
+import time
+from uuid import uuid4
+
+from sqlalchemy import select, delete, func
+
+from app.database import AsyncSessionLocal
+from app.database.models import Book, User, UserReader, reader_books
+from app.loans import checkout, LoanError
+
+
+async def run(readers: int = 200, copies: int = 20) -> dict:
+    book_id = uuid4()
+    reader_ids = [uuid4() for _ in range(readers)]
+    async with AsyncSessionLocal() as session:
+        session.add(Book(id=book_id, name=f'bench-{book_id}', description='', count_available=copies))
+        session.add_all(User(id=reader_id, username=f'bench-{reader_id}', role='reader') for reader_id in reader_ids)
+        await session.flush()
+        session.add_all(UserReader(id=reader_id, user_id=reader_id) for reader_id in reader_ids)
+        await session.commit()
+
+    async def attempt(reader_id):
+        async with AsyncSessionLocal() as session:
+            try:
+                await checkout(session, reader_id, book_id)
+                return True
+            except LoanError:
+                return False
+
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(attempt(reader_id) for reader_id in reader_ids))
+        elapsed = time.perf_counter() - started
+
+        async with AsyncSessionLocal() as session:
+            count_available = await session.scalar(select(Book.count_available).where(Book.id == book_id))
+            open_loans = await session.scalar(
+                select(func.count()).select_from(reader_books)
+                .where(reader_books.c.book_id == book_id, reader_books.c.input_date.is_(None))
+            )
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(reader_books).where(reader_books.c.book_id == book_id))
+            await session.execute(delete(Book).where(Book.id == book_id))
+            await session.execute(delete(UserReader).where(UserReader.id.in_(reader_ids)))
+            await session.execute(delete(User).where(User.id.in_(reader_ids)))
+            await session.commit()
+
+    return {
+        'attempts': readers,
+        'succeeded': sum(results),
+        'count_available': count_available,
+        'open_loans': open_loans,
+        'seconds': elapsed,
+        'checkouts_per_second': readers / elapsed
+    }
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    stats = asyncio.run(run(*args))
+    print(stats)
+    assert stats['succeeded'] == stats['open_loans'] and stats['count_available'] >= 0, 'book was oversold'
@@ -0,0 +1,58 @@
+"""Память и время до первого байта у потоковой выгрузки каталога.
+
+Для каждого размера каталога вставляет книги (по два автора и жанра), гонит
+выгрузку через csv/ndjson-кодировщик GET /books/export и печатает время до
+первой пачки, общее время и пик памяти по tracemalloc. При потоковой выгрузке
+пик не должен расти вместе с каталогом. Запуск из корня проекта::
+
+    python -m benchmarks.export_bench [books ...]
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+
+from sqlalchemy import delete
+
+from app.crud import export_books
+from app.database import AsyncSessionLocal
+from app.database.models import Book, Author, Genre, book_authors, book_genres
+from app.utils.exporters import csv_chunks, ndjson_chunks
+from benchmarks.serialization_bench import _seed
+
+
+async def _export(encode) -> tuple[float, float, int, int]:
+    tracemalloc.start()
+    started = time.perf_counter()
+    first_chunk, size = None, 0
+    async with AsyncSessionLocal() as session:
+        async for chunk in encode(export_books(session)):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - started
+            size += len(chunk)
+    total = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return first_chunk, total, peak, size
+
+
+async def main(sizes: list[int]):
+    for books in sizes:
+        book_ids, author_ids, genre_ids = await _seed(books)
+        try:
+            for name, encode in (('ndjson', ndjson_chunks), ('csv', csv_chunks)):
+                first_chunk, total, peak, size = await _export(encode)
+                print(f'{books:>9} {name:>6}: first chunk {first_chunk * 1000:7.1f} ms, total {total:7.2f} s, '
+                      f'peak {peak / 2 ** 20:6.1f} MiB, {size / 2 ** 20:7.1f} MiB sent')
+        finally:
+            async with AsyncSessionLocal() as session:
+                await session.execute(delete(book_authors).where(book_authors.c.book_id.in_(book_ids)))
+                await session.execute(delete(book_genres).where(book_genres.c.book_id.in_(book_ids)))
+                await session.execute(delete(Book).where(Book.id.in_(book_ids)))
+                await session.execute(delete(Author).where(Author.id.in_(author_ids)))
+                await session.execute(delete(Genre).where(Genre.id.in_(genre_ids)))
+                await session.commit()
+
+
+if __name__ == '__main__':
+    asyncio.run(main([int(arg) for arg in sys.argv[1:]] or [10_000, 50_000]))
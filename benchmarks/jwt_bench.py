@@ -0,0 +1,73 @@
+"""Микробенчмарк encode/decode JWT: чтение PEM на каждый вызов против KeyManager.
+
+Запуск из корня проекта::
+
+    python -m benchmarks.jwt_bench [iterations]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.utils.jwt_secure import KeyManager, encode_jwt, decode_jwt
+
+
+def _write_keys(directory: str) -> tuple[str, str]:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_path = os.path.join(directory, 'private_key.pem')
+    public_path = os.path.join(directory, 'public_key.pem')
+    with open(private_path, 'wb') as f:
+        f.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ))
+    with open(public_path, 'wb') as f:
+        f.write(private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ))
+    return private_path, public_path
+
+
+def legacy_encode(payload, private_path):
+    with open(private_path) as p_key:
+        private_key = p_key.read()
+    return jwt.encode(payload, private_key, algorithm='RS256')
+
+
+def legacy_decode(token, public_path):
+    with open(public_path) as pb_key:
+        public_key = pb_key.read()
+    return jwt.decode(token, public_key, algorithms='RS256')
+
+
+def _rate(label: str, iterations: int, func):
+    started = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    elapsed = time.perf_counter() - started
+    print(f'{label:<32} {iterations / elapsed:>10.0f} ops/s')
+
+
+def main(iterations: int = 500):
+    with tempfile.TemporaryDirectory() as directory:
+        private_path, public_path = _write_keys(directory)
+        keys = KeyManager(private_path, public_path, reload_interval=3600, cache_size=iterations)
+        payloads = [{'username': f'user{i}', 'role': 'reader'} for i in range(iterations)]
+        tokens = [encode_jwt(p, keys=keys) for p in payloads]
+
+        _rate('encode: read PEM per call', iterations, lambda i: legacy_encode(payloads[i], private_path))
+        _rate('encode: KeyManager', iterations, lambda i: encode_jwt(payloads[i], keys=keys))
+        _rate('decode: read PEM per call', iterations, lambda i: legacy_decode(tokens[i], public_path))
+        keys.verified.clear()
+        _rate('decode: KeyManager, cold cache', iterations, lambda i: decode_jwt(tokens[i], keys=keys))
+        _rate('decode: KeyManager, warm cache', iterations, lambda i: decode_jwt(tokens[i], keys=keys))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,311 @@
+"""Нагрузочный бенчмарк API: задержки p50/p95/p99 и RPS по ключевым эндпоинтам.
+
+Засевает синтетический каталог (книги, авторы, жанры, читатели, выдачи) в базу
+из DB_URL/ASYNC_DB_URL — Postgres с применёнными миграциями или SQLite-подмену,
+гоняет /login, /books, /books/{id} и /give_book на заданных уровнях
+конкурентности и удаляет засеянные строки. Без --url запросы идут в приложение
+внутри процесса, с --url — в запущенный сервер (с той же базой). Запуск из
+корня проекта::
+
+    python -m benchmarks.load_bench --concurrency 1 10 25 --save benchmarks/baseline.json
+    python -m benchmarks.load_bench --compare benchmarks/baseline.json --tolerance 0.2
+
+С --compare процесс завершается с кодом 1, если p95 какого-то эндпоинта вырос
+или RPS упал больше чем на tolerance относительно сохранённого результата.
+Размеры засева, уровни конкурентности и seed, не заданные в аргументах, берутся
+из конфигурации baseline, так что сравнивается та же нагрузка. В репозитории
+лежит benchmarks/baseline.json, снятый в процессе на SQLite-подмене; цифры
+зависят от машины, поэтому перед сравнением на своей стоит переснять его с --save.
+Уровень 50 для /login упирается в HASH_QUEUE_LIMIT (32) и даёт ожидаемые 503,
+поэтому baseline снят на 1, 10 и 25.
+Сервер для --url стоит запускать с LIMITS_ENABLED=0, иначе часть запросов
+упрётся в ограничения допуска (app.utils.rate_limit).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import httpx
+from sqlalchemy import delete, insert
+
+# бенчмарк меряет сам сервис: все запросы идут с одного адреса, и ограничитель
+# допуска в процессе тут же начал бы отвечать 429
+os.environ.setdefault('LIMITS_ENABLED', '0')
+
+from app.database import AsyncSessionLocal, Base, engine  # noqa: E402
+from app.database.models import (  # noqa: E402
+    Book, Author, Genre, User, UserReader, book_authors, book_genres, reader_books
+)
+from app.utils.jwt_secure import encode_jwt, hash_password  # noqa: E402
+
+PASSWORD = 'bench-password'
+ENDPOINTS = ('login', 'books', 'book', 'give_book')
+
+
+async def seed(books: int, authors: int, genres: int, readers: int, loans: int, rng: random.Random) -> dict:
+    if engine.dialect.name == 'sqlite':
+        # SQLite-подмена живёт вне Alembic, схему берём из моделей
+        Base.metadata.create_all(bind=engine)
+
+    tag = f'load-{uuid4().hex[:8]}'
+    data = {
+        'books': [uuid4() for _ in range(books)],
+        'authors': [uuid4() for _ in range(authors)],
+        'genres': [uuid4() for _ in range(genres)],
+        'readers': [uuid4() for _ in range(readers)],
+        'genre_names': [f'{tag}-genre-{i}' for i in range(genres)],
+        'reader_names': [f'{tag}-reader-{i}' for i in range(readers)]
+    }
+    # один хеш на всех: иначе засев упирается в bcrypt, а логин всё равно проверяет его честно
+    password = hash_password(PASSWORD)
+    now = datetime.utcnow()
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(Author), [
+            {'id': author_id, 'username': f'{tag}-author-{i}'} for i, author_id in enumerate(data['authors'])
+        ])
+        await session.execute(insert(Genre), [
+            {'id': genre_id, 'name': name} for genre_id, name in zip(data['genres'], data['genre_names'])
+        ])
+        await session.execute(insert(Book), [
+            {'id': book_id, 'name': f'{tag}-book-{i:07}', 'description': f'synthetic book {i}',
+             'published_at': now, 'count_available': 1000}
+            for i, book_id in enumerate(data['books'])
+        ])
+        await session.execute(insert(book_authors), [
+            {'book_id': book_id, 'author_id': author_id}
+            for book_id in data['books'] for author_id in rng.sample(data['authors'], min(2, authors))
+        ])
+        await session.execute(insert(book_genres), [
+            {'book_id': book_id, 'genre_id': genre_id}
+            for book_id in data['books'] for genre_id in rng.sample(data['genres'], min(2, genres))
+        ])
+        await session.execute(insert(User), [
+            {'id': reader_id, 'username': name, 'password': password, 'role': 'reader'}
+            for reader_id, name in zip(data['readers'], data['reader_names'])
+        ])
+        await session.execute(insert(UserReader), [
+            {'id': reader_id, 'user_id': reader_id, 'can_get_more': 1_000_000} for reader_id in data['readers']
+        ])
+        # выдачи идут с конца списка книг, а /give_book берёт книги с начала — пары не пересекаются
+        if loans:
+            await session.execute(insert(reader_books), [
+                {'id': uuid4(), 'reader_id': data['readers'][i % readers], 'book_id': data['books'][-1 - i // readers],
+                 'output_date': now, 'due_date': now + timedelta(days=14), 'renewals': 0}
+                for i in range(min(loans, readers * books // 2))
+            ])
+        await session.commit()
+    return data
+
+
+async def cleanup(data: dict):
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(reader_books).where(reader_books.c.reader_id.in_(data['readers'])))
+        await session.execute(delete(book_authors).where(book_authors.c.book_id.in_(data['books'])))
+        await session.execute(delete(book_genres).where(book_genres.c.book_id.in_(data['books'])))
+        await session.execute(delete(Book).where(Book.id.in_(data['books'])))
+        await session.execute(delete(Author).where(Author.id.in_(data['authors'])))
+        await session.execute(delete(Genre).where(Genre.id.in_(data['genres'])))
+        await session.execute(delete(UserReader).where(UserReader.id.in_(data['readers'])))
+        await session.execute(delete(User).where(User.id.in_(data['readers'])))
+        await session.commit()
+
+
+def _requests(endpoint: str, count: int, data: dict, rng: random.Random, give_offset: int) -> list[dict]:
+    if endpoint == 'login':
+        return [
+            {'method': 'POST', 'url': '/login',
+             'json': {'username': rng.choice(data['reader_names']), 'password': PASSWORD, 'role': 'reader'}}
+            for _ in range(count)
+        ]
+    if endpoint == 'books':
+        return [
+            {'method': 'GET', 'url': '/books', 'params': {'limit': 20, 'genre': rng.choice(data['genre_names'])}}
+            for _ in range(count)
+        ]
+    if endpoint == 'book':
+        return [{'method': 'GET', 'url': f"/books/{rng.choice(data['books'])}"} for _ in range(count)]
+
+    # у каждой выдачи своя пара (читатель, книга), чтобы не упираться в "уже выдана"
+    readers = len(data['readers'])
+    return [
+        {'method': 'POST', 'url': '/give_book',
+         'params': {'user': data['reader_names'][i % readers]},
+         'content': json.dumps(str(data['books'][i // readers])),
+         'headers': {'content-type': 'application/json'}}
+        for i in range(give_offset, give_offset + count)
+    ]
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+async def drive(client: httpx.AsyncClient, requests: list[dict], concurrency: int) -> dict:
+    latencies, errors = [], 0
+    queue = iter(requests)
+
+    async def worker():
+        nonlocal errors
+        for request in queue:
+            started = time.perf_counter()
+            response = await client.request(**request)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(requests),
+        'errors': errors,
+        'rps': len(requests) / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99)
+    }
+
+
+async def run(
+        books: int = 1000, authors: int = 100, genres: int = 20, readers: int = 100, loans: int = 200,
+        concurrency: tuple[int, ...] = (1, 10, 50), requests: int = 200, login_requests: int = 50,
+        endpoints: tuple[str, ...] = ENDPOINTS, url: str | None = None, seed_value: int = 42
+) -> dict:
+    rng = random.Random(seed_value)
+    data = await seed(books, authors, genres, readers, loans, rng)
+    admin_cookie = {'access_token': encode_jwt({'username': 'load-bench', 'role': 'admin'})}
+
+    if url is None:
+        from main import app
+        transport, base_url = httpx.ASGITransport(app=app), 'http://bench'
+    else:
+        app, transport, base_url = None, None, url
+
+    results = {endpoint: {} for endpoint in endpoints}
+    give_offset = 0
+    try:
+        async with AsyncExitStack() as stack:
+            if app is not None:
+                # ASGITransport не запускает lifespan сам, а без него не работает фоновая запись логов
+                await stack.enter_async_context(app.router.lifespan_context(app))
+            # /login ставит cookie читателя, поэтому выдача идёт через отдельный клиент с cookie админа
+            client = await stack.enter_async_context(
+                httpx.AsyncClient(transport=transport, base_url=base_url, timeout=60)
+            )
+            admin = await stack.enter_async_context(
+                httpx.AsyncClient(transport=transport, base_url=base_url, cookies=admin_cookie, timeout=60)
+            )
+            for endpoint in endpoints:
+                count = login_requests if endpoint == 'login' else requests
+                for level in concurrency:
+                    batch = _requests(endpoint, count, data, rng, give_offset)
+                    if endpoint == 'give_book':
+                        give_offset += count
+                    results[endpoint][str(level)] = await drive(
+                        admin if endpoint == 'give_book' else client, batch, level
+                    )
+    finally:
+        await cleanup(data)
+
+    return {
+        'created_at': datetime.utcnow().isoformat(),
+        'config': {
+            'books': books, 'authors': authors, 'genres': genres, 'readers': readers, 'loans': loans,
+            'concurrency': list(concurrency), 'requests': requests, 'login_requests': login_requests,
+            'seed': seed_value, 'target': url or 'in-process', 'database': engine.dialect.name
+        },
+        'results': results
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for endpoint, levels in baseline['results'].items():
+        for level, before in levels.items():
+            after = current['results'].get(endpoint, {}).get(level)
+            if after is None:
+                continue
+            if after['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{endpoint} x{level}: p95 {before['p95_ms']:.1f} -> {after['p95_ms']:.1f} ms")
+            if after['rps'] < before['rps'] * (1 - tolerance):
+                regressions.append(f"{endpoint} x{level}: rps {before['rps']:.0f} -> {after['rps']:.0f}")
+    return regressions
+
+
+def print_report(report: dict):
+    print(f"{'endpoint':>10} {'conc':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for endpoint, levels in report['results'].items():
+        for level, stats in levels.items():
+            print(f"{endpoint:>10} {level:>5} {stats['rps']:9.1f} {stats['p50_ms']:9.2f} "
+                  f"{stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f} {stats['errors']:7}")
+
+
+# размеры засева и нагрузки по умолчанию; при --compare берутся из конфигурации baseline
+DEFAULTS = {
+    'books': 1000, 'authors': 100, 'genres': 20, 'readers': 100, 'loans': 200,
+    'concurrency': [1, 10, 50], 'requests': 200, 'login_requests': 50, 'seed': 42
+}
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--books', type=int)
+    parser.add_argument('--authors', type=int)
+    parser.add_argument('--genres', type=int)
+    parser.add_argument('--readers', type=int)
+    parser.add_argument('--loans', type=int)
+    parser.add_argument('--concurrency', type=int, nargs='+')
+    parser.add_argument('--requests', type=int, help='requests per endpoint and concurrency level')
+    parser.add_argument('--login-requests', type=int, help='bcrypt is slow, so /login gets fewer')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--url', help='running server to benchmark instead of the in-process app')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--save', help='write the report as a JSON baseline')
+    parser.add_argument('--compare', help='baseline JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    # сравнивать имеет смысл только ту же нагрузку: чего нет в аргументах, берём из baseline
+    config = {
+        name: getattr(args, name) if getattr(args, name) is not None
+        else (baseline or {}).get('config', {}).get(name, default)
+        for name, default in DEFAULTS.items()
+    }
+    if baseline is not None and baseline['config'].get('database') != engine.dialect.name:
+        print(f"warning: baseline was recorded on {baseline['config'].get('database')}, "
+              f"this run uses {engine.dialect.name}")
+
+    report = asyncio.run(run(
+        config['books'], config['authors'], config['genres'], config['readers'], config['loans'],
+        tuple(config['concurrency']), config['requests'], config['login_requests'], tuple(args.endpoints),
+        args.url, config['seed']
+    ))
+    print_report(report)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+    if baseline is not None:
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,62 @@
+"""Бенчмарк полнотекстового поиска по синтетическому каталогу.
+
+Нужен Postgres с применёнными миграциями (``alembic upgrade head``). Книги
+вставляются внутри транзакции, которая в конце откатывается, так что данные
+базы не меняются. Запуск из корня проекта::
+
+    python -m benchmarks.search_bench 10000 100000 1000000
+"""
+import statistics
+import sys
+import time
+
+from sqlalchemy import text
+
+from app.database import engine
+
+
+SEED = text("""
+    INSERT INTO books (id, name, description, published_at, count_available)
+    SELECT gen_random_uuid(),
+           'book ' || i || ' word' || (i % 5000),
+           'topic' || (i % 97) || ' word' || ((i * 7) % 5000) || ' ' || md5(i::text),
+           now(),
+           i % 3
+    FROM generate_series(:start, :stop - 1) AS i
+""")
+
+SEARCH = text("""
+    SELECT id, ts_rank_cd(search_vector, websearch_to_tsquery('simple', :q)) AS rank
+    FROM books
+    WHERE search_vector @@ websearch_to_tsquery('simple', :q)
+    ORDER BY rank DESC, id
+    LIMIT 20
+""")
+
+
+def main(sizes: list[int], queries: int = 50):
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            seeded = 0
+            for size in sizes:
+                conn.execute(SEED, {'start': seeded, 'stop': size})
+                seeded = size
+                conn.execute(text('ANALYZE books'))
+
+                timings = []
+                for i in range(queries):
+                    started = time.perf_counter()
+                    conn.execute(SEARCH, {'q': f'word{(i * 131) % 5000}'}).all()
+                    timings.append((time.perf_counter() - started) * 1000)
+
+                plan = conn.execute(text('EXPLAIN ' + SEARCH.text), {'q': 'word42'}).scalars().all()
+                uses_index = any('ix_books_search_vector' in line for line in plan)
+                print(f'{size:>10} books  median {statistics.median(timings):8.2f} ms  '
+                      f'p95 {sorted(timings)[int(queries * 0.95) - 1]:8.2f} ms  gin index: {uses_index}')
+        finally:
+            trans.rollback()
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
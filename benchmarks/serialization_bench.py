@@ -0,0 +1,89 @@
+"""Сравнение обычной и быстрой (FAST_LISTS) сериализации списка книг.
+
+Каталог из ``books`` книг (по два автора и жанра у каждой) вставляется во
+временные строки и удаляется в конце. Кеш каталога на время замера выключен.
+Запуск из корня проекта (база берётся из DB_URL/ASYNC_DB_URL)::
+
+    python -m benchmarks.serialization_bench [books] [rounds]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from uuid import uuid4
+
+from sqlalchemy import delete, insert
+
+from app.crud import get_books, get_books_json
+from app.database import AsyncSessionLocal
+from app.database.models import Book, Author, Genre, book_authors, book_genres
+from app.schemas import BookPage
+from app.utils.cache import catalog_cache
+
+
+async def _seed(books: int) -> tuple[list, list, list]:
+    tag = f'bench-{uuid4().hex[:8]}'
+    author_ids = [uuid4() for _ in range(100)]
+    genre_ids = [uuid4() for _ in range(20)]
+    book_ids = [uuid4() for _ in range(books)]
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(Author), [
+            {'id': author_id, 'username': f'{tag}-author-{i}'} for i, author_id in enumerate(author_ids)
+        ])
+        await session.execute(insert(Genre), [
+            {'id': genre_id, 'name': f'{tag}-genre-{i}'} for i, genre_id in enumerate(genre_ids)
+        ])
+        await session.execute(insert(Book), [
+            {'id': book_id, 'name': f'{tag}-book-{i:06}', 'description': 'description ' * 10, 'count_available': i % 3}
+            for i, book_id in enumerate(book_ids)
+        ])
+        await session.execute(insert(book_authors), [
+            {'book_id': book_id, 'author_id': author_ids[(i + shift) % len(author_ids)]}
+            for i, book_id in enumerate(book_ids) for shift in (0, 1)
+        ])
+        await session.execute(insert(book_genres), [
+            {'book_id': book_id, 'genre_id': genre_ids[(i + shift) % len(genre_ids)]}
+            for i, book_id in enumerate(book_ids) for shift in (0, 1)
+        ])
+        await session.commit()
+    return book_ids, author_ids, genre_ids
+
+
+async def _regular(books: int) -> bytes:
+    # то же, что делает GET /books: ORM-объекты, BookOut и сериализация response_model
+    async with AsyncSessionLocal() as session:
+        items, next_cursor = await get_books(session, limit=books)
+    return BookPage(items=items, next_cursor=next_cursor).model_dump_json().encode()
+
+
+async def _fast(books: int) -> bytes:
+    async with AsyncSessionLocal() as session:
+        return await get_books_json(session, limit=books)
+
+
+async def main(books: int = 10_000, rounds: int = 5):
+    catalog_cache.enabled = False
+    book_ids, author_ids, genre_ids = await _seed(books)
+    try:
+        results = {}
+        for name, fetch in (('regular', _regular), ('fast', _fast)):
+            timings = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                body = await fetch(books)
+                timings.append(time.perf_counter() - started)
+            results[name] = statistics.median(timings)
+            print(f'{name:>8}: median {results[name] * 1000:9.1f} ms  ({len(body) / 1024:.0f} KiB)')
+        print(f' speedup: {results["regular"] / results["fast"]:.1f}x')
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(delete(book_authors).where(book_authors.c.book_id.in_(book_ids)))
+            await session.execute(delete(book_genres).where(book_genres.c.book_id.in_(book_ids)))
+            await session.execute(delete(Book).where(Book.id.in_(book_ids)))
+            await session.execute(delete(Author).where(Author.id.in_(author_ids)))
+            await session.execute(delete(Genre).where(Genre.id.in_(genre_ids)))
+            await session.commit()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(*[int(arg) for arg in sys.argv[1:]]))
@@ -2,4 +2,6 @@
 
 python app/utils/certs/gen_keys.py
 
+alembic upgrade head
+
 exec python main.py
@@ -1,12 +1,29 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
 from settings import settings
 from app import rout
-from app.middleware import LoggingMiddleware
+from app.middleware import AdmissionMiddleware, LoggingMiddleware, MetricsMiddleware
+from app.utils.log_maintenance import log_maintenance
+from app.utils.log_writer import log_writer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_writer.start()
+    log_maintenance.start()
+    yield
+    await log_maintenance.stop()
+    # дописываем накопленные логи перед остановкой
+    await log_writer.stop()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.include_router(rout)
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(LoggingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 if __name__ == '__main__':
     uvicorn.run('main:app', host=settings.App.APP_HOST, port=settings.App.APP_PORT)
\ No newline at end of file
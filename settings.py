@@ -9,6 +9,8 @@ class Settings:
         API_PREFIX = '/api'
         APP_HOST = '127.0.0.1'
         APP_PORT = 8000
+        # GET /books и GET /authors отдают JSON прямо из строк БД, минуя ORM и Pydantic
+        FAST_LISTS = os.getenv('FAST_LISTS', '0') == '1'
 
     class DB:
         DB_NAME = os.getenv('DB_NAME')
@@ -17,16 +19,127 @@ class Settings:
         DB_USERNAME = os.getenv('DB_USERNAME')
         DB_PASSWORD = os.getenv('DB_PASSWORD')
 
-        DB_URL = (f'postgresql+psycopg2://{DB_USERNAME}'
-                  f':{DB_PASSWORD}'
-                  f'@{DB_HOST}'
-                  f':{DB_PORT}'
-                  f'/{DB_NAME}')
+        DB_URL = os.getenv('DB_URL') or (f'postgresql+psycopg2://{DB_USERNAME}'
+                                         f':{DB_PASSWORD}'
+                                         f'@{DB_HOST}'
+                                         f':{DB_PORT}'
+                                         f'/{DB_NAME}')
+
+        ASYNC_DB_URL = os.getenv('ASYNC_DB_URL') or (f'postgresql+asyncpg://{DB_USERNAME}'
+                                                     f':{DB_PASSWORD}'
+                                                     f'@{DB_HOST}'
+                                                     f':{DB_PORT}'
+                                                     f'/{DB_NAME}')
+
+        # Пул на каждый процесс: при N воркерах uvicorn к базе открывается
+        # до N * (pool_size + max_overflow) соединений
+        pool_size = int(os.getenv('DB_POOL_SIZE', 5))
+        max_overflow = int(os.getenv('DB_MAX_OVERFLOW', 10))
+        # сколько секунд ждать свободного соединения, прежде чем упасть с ошибкой
+        pool_timeout = float(os.getenv('DB_POOL_TIMEOUT', 30))
+        # пересоздавать соединения старше стольких секунд (-1 — никогда)
+        pool_recycle = int(os.getenv('DB_POOL_RECYCLE', 1800))
+        pool_pre_ping = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+        # PgBouncer в режиме pool_mode=transaction: серверные prepared statements
+        # живут в соединении, которое между транзакциями достаётся другому клиенту
+        pgbouncer = os.getenv('DB_PGBOUNCER', '0') == '1'
 
     class auth_jwt:
         algorithm = 'RS256'
-        public_key_path = os.path.join('app', 'public_key.pem')
-        private_key_path = os.path.join('app', 'private_key.pem')
+        # ключи в репозитории не лежат: их создаёт app/utils/certs/gen_keys.py по этим путям
+        public_key_path = os.getenv('JWT_PUBLIC_KEY_PATH', os.path.join('app', 'public_key.pem'))
+        private_key_path = os.getenv('JWT_PRIVATE_KEY_PATH', os.path.join('app', 'private_key.pem'))
+        # Каталог с парами <kid>.private.pem / <kid>.public.pem для ротации ключей.
+        # Подписываем самым свежим приватным ключом, проверяем любым публичным.
+        keys_dir = os.getenv('JWT_KEYS_DIR')
+        keys_reload_interval = 30
+        token_cache_size = 4096
+        token_cache_ttl = 60
+
+    class passwords:
+        bcrypt_rounds = int(os.getenv('BCRYPT_ROUNDS', 12))
+        # bcrypt крутится в отдельном пуле, чтобы не замораживать event loop
+        hash_workers = int(os.getenv('HASH_WORKERS', 4))
+        # сверх этого числа ожидающих хешей сразу отвечаем 503
+        hash_queue_limit = int(os.getenv('HASH_QUEUE_LIMIT', 32))
+
+    class logs:
+        # логи запросов копятся в памяти и пишутся пачками в фоне
+        batch_size = int(os.getenv('LOG_BATCH_SIZE', 500))
+        flush_interval = float(os.getenv('LOG_FLUSH_INTERVAL', 1.0))
+        queue_size = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+        # 'drop' — при переполнении отбрасываем новые записи,
+        # 'sample' — после заполнения очереди наполовину пишем лишь sample_rate записей
+        overflow_policy = os.getenv('LOG_OVERFLOW_POLICY', 'drop')
+        sample_rate = float(os.getenv('LOG_SAMPLE_RATE', 0.1))
+        # сколько первых байт тела запроса попадает в лог
+        max_body_bytes = int(os.getenv('LOG_MAX_BODY_BYTES', 2048))
+        redact_fields = ('password', 'access_token', 'token')
+        # доля логируемых запросов по префиксу пути, например "/books=0.1,/authors=0.5"
+        path_sample_rates = {
+            prefix: float(rate)
+            for prefix, rate in (
+                item.split('=', 1) for item in os.getenv('LOG_PATH_SAMPLE_RATES', '').split(',') if item
+            )
+        }
+        # в Postgres таблица logs разбита на разделы по 'day' или 'week'; фоновая задача
+        # заранее создаёт partitions_ahead следующих разделов и удаляет целиком разделы
+        # старше retention_days
+        partition_interval = os.getenv('LOG_PARTITION_INTERVAL', 'day')
+        partitions_ahead = int(os.getenv('LOG_PARTITIONS_AHEAD', 2))
+        retention_days = int(os.getenv('LOG_RETENTION_DAYS', 14))
+        # поминутные сводки по маршрутам живут дольше сырых логов
+        rollup_retention_days = int(os.getenv('LOG_ROLLUP_RETENTION_DAYS', 90))
+        # минуту сворачиваем, когда с её конца прошло столько секунд: запоздавшие пачки LogWriter успеют доехать
+        rollup_delay = float(os.getenv('LOG_ROLLUP_DELAY', 120))
+        # раз в сколько секунд запускать обслуживание, 0 — не запускать в процессе приложения
+        maintenance_interval = float(os.getenv('LOG_MAINTENANCE_INTERVAL', 60))
+
+    class cache:
+        enabled = os.getenv('CACHE_ENABLED', '1') == '1'
+        local_size = int(os.getenv('CACHE_LOCAL_SIZE', 1024))
+        ttl = float(os.getenv('CACHE_TTL', 30))
+        # общий кеш между воркерами: redis://... или memory:// для локальной заглушки
+        backend_url = os.getenv('CACHE_URL')
+        # пользователи для авторизации по (роль, username); сбрасываются только в своём
+        # процессе, другие воркеры увидят смену пароля или удаление не позже чем через ttl
+        principal_size = int(os.getenv('PRINCIPAL_CACHE_SIZE', 4096))
+        principal_ttl = float(os.getenv('PRINCIPAL_CACHE_TTL', 30))
+
+    class imports:
+        # сколько строк импорта пишем в БД одной пачкой
+        batch_size = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+        # сколько ошибок по строкам возвращаем в отчёте, остальные только считаем
+        max_errors = int(os.getenv('IMPORT_MAX_ERRORS', 1000))
+
+    class exports:
+        # столько книг за раз читается из серверного курсора и уходит клиенту
+        chunk_size = int(os.getenv('EXPORT_CHUNK_SIZE', 1000))
+
+    class limits:
+        # допуск запросов на /login, /register и на записи (всё, кроме GET): ведро токенов
+        # на IP и на пользователя из JWT отвечает 429, предел одновременных запросов
+        # в группе — 503; в обоих случаях с Retry-After. Скорость — токенов в секунду,
+        # 0 отключает конкретное ограничение
+        enabled = os.getenv('LIMITS_ENABLED', '1') == '1'
+        auth_ip_rate = float(os.getenv('LIMIT_AUTH_IP_RATE', 1))
+        auth_ip_burst = int(os.getenv('LIMIT_AUTH_IP_BURST', 10))
+        write_ip_rate = float(os.getenv('LIMIT_WRITE_IP_RATE', 20))
+        write_ip_burst = int(os.getenv('LIMIT_WRITE_IP_BURST', 40))
+        write_user_rate = float(os.getenv('LIMIT_WRITE_USER_RATE', 10))
+        write_user_burst = int(os.getenv('LIMIT_WRITE_USER_BURST', 20))
+        # bcrypt всё равно считается в hash_workers потоках, больше ждать в очереди незачем
+        auth_concurrency = int(os.getenv('LIMIT_AUTH_CONCURRENCY', 16))
+        # записи держат соединение: предел ниже pool_size + max_overflow, чтобы чтениям оставались соединения
+        write_concurrency = int(os.getenv('LIMIT_WRITE_CONCURRENCY', 10))
+        # сколько вёдер держим в памяти, самые давние вытесняются
+        max_keys = int(os.getenv('LIMIT_MAX_KEYS', 10000))
+        # брать IP клиента из X-Forwarded-For — только за своим балансировщиком
+        trust_forwarded = os.getenv('LIMIT_TRUST_FORWARDED', '0') == '1'
+
+    class loans:
+        period_days = int(os.getenv('LOAN_PERIOD_DAYS', 14))
+        max_renewals = int(os.getenv('LOAN_MAX_RENEWALS', 2))
 
 
 settings = Settings()